@@ -0,0 +1,181 @@
+"""Weekly and monthly funnel series behind /api/analytics.
+
+One SQL statement computes every period in the requested window from a
+single range scan of the user's (user_id, application_date) index. The cost
+depends on how many applications fall inside the window, not on how long
+the user's history is, and only one row per period reaches Python.
+
+Medians come from histograms rather than from ranking every row: the scan
+is grouped into (period, milestone, days) counts, a running sum over each
+small histogram finds the bucket(s) holding the middle position, and the
+median is their mean. That avoids a sort of the whole window per milestone.
+
+Days to a milestone are whole days from application_date to interview_date,
+rejected_date or accepted_date. A milestone dated before the application is
+treated as bad data and left out of the medians.
+"""
+import datetime
+
+INTERVALS = ('week', 'month')
+
+# Milestone name -> date column; each gets a count and a median days-to
+MILESTONES = (
+    ('interview', 'interview_date'),
+    ('rejection', 'rejected_date'),
+    ('acceptance', 'accepted_date'),
+)
+
+# SQL for the first day of the period containing application_date
+PERIOD_SQL = {
+    'week': "date(application_date, '-6 days', 'weekday 1')",  # Monday on or before
+    'month': "strftime('%Y-%m-01', application_date)",
+}
+
+
+def _series_sql(interval):
+    days = ',\n'.join(
+        f"CASE WHEN {column} >= application_date "
+        f"THEN CAST(julianday({column}) - julianday(application_date) AS INTEGER) END AS days_{name}"
+        for name, column in MILESTONES)
+    histograms = '\nUNION ALL\n'.join(
+        f"SELECT period, '{name}' AS milestone, days_{name} AS days, COUNT(*) AS n "
+        f"FROM base WHERE days_{name} IS NOT NULL GROUP BY period, days_{name}"
+        for name, _ in MILESTONES)
+    counts = ', '.join(f'COUNT(days_{name}) AS {name}s' for name, _ in MILESTONES)
+    pivot = ', '.join(f"MAX(CASE WHEN milestone = '{name}' THEN median END) AS median_days_to_{name}"
+                      for name, _ in MILESTONES)
+    medians = ', '.join(f'median_days_to_{name}' for name, _ in MILESTONES)
+    return f'''
+        WITH base AS MATERIALIZED (
+            SELECT {PERIOD_SQL[interval]} AS period,
+                   status != 'pending'
+                       OR interview_date IS NOT NULL OR rejected_date IS NOT NULL OR accepted_date IS NOT NULL
+                       AS responded,
+                   {days}
+            FROM applications
+            WHERE user_id = ? AND application_date >= ? AND application_date < ?
+        ),
+        histogram AS (
+            {histograms}
+        ),
+        running AS (
+            SELECT period, milestone, days, n,
+                   SUM(n) OVER (PARTITION BY period, milestone ORDER BY days) AS upto,
+                   SUM(n) OVER (PARTITION BY period, milestone) AS total
+            FROM histogram
+        ),
+        -- Buckets holding the middle position, or either of the two middle
+        -- positions for an even count (1-based: (total+1)/2 and (total+2)/2)
+        median AS (
+            SELECT period, milestone, AVG(days) AS median
+            FROM running
+            WHERE (upto - n < (total + 1) / 2 AND upto >= (total + 1) / 2)
+               OR (upto - n < (total + 2) / 2 AND upto >= (total + 2) / 2)
+            GROUP BY period, milestone
+        ),
+        medians AS (
+            SELECT period, {pivot}
+            FROM median
+            GROUP BY period
+        ),
+        counts AS (
+            SELECT period, COUNT(*) AS sent, SUM(responded) AS responded, {counts}
+            FROM base
+            GROUP BY period
+        )
+        SELECT counts.*, {medians}
+        FROM counts LEFT JOIN medians USING (period)
+        ORDER BY period
+    '''
+
+
+SERIES_SQL = {interval: _series_sql(interval) for interval in INTERVALS}
+
+
+def _postgres_series_sql(interval):
+    # PostgreSQL has an ordered-set aggregate for medians, so one GROUP BY
+    # replaces the histogram steps. Date subtraction gives whole days.
+    days = ',\n'.join(
+        f"CASE WHEN {column} >= application_date THEN {column} - application_date END AS days_{name}"
+        for name, column in MILESTONES)
+    counts = ', '.join(f'COUNT(days_{name}) AS {name}s' for name, _ in MILESTONES)
+    medians = ', '.join(f'percentile_cont(0.5) WITHIN GROUP (ORDER BY days_{name}) AS median_days_to_{name}'
+                        for name, _ in MILESTONES)
+    return f'''
+        WITH base AS (
+            SELECT date_trunc('{interval}', application_date::timestamp)::date AS period,
+                   (status != 'pending'
+                       OR interview_date IS NOT NULL OR rejected_date IS NOT NULL OR accepted_date IS NOT NULL
+                   )::int AS responded,
+                   {days}
+            FROM applications
+            WHERE user_id = ? AND application_date >= ? AND application_date < ?
+        )
+        SELECT period, COUNT(*) AS sent, SUM(responded)::int AS responded, {counts}, {medians}
+        FROM base
+        GROUP BY period
+        ORDER BY period
+    '''
+
+
+# The same series for DATABASE_BACKEND=postgres (weeks start on Monday there too)
+POSTGRES_SERIES_SQL = {interval: _postgres_series_sql(interval) for interval in INTERVALS}
+
+
+def period_start(interval, day):
+    """First day of the week (Monday) or month containing `day`."""
+    if interval == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_period(interval, start):
+    if interval == 'week':
+        return start + datetime.timedelta(days=7)
+    return (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def period_count(interval, start, end):
+    """Number of periods periods(interval, start, end) yields."""
+    first, last = period_start(interval, start), period_start(interval, end)
+    if interval == 'week':
+        return (last - first).days // 7 + 1
+    return (last.year - first.year) * 12 + last.month - first.month + 1
+
+
+def periods(interval, start, end):
+    """Period start dates from the one containing `start` up to the one containing `end`."""
+    current, last = period_start(interval, start), period_start(interval, end)
+    while current <= last:
+        yield current
+        current = next_period(interval, current)
+
+
+def series(cursor, user_id, interval, start, end, sql=SERIES_SQL):
+    """Per-period funnel for applications dated `start`..`end` (inclusive).
+
+    Returns one dict per period, oldest first, including periods with no
+    applications, so a chart can plot the list as is. `sql` is SERIES_SQL
+    or POSTGRES_SERIES_SQL, matching the cursor's database.
+    """
+    cursor.execute(sql[interval],
+                   (user_id, start.isoformat(), (end + datetime.timedelta(days=1)).isoformat()))
+    rows = {row['period']: row for row in cursor.fetchall()}
+
+    result = []
+    for period in periods(interval, start, end):
+        row = rows.get(period.isoformat())
+        sent = row['sent'] if row else 0
+        responded = row['responded'] if row else 0
+        entry = {
+            'period': period.isoformat(),
+            'sent': sent,
+            'responded': responded,
+            'response_rate': round(responded / sent, 4) if sent else None,
+        }
+        for name, _ in MILESTONES:
+            median = row[f'median_days_to_{name}'] if row else None
+            entry[f'{name}s'] = row[f'{name}s'] if row else 0
+            entry[f'median_days_to_{name}'] = round(median, 1) if median is not None else None
+        result.append(entry)
+    return result
@@ -1,20 +1,226 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, Response, current_app, g, redirect, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
+from werkzeug.http import dump_options_header
+from werkzeug.local import LocalProxy
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import jwt
 import datetime
+import hmac
 import os
-import sqlite3
+import tempfile
+import time
 import socket
-from functools import wraps
+from functools import lru_cache, wraps
+import base64
+import json
+import zlib
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+import click
 
-# Get local IP for network access
+import analytics
+import auth
+import bulk
+import counters
+import cvstore
+import db
+import jobs
+import metrics
+import ratelimit
+import repository
+import search
+import serialization
+import storage
+
+def config_from_env():
+    """Settings from the environment (see .env.example), with development defaults."""
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production'),
+        'DATABASE': os.environ.get('DATABASE_PATH', 'jobtracker.db'),
+        'UPLOAD_FOLDER': os.environ.get('UPLOAD_FOLDER', 'uploads'),
+        'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,  # 16MB max file size
+
+        # Where users, applications, CV blobs and the job queue live: 'sqlite' (the
+        # DATABASE file, one node) or 'postgres', a PostgreSQL database at DATABASE_URL
+        # that several backend nodes can share (see repository.py). Each worker process
+        # keeps a pool of up to DATABASE_POOL_SIZE connections (a thread holds one per
+        # request: gunicorn threads plus JOB_WORKERS is enough); a request waits
+        # DATABASE_POOL_TIMEOUT seconds for one, then gets a 503.
+        'DATABASE_BACKEND': os.environ.get('DATABASE_BACKEND', 'sqlite'),
+        'DATABASE_URL': os.environ.get('DATABASE_URL', ''),
+        'DATABASE_POOL_SIZE': int(os.environ.get('DATABASE_POOL_SIZE', 5)),
+        'DATABASE_POOL_TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT', 5)),
+
+        # Where CV files are kept: 'local' (UPLOAD_FOLDER, one volume) or 's3', a bucket
+        # on any S3-compatible service (S3_ENDPOINT_URL for MinIO etc.) that every backend
+        # container can reach. Credentials fall back to boto3's usual AWS_* variables.
+        # Presigned URLs are signed for S3_PUBLIC_ENDPOINT_URL if browsers reach the
+        # service under another address than the backend does.
+        'STORAGE_BACKEND': os.environ.get('STORAGE_BACKEND', 'local'),
+        'S3_BUCKET': os.environ.get('S3_BUCKET', ''),
+        'S3_PREFIX': os.environ.get('S3_PREFIX', ''),
+        'S3_ENDPOINT_URL': os.environ.get('S3_ENDPOINT_URL', ''),
+        'S3_PUBLIC_ENDPOINT_URL': os.environ.get('S3_PUBLIC_ENDPOINT_URL', ''),
+        'S3_REGION': os.environ.get('S3_REGION', ''),
+        'S3_ACCESS_KEY_ID': os.environ.get('S3_ACCESS_KEY_ID', ''),
+        'S3_SECRET_ACCESS_KEY': os.environ.get('S3_SECRET_ACCESS_KEY', ''),
+        'S3_ADDRESSING_STYLE': os.environ.get('S3_ADDRESSING_STYLE', ''),
+        'S3_MAX_POOL_CONNECTIONS': int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 32)),
+        'S3_PRESIGN_EXPIRY': int(os.environ.get('S3_PRESIGN_EXPIRY', 300)),
+
+        # CV downloads: 'sendfile' streams from this process (wsgi.file_wrapper ->
+        # sendfile(2), or proxied from S3), 'accel' only checks ownership and lets nginx
+        # serve the bytes from the internal location mapped to ACCEL_REDIRECT_PREFIX
+        # (local storage only), 'redirect' answers with a presigned S3 URL (like
+        # 'sendfile' with local storage)
+        'CV_DOWNLOAD_MODE': os.environ.get('CV_DOWNLOAD_MODE',
+                                           'redirect' if os.environ.get('STORAGE_BACKEND') == 's3' else 'sendfile'),
+        'ACCEL_REDIRECT_PREFIX': os.environ.get('ACCEL_REDIRECT_PREFIX', '/_protected_uploads/'),
+
+        # Auth tuning: bcrypt cost (existing hashes are upgraded on next login), how many
+        # hashes may run/queue per process, and the verified-token cache
+        'BCRYPT_LOG_ROUNDS': int(os.environ.get('BCRYPT_LOG_ROUNDS', 12)),
+        'BCRYPT_WORKERS': int(os.environ.get('BCRYPT_WORKERS', 2)),
+        'BCRYPT_MAX_PENDING': int(os.environ.get('BCRYPT_MAX_PENDING', 16)),
+        'TOKEN_CACHE_SIZE': int(os.environ.get('TOKEN_CACHE_SIZE', 4096)),
+        'TOKEN_CACHE_TTL': int(os.environ.get('TOKEN_CACHE_TTL', 300)),
+
+        # Writes queue per process for SQLite's single write lock; past this many
+        # waiting writers requests get a 503 instead of piling up
+        'DB_WRITER_MAX_PENDING': int(os.environ.get('DB_WRITER_MAX_PENDING', 32)),
+
+        # Background jobs: worker threads per process (0 = run them with `flask jobs run`),
+        # how often orphaned CV files are collected, and how old an orphan must be
+        'JOB_WORKERS': int(os.environ.get('JOB_WORKERS', 1)),
+        'RECONCILE_INTERVAL': int(os.environ.get('RECONCILE_INTERVAL', 3600)),
+        'ORPHAN_GRACE_PERIOD': int(os.environ.get('ORPHAN_GRACE_PERIOD', 3600)),
+        # Delete tombstones kept for /api/applications/changes; clients that have not
+        # synced for longer start over
+        'TOMBSTONE_RETENTION': int(os.environ.get('TOMBSTONE_RETENTION', 30 * 86400)),
+
+        # Metrics: where each worker process drops its snapshot for /api/metrics to
+        # merge, an optional bearer token for scrapes, and the slow-request log
+        # threshold in milliseconds (0 = off)
+        'METRICS_DIR': os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'jobtracker-metrics')),
+        'METRICS_TOKEN': os.environ.get('METRICS_TOKEN', ''),
+        'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 0)),
+
+        # JSON responses of at least COMPRESS_MIN_SIZE bytes are sent with brotli or
+        # gzip (at this gzip level) when the client accepts it; 0 leaves it to nginx
+        'COMPRESS_LEVEL': int(os.environ.get('COMPRESS_LEVEL', 3)),
+        'COMPRESS_MIN_SIZE': int(os.environ.get('COMPRESS_MIN_SIZE', 1024)),
+
+        # Rate limits as "requests/seconds" token buckets, shared by all workers through
+        # RATE_LIMIT_DATABASE (default: next to DATABASE); "0" turns one off. Logins are
+        # limited per client IP, failed logins per client IP and account name,
+        # registrations per IP, and writes per user. TRUSTED_PROXIES is how many proxies (nginx) set X-Forwarded-For.
+        'RATE_LIMIT_ENABLED': os.environ.get('RATE_LIMIT_ENABLED', '1') == '1',
+        'RATE_LIMIT_DATABASE': os.environ.get('RATE_LIMIT_DATABASE', ''),
+        'RATE_LIMIT_LOGIN': os.environ.get('RATE_LIMIT_LOGIN', '20/60'),
+        'RATE_LIMIT_LOGIN_ACCOUNT': os.environ.get('RATE_LIMIT_LOGIN_ACCOUNT', '10/300'),
+        'RATE_LIMIT_REGISTER': os.environ.get('RATE_LIMIT_REGISTER', '5/3600'),
+        'RATE_LIMIT_WRITES': os.environ.get('RATE_LIMIT_WRITES', '120/60'),
+        'TRUSTED_PROXIES': int(os.environ.get('TRUSTED_PROXIES', 0)),
+    }
+
+VALID_STATUSES = ('pending', 'accepted', 'rejected', 'interview')
+
+# Columns a client may request through ?fields= on the applications list
+APPLICATION_FIELDS = ('id', 'company', 'application_date', 'cover_letter', 'cv_filename', 'status',
+                      'accepted_date', 'rejected_date', 'interview_date', 'created_at',
+                      'note_count', 'notes_updated_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Delta sync: rows per /api/applications/changes response
+DEFAULT_SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 2000
+
+# Interview notes: longest accepted body, and notes per page
+MAX_NOTE_LENGTH = 20000
+DEFAULT_NOTES_PAGE_SIZE = 20
+MAX_NOTES_PAGE_SIZE = 100
+
+# Bulk import: rows per executemany/commit, and per-row errors reported back
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_ERRORS = 1000
+
+# Requests counted against the rate limits (reads are cheap and cached)
+RATE_LIMITED_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Batch mutations: operations accepted per request, and the fields a patch may set
+MAX_BATCH_OPERATIONS = 500
+BATCH_MODES = ('atomic', 'best_effort')
+PATCHABLE_FIELDS = ('company', 'application_date', 'cover_letter', 'status',
+                    'accepted_date', 'rejected_date', 'interview_date')
+
+api = Blueprint('api', __name__, cli_group=None)
+
+# Per-app helpers, created by create_app() and looked up through the current app
+password_hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])
+token_cache = LocalProxy(lambda: current_app.extensions['token_cache'])
+rate_limiter = LocalProxy(lambda: current_app.extensions['rate_limiter'])
+cv_storage = LocalProxy(lambda: current_app.extensions['storage'])
+# Users, applications and their notes, see repository.py
+database = LocalProxy(lambda: current_app.extensions['database'])
+# Handlers are registered on it below; create_app() points it at the app's database
+job_queue = jobs.JobQueue()
+
+def create_app(config=None):
+    """Build the app from the environment plus any `config` overrides.
+
+    Does no I/O: the upload folder and the schema are set up on first use
+    (see init_db), and under gunicorn the master runs the migrations before
+    forking workers (gunicorn.conf.py).
+    """
+    app = Flask(__name__)
+    app.json = serialization.JSONProvider(app)
+    # Stream uploaded files to disk while hashing them, see cvstore.py
+    app.request_class = cvstore.UploadRequest
+    app.config.update(config_from_env())
+    app.config.update(config or {})
+
+    # CORS configuration - Allow all origins for development
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": "*",  # Allow all origins for development
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization"],
+            "expose_headers": ["Content-Type", "Authorization", "ETag", "Retry-After"],
+            "supports_credentials": True
+        }
+    })
+
+    bcrypt = Bcrypt(app)
+    app.extensions['password_hasher'] = auth.PasswordHasher(bcrypt,
+                                                            workers=app.config['BCRYPT_WORKERS'],
+                                                            max_pending=app.config['BCRYPT_MAX_PENDING'])
+    app.extensions['token_cache'] = auth.TokenCache(maxsize=app.config['TOKEN_CACHE_SIZE'],
+                                                    ttl=app.config['TOKEN_CACHE_TTL'])
+    app.extensions['writer_gate'] = db.WriterGate(max_pending=app.config['DB_WRITER_MAX_PENDING'])
+    app.extensions['database'] = repository.from_config(app.config, app.extensions['writer_gate'])
+    app.extensions['rate_limiter'] = ratelimit.RateLimiter(
+        app.config['RATE_LIMIT_DATABASE'] or os.path.splitext(app.config['DATABASE'])[0] + '-ratelimit.db',
+        {budget: app.config[f'RATE_LIMIT_{budget.upper()}']
+         for budget in ('login', 'login_account', 'register', 'writes')},
+        enabled=app.config['RATE_LIMIT_ENABLED'])
+    if app.config['CV_DOWNLOAD_MODE'] == 'accel' and app.config['STORAGE_BACKEND'] != 'local':
+        raise ValueError('CV_DOWNLOAD_MODE=accel needs STORAGE_BACKEND=local; use redirect with s3')
+    app.extensions['storage'] = storage.from_config(app.config)
+    if app.config['TRUSTED_PROXIES']:
+        # request.remote_addr becomes the client's address, not nginx's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                                x_proto=app.config['TRUSTED_PROXIES'])
+    job_queue.init_app(app)
+    metrics.REGISTRY.directory = app.config['METRICS_DIR'] or None
+
+    app.register_blueprint(api)
+    app.teardown_appcontext(release_db)
+    return app
+
+# Get local IP for network access (only for display; probed on first use)
+@lru_cache(maxsize=None)
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -26,79 +232,48 @@ def get_local_ip():
         s.close()
     return ip
 
-LOCAL_IP = get_local_ip()
+# Database setup
+def init_db():
+    """Create the upload folder and apply pending migrations, once per app.
 
-# CORS configuration - Allow all origins for development
-CORS(app, resources={
-    r"/api/*": {
-        "origins": "*",  # Allow all origins for development
-        "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type", "Authorization"],
-        "supports_credentials": True
-    }
-})
+    Called on first use of the database rather than at import. When gunicorn
+    has already migrated in the master, a worker only reads the schema versions.
+    """
+    if current_app.extensions.get('db_ready'):
+        return
+    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    database.migrate()
+    current_app.extensions['db_ready'] = True
 
-bcrypt = Bcrypt(app)
+def release_db(exception):
+    database.release()
 
-# Ensure upload folder exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Conditional GET: every application write bumps the user's data version (via
+# triggers), so "same user + same version + same URL" means same response body.
+def user_etag(user_id, *variant):
+    """Strong ETag for the current request's response to `user_id`.
 
-# Database setup
-def init_db():
-    conn = sqlite3.connect('jobtracker.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Check if applications table exists
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='applications'")
-    table_exists = cursor.fetchone()
-    
-    if table_exists:
-        # Check if new columns exist
-        cursor.execute("PRAGMA table_info(applications)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # Add new columns if they don't exist
-        if 'accepted_date' not in columns:
-            cursor.execute('ALTER TABLE applications ADD COLUMN accepted_date DATE')
-        if 'rejected_date' not in columns:
-            cursor.execute('ALTER TABLE applications ADD COLUMN rejected_date DATE')
-        if 'interview_date' not in columns:
-            cursor.execute('ALTER TABLE applications ADD COLUMN interview_date DATE')
-    else:
-        # Create applications table with all columns
-        cursor.execute('''
-            CREATE TABLE applications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                company TEXT NOT NULL,
-                application_date DATE NOT NULL,
-                cover_letter TEXT,
-                cv_filename TEXT,
-                status TEXT DEFAULT 'pending',
-                accepted_date DATE,
-                rejected_date DATE,
-                interview_date DATE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-    
-    conn.commit()
-    conn.close()
-
-init_db()
+    `variant` adds anything else the body depends on besides the stored data
+    (e.g. the current month for stats).
+    """
+    key = '|'.join([request.full_path] + [str(v) for v in variant]).encode('utf-8')
+    return f'{user_id}-{database.data_version(user_id)}-{zlib.crc32(key):08x}'
+
+def not_modified(etag):
+    """Return a 304 response if the client already holds `etag`, else None.
+
+    Weak comparison, as If-None-Match requires: compressed responses (ours or
+    nginx's) carry the same tag marked weak.
+    """
+    if request.if_none_match.contains_weak(etag):
+        return cacheable(current_app.response_class(status=304), etag)
+    return None
+
+def cacheable(response, etag):
+    response.set_etag(etag)
+    # Private data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # FIXED: Auth decorator that allows OPTIONS requests
 def token_required(f):
@@ -116,7 +291,15 @@ def token_required(f):
         try:
             if token.startswith('Bearer '):
                 token = token[7:]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            # Skip the HMAC check for tokens verified recently; entries expire with the token
+            data = token_cache.get(token)
+            if data is None:
+                metrics.TOKEN_CACHE.inc(result='miss')
+                with metrics.AUTH_SECONDS.time(op='jwt_decode'):
+                    data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+                token_cache.put(token, data)
+            else:
+                metrics.TOKEN_CACHE.inc(result='hit')
             current_user_id = data['user_id']
         except jwt.ExpiredSignatureError:
             return jsonify({'message': 'Token has expired'}), 401
@@ -129,8 +312,89 @@ def token_required(f):
     
     return decorated
 
+def too_many_requests(retry_after):
+    response = jsonify({'message': 'Too many requests, please try again later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def check_rate_limit(budget, key, take=True):
+    """A 429 response if `key` has used up `budget`, else None."""
+    retry_after = rate_limiter.check(budget, key, take)
+    if retry_after is not None:
+        return too_many_requests(retry_after)
+    return None
+
+def rate_limited(budget, by='ip'):
+    """Apply `budget` to POST/PUT/PATCH/DELETE requests before the view runs.
+
+    by='ip' keys the bucket on the client address. by='user' keys it on the
+    authenticated user and goes below @token_required, which passes the id.
+    Runs before the body is read, so a rejected request costs one SQLite
+    statement rather than a bcrypt hash or an upload.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method in RATE_LIMITED_METHODS:
+                key = args[0] if by == 'user' else request.remote_addr
+                limited = check_rate_limit(budget, key)
+                if limited:
+                    return limited
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+@api.before_app_request
+def start_job_workers():
+    # Once per worker process; a no-op on every later request
+    init_db()
+    job_queue.start()
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if current_app.config['SLOW_REQUEST_MS']:
+        metrics.start_trace()
+
+@api.after_app_request
+def record_request_metrics(response):
+    # Route template, not the URL, so ids do not explode the label set
+    route = request.url_rule.rule if request.url_rule else '<unmatched>'
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, route=route, method=request.method)
+    metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    if request.content_length:
+        metrics.HTTP_REQUEST_BYTES.inc(request.content_length, route=route)
+    if response.content_length:
+        metrics.HTTP_RESPONSE_BYTES.inc(response.content_length, route=route)
+    trace = metrics.end_trace() if current_app.config['SLOW_REQUEST_MS'] else None
+    if trace is not None and elapsed * 1000 >= current_app.config['SLOW_REQUEST_MS']:
+        log_slow_request(elapsed, response.status_code, trace)
+    metrics.REGISTRY.flush()
+    return response
+
+# Registered after record_request_metrics so it runs first and the metrics
+# count the compressed bytes
+@api.after_app_request
+def compress_response(response):
+    return serialization.compress(request, response,
+                                  min_size=current_app.config['COMPRESS_MIN_SIZE'],
+                                  level=current_app.config['COMPRESS_LEVEL'])
+
+def log_slow_request(elapsed, status, trace):
+    """Warn about a slow request with its time per SQL statement, slowest first."""
+    by_statement = {}
+    for statement, seconds in trace:
+        count, total = by_statement.get(statement, (0, 0.0))
+        by_statement[statement] = (count + 1, total + seconds)
+    breakdown = ''.join(f'\n  {total * 1000:8.1f} ms  {count:>4}x  {statement}'
+                        for statement, (count, total) in sorted(by_statement.items(), key=lambda item: -item[1][1]))
+    query_ms = sum(seconds for _, seconds in trace) * 1000
+    current_app.logger.warning('Slow request: %s %s -> %s in %.1f ms (%d queries, %.1f ms in SQL)%s',
+                       request.method, request.full_path.rstrip('?'), status, elapsed * 1000, len(trace), query_ms, breakdown)
+
 # Add OPTIONS handler for CORS preflight
-@app.after_request
+@api.after_app_request
 def after_request(response):
     origin = request.headers.get('Origin')
     if origin:
@@ -144,18 +408,19 @@ def after_request(response):
 
 # Routes
 
-@app.route('/', methods=['GET'])
+@api.route('/', methods=['GET'])
 def index():
     return jsonify({
         'message': 'Job Tracker API',
         'version': '1.0',
         'status': 'running',
         'timestamp': datetime.datetime.now(datetime.UTC).isoformat(),
-        'local_ip': LOCAL_IP,
+        'local_ip': get_local_ip(),
         'user': 'zmikicdroin'
     }), 200
 
-@app.route('/api/register', methods=['POST', 'OPTIONS'])
+@api.route('/api/register', methods=['POST', 'OPTIONS'])
+@rate_limited('register')
 def register():
     if request.method == 'OPTIONS':
         return '', 204
@@ -175,32 +440,37 @@ def register():
     if len(password) < 6:
         return jsonify({'message': 'Password must be at least 6 characters long'}), 400
     
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        hashed_password = password_hasher.hash(password)
+    except auth.HasherBusy:
+        return server_busy()
     
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
-                      (username, email, hashed_password))
-        conn.commit()
-        user_id = cursor.lastrowid
-        conn.close()
+        with database.transaction():
+            user_id = database.create_user(username, email, hashed_password)
         
         return jsonify({
             'message': 'User created successfully',
             'user_id': user_id,
             'username': username
         }), 201
-    except sqlite3.IntegrityError as e:
-        error_msg = str(e)
-        if 'username' in error_msg:
+    except db.WriterBusy:
+        return server_busy()
+    except repository.DuplicateUser as e:
+        if e.field == 'username':
             return jsonify({'message': 'Username already exists'}), 409
-        elif 'email' in error_msg:
+        elif e.field == 'email':
             return jsonify({'message': 'Email already exists'}), 409
         else:
             return jsonify({'message': 'User already exists'}), 409
 
-@app.route('/api/login', methods=['POST', 'OPTIONS'])
+def server_busy():
+    response = jsonify({'message': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@api.route('/api/login', methods=['POST', 'OPTIONS'])
+@rate_limited('login')
 def login():
     if request.method == 'OPTIONS':
         return '', 204
@@ -216,19 +486,36 @@ def login():
     if not username or not password:
         return jsonify({'message': 'Missing username or password'}), 400
     
-    conn = sqlite3.connect('jobtracker.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, username, password FROM users WHERE username = ?', (username,))
-    user = cursor.fetchone()
-    conn.close()
+    # Guessing one account's password: only failures are charged, and per client,
+    # so nobody else can use up the owner's budget and lock them out
+    account_key = f'{request.remote_addr}:{str(username).lower()}'
+    limited = check_rate_limit('login_account', account_key, take=False)
+    if limited:
+        return limited
+    
+    user = database.find_user(username)
     
-    if user and bcrypt.check_password_hash(user[2], password):
+    try:
+        password_ok = bool(user) and password_hasher.check(user[2], password)
+    except auth.HasherBusy:
+        return server_busy()
+
+    if password_ok:
+        # Upgrade hashes made with an older cost factor while we know the password
+        if password_hasher.needs_rehash(user[2]):
+            try:
+                new_hash = password_hasher.hash(password)
+                with database.transaction():
+                    database.set_password(user[0], new_hash)
+            except (auth.HasherBusy, db.WriterBusy):
+                pass
+
         # FIXED: Use timezone-aware datetime
         token = jwt.encode({
             'user_id': user[0],
             'username': user[1],
             'exp': datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=7)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        }, current_app.config['SECRET_KEY'], algorithm='HS256')
         
         return jsonify({
             'token': token,
@@ -236,10 +523,12 @@ def login():
             'username': user[1]
         }), 200
     
+    rate_limiter.check('login_account', account_key)
     return jsonify({'message': 'Invalid username or password'}), 401
 
-@app.route('/api/applications', methods=['GET', 'POST', 'OPTIONS'])
+@api.route('/api/applications', methods=['GET', 'POST', 'OPTIONS'])
 @token_required
+@rate_limited('writes', by='user')
 def applications_route(current_user_id):
     if request.method == 'OPTIONS':
         return '', 204
@@ -248,80 +537,344 @@ def applications_route(current_user_id):
     else:  # GET
         return get_applications(current_user_id)
 
-def create_application(current_user_id):
-    company = request.form.get('company')
-    application_date = request.form.get('application_date')
-    cover_letter = request.form.get('cover_letter', '')
-    status = request.form.get('status', 'pending')
-    accepted_date = request.form.get('accepted_date')
-    rejected_date = request.form.get('rejected_date')
-    interview_date = request.form.get('interview_date')
+def validate_application(data):
+    """Validate and normalise the writable application fields from a mapping.
+
+    Shared by the form handlers and bulk import. Unknown statuses fall back
+    to 'pending'; raises ValueError with a client-facing message otherwise.
+    """
+    company = data.get('company')
+    application_date = data.get('application_date')
     
     if not company or not application_date:
-        return jsonify({'message': 'Missing required fields: company, application_date'}), 400
+        raise ValueError('Missing required fields: company, application_date')
     
     # Validate status
-    if status not in ['pending', 'accepted', 'rejected', 'interview']:
+    status = data.get('status') or 'pending'
+    if status not in VALID_STATUSES:
         status = 'pending'
     
     # Validate date format
     try:
         datetime.datetime.strptime(application_date, '%Y-%m-%d')
-    except ValueError:
-        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
     
-    cv_filename = None
-    if 'cv' in request.files:
-        file = request.files['cv']
-        if file and file.filename:
-            # Validate file type
-            if not file.filename.lower().endswith('.pdf'):
-                return jsonify({'message': 'Only PDF files are allowed for CV'}), 400
-            
-            filename = secure_filename(file.filename)
-            timestamp = datetime.datetime.now(datetime.UTC).timestamp()
-            cv_filename = f"{current_user_id}_{timestamp}_{filename}"
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], cv_filename))
-    
-    try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO applications (user_id, company, application_date, cover_letter, cv_filename, status, accepted_date, rejected_date, interview_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (current_user_id, company, application_date, cover_letter, cv_filename, status, accepted_date, rejected_date, interview_date))
-        conn.commit()
-        app_id = cursor.lastrowid
-        conn.close()
+    return {
+        'company': company,
+        'application_date': application_date,
+        'cover_letter': data.get('cover_letter') or '',
+        'status': status,
+        'accepted_date': data.get('accepted_date') or None,
+        'rejected_date': data.get('rejected_date') or None,
+        'interview_date': data.get('interview_date') or None,
+    }
+
+def create_application(current_user_id):
+    try:
+        fields = validate_application(request.form)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        cv_upload, cv_filename = uploaded_cv(current_user_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
+    try:
+        # Upload before taking the write lock; store() keeps the blob from
+        # being garbage collected until this row references it
+        cv_sha256 = cvstore.store(database, cv_storage, cv_upload.stream) if cv_upload else None
+        with database.transaction() as conn:
+            if cv_sha256:
+                enqueue_extract_cv(conn, cv_sha256)
+            app_id = database.insert_application(current_user_id, fields, cv_filename, cv_sha256)
         
         return jsonify({
             'message': 'Application created successfully',
             'application_id': app_id
         }), 201
+    except db.WriterBusy:
+        return server_busy()
     except Exception as e:
         return jsonify({'message': f'Failed to create application: {str(e)}'}), 500
 
+def uploaded_cv(current_user_id):
+    """Return (FileStorage, cv_filename) for the request's CV, or (None, None).
+
+    The file has already been streamed to a hashed temp file by the request
+    class; raises ValueError if it is not a PDF.
+    """
+    file = request.files.get('cv')
+    if not file or not file.filename:
+        return None, None
+    if not file.filename.lower().endswith('.pdf'):
+        raise ValueError('Only PDF files are allowed for CV')
+    
+    filename = secure_filename(file.filename)
+    timestamp = datetime.datetime.now(datetime.UTC).timestamp()
+    return file, f"{current_user_id}_{timestamp}_{filename}"
+
+def enqueue_release_cv(conn, cv_filename, cv_sha256):
+    """Queue removal of a CV the current transaction stops referencing."""
+    if cv_sha256 or cv_filename:
+        jobs.enqueue(conn, 'release_cv', {'filename': cv_filename, 'sha256': cv_sha256})
+
+def enqueue_extract_cv(conn, cv_sha256):
+    """Queue preview/text extraction for a CV stored in the current transaction."""
+    jobs.enqueue(conn, 'extract_cv', {'sha256': cv_sha256}, key=f'extract_cv:{cv_sha256}')
+
+def remove_cv(cv_filename, cv_sha256):
+    """Drop a CV no longer referenced by an application (runs as a release_cv job)."""
+    if cv_sha256:
+        cvstore.release(database, cv_storage, cv_sha256, current_app.config['ORPHAN_GRACE_PERIOD'])
+    elif cv_filename:
+        # Uploaded before content-addressed storage
+        cv_storage.delete(cv_filename)
+
+def encode_cursor(application_date, app_id):
+    """Opaque keyset cursor pointing just after (application_date, id)."""
+    raw = json.dumps([application_date, app_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor_value):
+    try:
+        application_date, app_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode('ascii')))
+        return str(application_date), int(app_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if value:
+        try:
+            datetime.datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'Invalid {name} date. Use YYYY-MM-DD')
+    return value
+
+def parse_fields_arg(always):
+    """Columns named by ?fields= (all by default) plus `always`, in table order."""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(APPLICATION_FIELDS)
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in APPLICATION_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return [f for f in APPLICATION_FIELDS if f in requested or f in always]
+
+def parse_application_query():
+    """Validate the list filters, projection and page size from the query string.
+
+    Returns (fields, filters, limit): filters are keyword arguments for
+    Repository.list_applications, and limit is None when the client did not
+    ask for pagination and expects the whole list.
+    """
+    args = request.args
+
+    # id and application_date are always returned, the cursor is built from them
+    fields = parse_fields_arg(('id', 'application_date'))
+
+    filters = {
+        'date_from': parse_date_arg('from'),
+        'date_to': parse_date_arg('to'),
+        'company': args.get('company') or None,
+    }
+
+    if args.get('status'):
+        statuses = [s.strip() for s in args['status'].split(',') if s.strip()]
+        if any(s not in VALID_STATUSES for s in statuses):
+            raise ValueError('Invalid status. Must be: pending, accepted, rejected, or interview')
+        filters['statuses'] = statuses
+
+    limit = None
+    if 'limit' in args or 'cursor' in args:
+        try:
+            limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    if args.get('cursor'):
+        filters['before'] = decode_cursor(args['cursor'])
+
+    return fields, filters, limit
+
 def get_applications(current_user_id):
+    """List a user's applications, newest first.
+
+    Without `limit`/`cursor` the full list is returned as before. With them the
+    response is a page {'applications': [...], 'next_cursor': ...} read with a
+    keyset seek on (application_date, id), so every page costs the same.
+    ?format=compact sends the rows as {'columns': [...], 'rows': [[...]]}
+    instead of one object per row.
+    """
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, company, application_date, cover_letter, cv_filename, status, 
-                   accepted_date, rejected_date, interview_date, created_at
-            FROM applications
-            WHERE user_id = ?
-            ORDER BY application_date DESC
-        ''', (current_user_id,))
-        applications = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        
-        return jsonify(applications), 200
+        fields, filters, limit = parse_application_query()
+        fmt = serialization.parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    etag = user_etag(current_user_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    try:
+        rows = database.list_applications(current_user_id, fields,
+                                          limit=limit + 1 if limit is not None else None, **filters)
+
+        if limit is None:
+            return cacheable(jsonify(serialization.rows_payload(rows, fields, fmt)), etag), 200
+
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(last['application_date'], last['id'])
+
+        return cacheable(jsonify({
+            'applications': serialization.rows_payload(page, fields, fmt),
+            'next_cursor': next_cursor
+        }), etag), 200
     except Exception as e:
         return jsonify({'message': f'Failed to fetch applications: {str(e)}'}), 500
 
-@app.route('/api/applications/<int:app_id>', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+@api.route('/api/applications/changes', methods=['GET', 'OPTIONS'])
 @token_required
+def get_application_changes(current_user_id):
+    """Delta sync: applications changed and ids deleted since ?since=<cursor>.
+
+    Start with since=0 (everything), then pass back the returned `cursor`.
+    While `has_more` is set, ask again right away. When `reset` is set, drop the
+    local copy first: it is older than the retained tombstones. ?fields= picks
+    columns as on the list; id, change_seq and updated_at always come back.
+    ?format=compact sends `changes` in columnar form, as on the list.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        fields = parse_fields_arg(('id', 'application_date'))
+        fmt = serialization.parse_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    try:
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', DEFAULT_SYNC_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'message': 'since and limit must be integers'}), 400
+    if since < 0:
+        return jsonify({'message': 'since must not be negative'}), 400
+    limit = max(1, min(limit, MAX_SYNC_PAGE_SIZE))
+    
+    # An up-to-date client gets a 304
+    etag = user_etag(current_user_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    try:
+        feed = database.changes(current_user_id, since, limit, fields, fmt)
+        return cacheable(jsonify(feed), etag), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to fetch changes: {str(e)}'}), 500
+
+@api.route('/api/applications/import', methods=['POST', 'OPTIONS'])
+@token_required
+@rate_limited('writes', by='user')
+def import_applications(current_user_id):
+    """Bulk-create applications from a CSV or NDJSON request body.
+
+    Rows are validated like create_application and inserted IMPORT_BATCH_SIZE
+    at a time, one transaction per batch. Invalid rows are skipped and
+    reported; valid ones are imported. CVs cannot be attached in bulk.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    fmt = bulk.detect_format(request.args.get('format'), request.mimetype)
+    if not fmt:
+        return jsonify({'message': 'Unsupported format. Send text/csv or application/x-ndjson'}), 415
+    
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    
+    def insert_batch():
+        with database.transaction():
+            database.insert_applications(current_user_id, batch)
+    
+    try:
+        for row_number, row in bulk.read_rows(request.stream, fmt):
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                fields = validate_application(row)
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({'row': row_number, 'message': str(e)})
+                continue
+            
+            batch.append(fields)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                insert_batch()
+                imported += len(batch)
+                batch = []
+        
+        if batch:
+            insert_batch()
+            imported += len(batch)
+    except db.WriterBusy:
+        response = jsonify({
+            'message': 'Import stopped: server is busy, retry the remaining rows shortly',
+            'imported': imported,
+            'failed': failed,
+            'errors': errors
+        })
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except Exception as e:
+        return jsonify({
+            'message': f'Import stopped: {str(e)}',
+            'imported': imported,
+            'failed': failed,
+            'errors': errors
+        }), 500
+    
+    return jsonify({
+        'message': f'Imported {imported} applications',
+        'imported': imported,
+        'failed': failed,
+        'errors': errors
+    }), 200 if not failed else 207
+
+@api.route('/api/applications/export', methods=['GET', 'OPTIONS'])
+@token_required
+def export_applications(current_user_id):
+    """Stream all of the user's applications as CSV (default) or NDJSON."""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in bulk.FORMATS:
+        return jsonify({'message': 'Invalid format. Must be: csv or ndjson'}), 400
+    
+    fields = list(APPLICATION_FIELDS)
+    rows = database.export_applications(current_user_id, fields)
+    
+    return Response(
+        stream_with_context(bulk.export_chunks(rows, fields, fmt)),
+        mimetype=bulk.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=applications.{fmt}'}
+    )
+
+@api.route('/api/applications/<int:app_id>', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+@token_required
+@rate_limited('writes', by='user')
 def handle_application(current_user_id, app_id):
     if request.method == 'OPTIONS':
         return '', 204
@@ -334,143 +887,186 @@ def handle_application(current_user_id, app_id):
         return delete_application(current_user_id, app_id)
 
 def get_application(current_user_id, app_id):
+    etag = user_etag(current_user_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, company, application_date, cover_letter, cv_filename, status,
-                   accepted_date, rejected_date, interview_date, created_at
-            FROM applications
-            WHERE id = ? AND user_id = ?
-        ''', (app_id, current_user_id))
-        application = cursor.fetchone()
-        conn.close()
+        application = database.find_application(current_user_id, app_id, APPLICATION_FIELDS)
         
         if application:
-            return jsonify(dict(application)), 200
+            return cacheable(jsonify(dict(application)), etag), 200
         else:
             return jsonify({'message': 'Application not found'}), 404
     except Exception as e:
         return jsonify({'message': f'Failed to fetch application: {str(e)}'}), 500
 
 def update_application(current_user_id, app_id):
-    company = request.form.get('company')
-    application_date = request.form.get('application_date')
-    cover_letter = request.form.get('cover_letter', '')
-    status = request.form.get('status', 'pending')
-    accepted_date = request.form.get('accepted_date') or None
-    rejected_date = request.form.get('rejected_date') or None
-    interview_date = request.form.get('interview_date') or None
-    
-    if not company or not application_date:
-        return jsonify({'message': 'Missing required fields: company, application_date'}), 400
-    
-    # Validate status
-    if status not in ['pending', 'accepted', 'rejected', 'interview']:
-        status = 'pending'
+    try:
+        fields = validate_application(request.form)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
-    # Validate date format
     try:
-        datetime.datetime.strptime(application_date, '%Y-%m-%d')
-    except ValueError:
-        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        cv_upload, cv_filename = uploaded_cv(current_user_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        
-        # Check if new CV is uploaded
-        if 'cv' in request.files:
-            file = request.files['cv']
-            if file and file.filename:
-                # Get old CV filename
-                cursor.execute('SELECT cv_filename FROM applications WHERE id = ? AND user_id = ?', 
-                              (app_id, current_user_id))
-                result = cursor.fetchone()
-                old_cv = result[0] if result else None
-                
-                # Delete old CV
-                if old_cv:
-                    old_cv_path = os.path.join(app.config['UPLOAD_FOLDER'], old_cv)
-                    if os.path.exists(old_cv_path):
-                        os.remove(old_cv_path)
-                
-                # Save new CV
-                if not file.filename.lower().endswith('.pdf'):
-                    return jsonify({'message': 'Only PDF files are allowed for CV'}), 400
-                
-                filename = secure_filename(file.filename)
-                timestamp = datetime.datetime.now(datetime.UTC).timestamp()
-                cv_filename = f"{current_user_id}_{timestamp}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], cv_filename))
-                
-                cursor.execute('''
-                    UPDATE applications 
-                    SET company = ?, application_date = ?, cover_letter = ?, status = ?,
-                        accepted_date = ?, rejected_date = ?, interview_date = ?, cv_filename = ?
-                    WHERE id = ? AND user_id = ?
-                ''', (company, application_date, cover_letter, status, accepted_date, rejected_date, interview_date, cv_filename, app_id, current_user_id))
-            else:
-                cursor.execute('''
-                    UPDATE applications 
-                    SET company = ?, application_date = ?, cover_letter = ?, status = ?,
-                        accepted_date = ?, rejected_date = ?, interview_date = ?
-                    WHERE id = ? AND user_id = ?
-                ''', (company, application_date, cover_letter, status, accepted_date, rejected_date, interview_date, app_id, current_user_id))
-        else:
-            cursor.execute('''
-                UPDATE applications 
-                SET company = ?, application_date = ?, cover_letter = ?, status = ?,
-                    accepted_date = ?, rejected_date = ?, interview_date = ?
-                WHERE id = ? AND user_id = ?
-            ''', (company, application_date, cover_letter, status, accepted_date, rejected_date, interview_date, app_id, current_user_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            return jsonify({'message': 'Application not found'}), 404
+        cv_sha256 = cvstore.store(database, cv_storage, cv_upload.stream) if cv_upload else None
+        with database.transaction() as conn:
+            if cv_upload:
+                # Release the old CV once the new one is committed
+                old_cv = database.find_application(current_user_id, app_id, ('cv_filename', 'cv_sha256'))
+                if not old_cv:
+                    return jsonify({'message': 'Application not found'}), 404
+            
+                enqueue_extract_cv(conn, cv_sha256)
+                if old_cv['cv_sha256'] != cv_sha256:
+                    enqueue_release_cv(conn, old_cv['cv_filename'], old_cv['cv_sha256'])
+                fields.update(cv_filename=cv_filename, cv_sha256=cv_sha256)
         
-        conn.commit()
-        conn.close()
+            if not database.update_application(current_user_id, app_id, fields):
+                return jsonify({'message': 'Application not found'}), 404
         
         return jsonify({'message': 'Application updated successfully'}), 200
+    except db.WriterBusy:
+        return server_busy()
     except Exception as e:
         return jsonify({'message': f'Failed to update application: {str(e)}'}), 500
 
 def delete_application(current_user_id, app_id):
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        
-        # Get CV filename before deleting
-        cursor.execute('SELECT cv_filename FROM applications WHERE id = ? AND user_id = ?', 
-                      (app_id, current_user_id))
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return jsonify({'message': 'Application not found'}), 404
-        
-        cv_filename = result[0]
+        with database.transaction() as conn:
+            # Get CV before deleting
+            result = database.find_application(current_user_id, app_id, ('cv_filename', 'cv_sha256'))
         
-        # Delete from database
-        cursor.execute('DELETE FROM applications WHERE id = ? AND user_id = ?', 
-                      (app_id, current_user_id))
-        conn.commit()
-        conn.close()
+            if not result:
+                return jsonify({'message': 'Application not found'}), 404
         
-        # Delete CV file if exists
-        if cv_filename:
-            cv_path = os.path.join(app.config['UPLOAD_FOLDER'], cv_filename)
-            if os.path.exists(cv_path):
-                os.remove(cv_path)
+            # Delete from database (the refcount trigger drops the blob reference)
+            # and have a job delete the CV file once the row is gone
+            database.delete_application(current_user_id, app_id)
+            enqueue_release_cv(conn, result['cv_filename'], result['cv_sha256'])
         
         return jsonify({'message': 'Application deleted successfully'}), 200
+    except db.WriterBusy:
+        return server_busy()
     except Exception as e:
         return jsonify({'message': f'Failed to delete application: {str(e)}'}), 500
 
-@app.route('/api/applications/<int:app_id>/status', methods=['PATCH', 'OPTIONS'])
+@api.route('/api/applications/<int:app_id>/notes', methods=['GET', 'POST', 'OPTIONS'])
 @token_required
+@rate_limited('writes', by='user')
+def application_notes_route(current_user_id, app_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    elif request.method == 'POST':
+        return create_note(current_user_id, app_id)
+    else:  # GET
+        return get_notes(current_user_id, app_id)
+
+@api.route('/api/applications/<int:app_id>/notes/<int:note_id>', methods=['PUT', 'DELETE', 'OPTIONS'])
+@token_required
+@rate_limited('writes', by='user')
+def application_note_route(current_user_id, app_id, note_id):
+    if request.method == 'OPTIONS':
+        return '', 204
+    elif request.method == 'PUT':
+        return update_note(current_user_id, app_id, note_id)
+    else:  # DELETE
+        return delete_note(current_user_id, app_id, note_id)
+
+def validate_note(data):
+    """The note body from a JSON payload, stripped; raises ValueError with a client-facing message."""
+    body = (data or {}).get('body')
+    if not isinstance(body, str) or not body.strip():
+        raise ValueError('Missing note body')
+    if len(body) > MAX_NOTE_LENGTH:
+        raise ValueError(f'Note too long. Maximum is {MAX_NOTE_LENGTH} characters')
+    return body.strip()
+
+def get_notes(current_user_id, app_id):
+    """A page of an application's notes, newest first.
+
+    ?limit= sets the page size; pass the returned `next_cursor` back as
+    ?cursor= for older notes. The list endpoints only carry note_count and
+    notes_updated_at, so bodies are read here when an application is opened.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_NOTES_PAGE_SIZE))
+        before = int(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'message': 'limit and cursor must be integers'}), 400
+    limit = max(1, min(limit, MAX_NOTES_PAGE_SIZE))
+
+    etag = user_etag(current_user_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    try:
+        if not database.owns_application(current_user_id, app_id):
+            return jsonify({'message': 'Application not found'}), 404
+        page, next_cursor = database.notes_page(app_id, limit, before)
+        return cacheable(jsonify({'notes': page, 'next_cursor': next_cursor}), etag), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to fetch notes: {str(e)}'}), 500
+
+def create_note(current_user_id, app_id):
+    try:
+        body = validate_note(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        with database.transaction():
+            # The insert trigger updates the application's note_count
+            note = database.add_note(current_user_id, app_id, body)
+        if note is None:
+            return jsonify({'message': 'Application not found'}), 404
+
+        return jsonify({'message': 'Note added successfully', 'note': note}), 201
+    except db.WriterBusy:
+        return server_busy()
+    except Exception as e:
+        return jsonify({'message': f'Failed to add note: {str(e)}'}), 500
+
+def update_note(current_user_id, app_id, note_id):
+    try:
+        body = validate_note(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        with database.transaction():
+            note = database.update_note(current_user_id, app_id, note_id, body)
+        if note is None:
+            return jsonify({'message': 'Note not found'}), 404
+
+        return jsonify({'message': 'Note updated successfully', 'note': note}), 200
+    except db.WriterBusy:
+        return server_busy()
+    except Exception as e:
+        return jsonify({'message': f'Failed to update note: {str(e)}'}), 500
+
+def delete_note(current_user_id, app_id, note_id):
+    try:
+        with database.transaction():
+            deleted = database.delete_note(current_user_id, app_id, note_id)
+        if not deleted:
+            return jsonify({'message': 'Note not found'}), 404
+
+        return jsonify({'message': 'Note deleted successfully'}), 200
+    except db.WriterBusy:
+        return server_busy()
+    except Exception as e:
+        return jsonify({'message': f'Failed to delete note: {str(e)}'}), 500
+
+@api.route('/api/applications/<int:app_id>/status', methods=['PATCH', 'OPTIONS'])
+@token_required
+@rate_limited('writes', by='user')
 def update_application_status(current_user_id, app_id):
     if request.method == 'OPTIONS':
         return '', 204
@@ -485,110 +1081,576 @@ def update_application_status(current_user_id, app_id):
     if not status:
         return jsonify({'message': 'Missing status field'}), 400
     
-    if status not in ['pending', 'accepted', 'rejected', 'interview']:
+    if status not in VALID_STATUSES:
         return jsonify({'message': 'Invalid status. Must be: pending, accepted, rejected, or interview'}), 400
     
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE applications 
-            SET status = ? 
-            WHERE id = ? AND user_id = ?
-        ''', (status, app_id, current_user_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
+        with database.transaction():
+            updated = database.update_application(current_user_id, app_id, {'status': status})
+        if not updated:
             return jsonify({'message': 'Application not found'}), 404
         
-        conn.commit()
-        conn.close()
-        
         return jsonify({'message': 'Status updated successfully', 'status': status}), 200
+    except db.WriterBusy:
+        return server_busy()
     except Exception as e:
         return jsonify({'message': f'Failed to update status: {str(e)}'}), 500
 
-@app.route('/api/uploads/<filename>', methods=['GET', 'OPTIONS'])
+@api.route('/api/applications/batch', methods=['POST', 'OPTIONS'])
+@token_required
+@rate_limited('writes', by='user')
+def batch_applications(current_user_id):
+    """Apply many status changes, patches and deletes in one transaction.
+
+    Body: {"mode": "atomic" | "best_effort", "operations": [
+              {"op": "status", "id": 1, "status": "rejected"},
+              {"op": "patch", "id": 2, "fields": {"interview_date": "2025-03-01"}},
+              {"op": "delete", "id": 3}]}
+
+    atomic (the default) commits only if every operation succeeds and stops at
+    the first failure; best_effort runs each operation in a savepoint and
+    commits the ones that worked. Results are reported per operation, in
+    order. CVs of deleted rows are released by a background job after commit.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    data = request.get_json(silent=True)
+    
+    if not isinstance(data, dict):
+        return jsonify({'message': 'No data provided'}), 400
+    
+    mode = data.get('mode') or 'atomic'
+    operations = data.get('operations')
+    
+    if mode not in BATCH_MODES:
+        return jsonify({'message': 'Invalid mode. Must be: atomic or best_effort'}), 400
+    
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'message': 'operations must be a non-empty list'}), 400
+    
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'message': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}), 400
+    
+    results = []
+    try:
+        with database.transaction() as conn:
+            for index, operation in enumerate(operations):
+                try:
+                    if mode == 'best_effort':
+                        with database.savepoint('batch_operation'):
+                            apply_batch_operation(conn, current_user_id, operation)
+                    else:
+                        apply_batch_operation(conn, current_user_id, operation)
+                except (LookupError, ValueError) as e:
+                    results.append({'index': index, 'ok': False,
+                                    'code': 404 if isinstance(e, LookupError) else 400,
+                                    'message': str(e.args[0])})
+                    if mode == 'atomic':
+                        break
+                    continue
+                results.append({'index': index, 'ok': True})
+            
+            failed = sum(1 for result in results if not result['ok'])
+            if failed and mode == 'atomic':
+                raise repository.Rollback
+    except db.WriterBusy:
+        return server_busy()
+    except Exception as e:
+        return jsonify({'message': f'Batch failed: {str(e)}'}), 500
+    
+    if failed and mode == 'atomic':
+        return jsonify({
+            'message': f"No changes applied: operation {results[-1]['index']} failed",
+            'applied': 0,
+            'failed': failed,
+            'results': results
+        }), 400
+    
+    return jsonify({
+        'message': f'Applied {len(results) - failed} of {len(results)} operations',
+        'applied': len(results) - failed,
+        'failed': failed,
+        'results': results
+    }), 200 if not failed else 207
+
+def apply_batch_operation(conn, current_user_id, operation):
+    """Run one batch operation inside the caller's transaction.
+
+    Raises ValueError for an invalid operation and LookupError if the
+    application does not exist.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError('Each operation must be an object')
+    
+    op = operation.get('op')
+    app_id = operation.get('id')
+    if not isinstance(app_id, int) or isinstance(app_id, bool):
+        raise ValueError('Missing or invalid id')
+    
+    if op == 'status':
+        status = operation.get('status')
+        if status not in VALID_STATUSES:
+            raise ValueError('Invalid status. Must be: pending, accepted, rejected, or interview')
+        if not database.update_application(current_user_id, app_id, {'status': status}):
+            raise LookupError('Application not found')
+        return
+    
+    if op == 'patch':
+        patch = operation.get('fields')
+        if not isinstance(patch, dict) or not patch:
+            raise ValueError('fields must be a non-empty object')
+        unknown = sorted(set(patch) - set(PATCHABLE_FIELDS))
+        if unknown:
+            raise ValueError(f"Fields cannot be changed: {', '.join(unknown)}")
+        if 'status' in patch and patch['status'] not in VALID_STATUSES:
+            raise ValueError('Invalid status. Must be: pending, accepted, rejected, or interview')
+        
+        current = database.find_application(current_user_id, app_id, PATCHABLE_FIELDS)
+        if not current:
+            raise LookupError('Application not found')
+        fields = validate_application({**dict(current), **patch})
+        database.update_application(current_user_id, app_id, {name: fields[name] for name in PATCHABLE_FIELDS})
+        return
+    
+    if op == 'delete':
+        cv = database.find_application(current_user_id, app_id, ('cv_filename', 'cv_sha256'))
+        if not cv:
+            raise LookupError('Application not found')
+        database.delete_application(current_user_id, app_id)
+        enqueue_release_cv(conn, cv['cv_filename'], cv['cv_sha256'])
+        return
+    
+    raise ValueError('Invalid op. Must be: status, patch, or delete')
+
+@api.route('/api/uploads/<filename>', methods=['GET', 'HEAD', 'OPTIONS'])
 @token_required
 def download_file(current_user_id, filename):
+    """Download (or, with ?inline=1, preview) a CV owned by the current user.
+
+    ?preview=1 serves just the first page, inline, once the extract_cv job has
+    built it (the whole CV if it has a single page). Until then it serves the
+    whole CV under an ETag of its own and with no-cache, so the browser asks
+    again rather than keep the full file as the preview.
+    Range, If-Range and If-None-Match are honoured in every download mode
+    (If-Modified-Since too for local files), so a PDF viewer can fetch pages
+    lazily. With CV_DOWNLOAD_MODE=redirect and S3 storage the answer is a 302
+    to a short-lived presigned URL, which the browser follows with its Range.
+    """
     if request.method == 'OPTIONS':
         return '', 204
         
     try:
-        # Verify that the file belongs to the current user
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id FROM applications WHERE user_id = ? AND cv_filename = ?', 
-                      (current_user_id, filename))
-        result = cursor.fetchone()
-        conn.close()
+        # Verify that the file belongs to the current user (covered by idx_applications_user_cv)
+        result = database.find_cv(current_user_id, filename)
         
         if not result:
             return jsonify({'message': 'File not found or unauthorized'}), 404
         
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+        cv_sha256 = etag = result['cv_sha256']
+        preview = request.args.get('preview') == '1'
+        cache_control = 'private, max-age=86400'
+        if cv_sha256:
+            key = cvstore.blob_key(cv_sha256)
+            if preview:
+                blob = database.find_cv_blob(cv_sha256, ('preview', 'extracted_at'))
+                if blob and blob['preview']:
+                    key = cvstore.preview_key(cv_sha256)
+                    etag = cv_sha256 + cvstore.PREVIEW_SUFFIX
+                elif blob and not blob['extracted_at']:
+                    # Stand-in until the preview is built
+                    etag = cv_sha256 + '.pending'
+                    cache_control = 'private, no-cache'
+        else:
+            # Uploaded before content-addressed storage
+            key = secure_filename(filename)
+        
+        as_attachment = request.args.get('inline') != '1' and not preview
+        disposition = 'attachment' if as_attachment else 'inline'
+        mode = current_app.config['CV_DOWNLOAD_MODE']
+        
+        if mode == 'redirect':
+            url = cv_storage.presigned_url(key, 'application/pdf',
+                                           dump_options_header(disposition, {'filename': filename}),
+                                           current_app.config['S3_PRESIGN_EXPIRY'])
+            if url:
+                response = redirect(url)
+                # The URL expires, so the redirect must not be reused
+                response.headers['Cache-Control'] = 'private, no-store'
+                return response
+        
+        if mode == 'accel':
+            response = current_app.response_class(mimetype='application/pdf')
+            response.headers['X-Accel-Redirect'] = current_app.config['ACCEL_REDIRECT_PREFIX'] + key
+            response.headers.set('Content-Disposition', disposition, filename=filename)
+            # nginx keeps Cache-Control from the redirecting response
+            response.headers['Cache-Control'] = cache_control
+            return response
+        
+        if cv_storage.name != 'local':
+            return stream_stored_cv(key, etag, disposition, filename, cache_control)
+        
+        path = os.path.abspath(cv_storage.path(key))
+        response = send_file(path, mimetype='application/pdf', as_attachment=as_attachment,
+                             download_name=filename, conditional=True,
+                             etag=etag or True)
+        # Blob content never changes for a given CV filename
+        response.headers['Cache-Control'] = cache_control
+        return response
+    except FileNotFoundError:
+        return jsonify({'message': 'File not found'}), 404
     except Exception as e:
         return jsonify({'message': f'Failed to download file: {str(e)}'}), 500
 
-@app.route('/api/stats', methods=['GET', 'OPTIONS'])
+def stream_stored_cv(key, etag, disposition, filename, cache_control):
+    """Relay a CV from object storage through this process (CV_DOWNLOAD_MODE=sendfile with S3).
+
+    Range is passed on to the storage, so only the requested bytes are
+    fetched; an If-Range that does not match the ETag asks for the whole file.
+    """
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    byte_range = request.headers.get('Range')
+    if_range = request.if_range
+    if if_range.date or (if_range.etag and if_range.etag != etag):
+        byte_range = None
+    try:
+        obj = cv_storage.get(key, byte_range)
+    except storage.RangeNotSatisfiable:
+        return jsonify({'message': 'Requested range not satisfiable'}), 416
+    
+    response = current_app.response_class(obj.chunks, status=206 if obj.content_range else 200,
+                                          mimetype='application/pdf', direct_passthrough=True)
+    response.content_length = obj.length
+    if obj.content_range:
+        response.headers['Content-Range'] = obj.content_range
+    response.accept_ranges = 'bytes'
+    if etag:
+        response.set_etag(etag)
+    response.headers.set('Content-Disposition', disposition, filename=filename)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@api.route('/api/stats', methods=['GET', 'OPTIONS'])
 @token_required
 def get_stats(current_user_id):
     if request.method == 'OPTIONS':
         return '', 204
         
+    # this_month depends on the date as well as on the data
+    today = datetime.datetime.now(datetime.UTC).date()
+    etag = user_etag(current_user_id, today.strftime('%Y-%m'))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     try:
-        conn = sqlite3.connect('jobtracker.db')
-        cursor = conn.cursor()
-        
-        # Total applications
-        cursor.execute('SELECT COUNT(*) FROM applications WHERE user_id = ?', (current_user_id,))
-        total = cursor.fetchone()[0]
-        
-        # Status counts
-        cursor.execute('''
-            SELECT status, COUNT(*) 
-            FROM applications 
-            WHERE user_id = ? 
-            GROUP BY status
-        ''', (current_user_id,))
-        status_counts = dict(cursor.fetchall())
-        
-        # Applications this month
-        cursor.execute('''
-            SELECT COUNT(*) 
-            FROM applications 
-            WHERE user_id = ? 
-            AND strftime('%Y-%m', application_date) = strftime('%Y-%m', 'now')
-        ''', (current_user_id,))
-        this_month = cursor.fetchone()[0]
-        
-        conn.close()
+        # Counters are maintained by triggers on every write, see counters.py
+        stored = database.stats(current_user_id, VALID_STATUSES, today)
+        total = stored.get(counters.TOTAL_BUCKET, 0)
+        status_counts = {s: stored.get(counters.status_bucket(s), 0) for s in VALID_STATUSES}
+        this_month = stored.get(counters.month_bucket(today), 0)
         
-        return jsonify({
+        return cacheable(jsonify({
             'total': total,
             'pending': status_counts.get('pending', 0),
             'accepted': status_counts.get('accepted', 0),
             'rejected': status_counts.get('rejected', 0),
             'interview': status_counts.get('interview', 0),
             'this_month': this_month
-        }), 200
+        }), etag), 200
     except Exception as e:
         return jsonify({'message': f'Failed to fetch stats: {str(e)}'}), 500
 
+# Analytics: periods returned when ?from is not given, and the most allowed
+DEFAULT_ANALYTICS_PERIODS = {'week': 26, 'month': 12}
+MAX_ANALYTICS_PERIODS = {'week': 156, 'month': 120}
+
+@api.route('/api/analytics', methods=['GET', 'OPTIONS'])
+@token_required
+def get_analytics(current_user_id):
+    """Weekly or monthly funnel: sent, response rate, outcomes, median days to each.
+
+    ?interval=week|month (default month), optional ?from and ?to (YYYY-MM-DD,
+    default: the last 12 months or 26 weeks up to today). The window is
+    widened to whole periods. Returns {'interval', 'from', 'to', 'series':
+    [{period, sent, responded, response_rate, interviews, rejections,
+    acceptances, median_days_to_interview, ...}, ...]}, one entry per period
+    including empty ones. See analytics.py.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    interval = request.args.get('interval', 'month')
+    if interval not in analytics.INTERVALS:
+        return jsonify({'message': 'Invalid interval. Must be: week or month'}), 400
+
+    today = datetime.datetime.now(datetime.UTC).date()
+    try:
+        end_day = (datetime.datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+                   if request.args.get('to') else today)
+        if request.args.get('from'):
+            start_day = datetime.datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        else:
+            start_day = analytics.period_start(interval, end_day)
+            for _ in range(DEFAULT_ANALYTICS_PERIODS[interval] - 1):
+                start_day = analytics.period_start(interval, start_day - datetime.timedelta(days=1))
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    if end_day < start_day:
+        return jsonify({'message': 'to must not be before from'}), 400
+    if analytics.period_count(interval, start_day, end_day) > MAX_ANALYTICS_PERIODS[interval]:
+        return jsonify({'message': f'Date window too large. Maximum is {MAX_ANALYTICS_PERIODS[interval]} {interval}s'}), 400
+
+    start_day = analytics.period_start(interval, start_day)
+    end_day = analytics.next_period(interval, analytics.period_start(interval, end_day)) - datetime.timedelta(days=1)
+
+    # The default window moves with the date
+    etag = user_etag(current_user_id, today.isoformat())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    try:
+        series = database.analytics(current_user_id, interval, start_day, end_day)
+        return cacheable(jsonify({
+            'interval': interval,
+            'from': start_day.isoformat(),
+            'to': end_day.isoformat(),
+            'series': series,
+        }), etag), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to compute analytics: {str(e)}'}), 500
+
+# Event types shown on the calendar and the date column each one comes from.
+# Outcome events only appear while the application is in that status.
+CALENDAR_EVENTS = (
+    ('application', 'application_date', None),
+    ('interview', 'interview_date', 'interview'),
+    ('accepted', 'accepted_date', 'accepted'),
+    ('rejected', 'rejected_date', 'rejected'),
+)
+MAX_CALENDAR_DAYS = 400
+
+@api.route('/api/calendar', methods=['GET', 'OPTIONS'])
+@token_required
+def get_calendar(current_user_id):
+    """Calendar events between ?start and ?end (inclusive, YYYY-MM-DD).
+
+    Returns {'days': {date: {event_type: [{id, company, status}, ...]}}}. Each
+    event type is a range seek on its own (user_id, <date column>) index, so
+    the cost depends on the events in the window, not on the whole history.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+    if not start or not end:
+        return jsonify({'message': 'Missing required parameters: start, end'}), 400
+
+    try:
+        start_day = datetime.datetime.strptime(start, '%Y-%m-%d').date()
+        end_day = datetime.datetime.strptime(end, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+
+    if end_day < start_day:
+        return jsonify({'message': 'end must not be before start'}), 400
+    if (end_day - start_day).days > MAX_CALENDAR_DAYS:
+        return jsonify({'message': f'Date window too large. Maximum is {MAX_CALENDAR_DAYS} days'}), 400
+
+    try:
+        days = {}
+        for row in database.calendar_events(current_user_id, CALENDAR_EVENTS, start, end):
+            days.setdefault(row['day'], {}).setdefault(row['type'], []).append({
+                'id': row['id'],
+                'company': row['company'],
+                'status': row['status']
+            })
+
+        return jsonify({'start': start, 'end': end, 'days': days}), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to fetch calendar: {str(e)}'}), 500
+
+@api.route('/api/search', methods=['GET', 'OPTIONS'])
+@token_required
+def search_applications(current_user_id):
+    """Ranked full-text search over company, cover letter and CV text.
+
+    ?q= is split into words, each matched as a prefix; ?limit= and ?offset=
+    page through the ranking. Matches are wrapped in \\x02 ... \\x03.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    words = search.terms(request.args.get('q', ''))
+    if not words:
+        return jsonify({'message': 'Missing search query'}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), MAX_PAGE_SIZE))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'message': 'limit and offset must be integers'}), 400
+    
+    etag = user_etag(current_user_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    try:
+        rows, has_more = database.search(current_user_id, words, limit, offset)
+        return cacheable(jsonify({
+            'results': [dict(row) for row in rows],
+            'next_offset': offset + limit if has_more else None
+        }), etag), 200
+    except Exception as e:
+        return jsonify({'message': f'Search failed: {str(e)}'}), 500
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus scrape endpoint: every worker's metrics merged, plus job queue gauges.
+
+    Not behind user auth; set METRICS_TOKEN to require `Authorization: Bearer
+    <token>`. nginx does not proxy this path, so scrape the backend directly.
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'message': 'Invalid metrics token'}), 401
+    
+    try:
+        stats = jobs.stats(database.connection())
+        gauges = [
+            ('jobs_queue_depth', 'Background jobs by kind and status', ('kind', 'status'),
+             [((kind, status), count) for kind, depth in sorted(stats['depth'].items())
+              for status, count in sorted(depth.items())]),
+            ('jobs_oldest_ready_age_seconds', 'Age of the oldest job that is due but not started', (),
+             [((), stats['oldest_ready_age'])]),
+        ]
+        body = metrics.render(metrics.REGISTRY.collect(), gauges)
+        return Response(body, mimetype='text/plain; version=0.0.4'), 200
+    except Exception as e:
+        return jsonify({'message': f'Failed to collect metrics: {str(e)}'}), 500
+
+# Background jobs (see jobs.py). Handlers run on the job worker threads and
+# must be idempotent: a job can run again after a crash or a failed attempt.
+@job_queue.handler('release_cv')
+def release_cv_job(conn, payload):
+    remove_cv(payload.get('filename'), payload.get('sha256'))
+
+@job_queue.handler('extract_cv')
+def extract_cv_job(conn, payload):
+    cvstore.extract(database, cv_storage, payload['sha256'])
+
+@job_queue.handler('prune_tombstones', every='RECONCILE_INTERVAL')
+def prune_tombstones_job(conn, payload):
+    pruned = database.prune_tombstones(current_app.config['TOMBSTONE_RETENTION'])
+    current_app.logger.info('Pruned %s sync tombstones', pruned)
+
+@job_queue.handler('prune_rate_limits', every='RECONCILE_INTERVAL')
+def prune_rate_limits_job(conn, payload):
+    pruned = rate_limiter.prune()
+    current_app.logger.info('Pruned %s idle rate limit buckets', pruned)
+
+@job_queue.handler('reconcile_uploads', every='RECONCILE_INTERVAL')
+def reconcile_uploads_job(conn, payload):
+    """Periodic cleanup: orphaned CV files, stuck jobs, old job rows, missed extractions."""
+    requeued = jobs.requeue_stale(database, job_queue.lease)
+    pruned = jobs.prune(database, job_queue.retention)
+    # A shared bucket is only swept for orphans when the blob index is shared
+    # too: a node with a SQLite database of its own cannot vouch for the keys
+    # other nodes keep there.
+    removed = cvstore.reconcile(database, cv_storage, grace=current_app.config['ORPHAN_GRACE_PERIOD'],
+                                sweep_storage=cv_storage.name == 'local' or database.name == 'postgres')
+    if cvstore.pypdf is not None:
+        pending = database.unextracted_cv_blobs()
+        if pending:
+            with database.transaction() as conn:
+                for cv_sha256 in pending:
+                    enqueue_extract_cv(conn, cv_sha256)
+    current_app.logger.info('Reconciled uploads: %s, requeued %s stale jobs, pruned %s', removed, requeued, pruned)
+
+# CLI: flask --app app jobs run|stats|reconcile
+@api.cli.group('jobs')
+def jobs_cli():
+    """Background job queue."""
+
+@jobs_cli.command('run')
+def run_jobs_command():
+    """Run every due job in this process, then exit."""
+    init_db()
+    job_queue.schedule_periodic()
+    ran = job_queue.run_pending()
+    click.echo(f'Ran {ran} jobs')
+
+@jobs_cli.command('reconcile')
+def reconcile_jobs_command():
+    """Queue an upload reconciliation to run now."""
+    init_db()
+    with database.transaction() as conn:
+        jobs.enqueue(conn, 'reconcile_uploads', key='reconcile_uploads')
+        conn.execute('UPDATE jobs SET run_after = 0 WHERE dedupe_key = ? AND status = ?',
+                     ('reconcile_uploads', jobs.QUEUED))
+    click.echo('Reconciliation queued')
+
+@jobs_cli.command('stats')
+def job_stats_command():
+    """Queue depth per kind and status, and latency over the last hour."""
+    init_db()
+    stats = jobs.stats(database.connection())
+    click.echo(f"Oldest ready job waiting: {stats['oldest_ready_age']:.1f}s")
+    for kind, depth in sorted(stats['depth'].items()):
+        click.echo(f"{kind}: " + ', '.join(f'{status}={count}' for status, count in sorted(depth.items())))
+    for kind, latency in sorted(stats['latency'].items()):
+        click.echo(f"{kind}: {latency['jobs']} done, wait p50 {latency['wait_p50']:.3f}s p95 {latency['wait_p95']:.3f}s, "
+                   f"run p50 {latency['run_p50']:.3f}s p95 {latency['run_p95']:.3f}s")
+
+# CLI: flask --app app counters verify|rebuild
+@api.cli.group('counters')
+def counters_cli():
+    """Check or rebuild the /api/stats counters."""
+
+@counters_cli.command('verify')
+def verify_counters_command():
+    """Recount every user's applications and report counter drift."""
+    init_db()
+    drift = database.verify_counters()
+    for user_id, bucket, stored, actual in drift:
+        click.echo(f'user {user_id} {bucket}: stored {stored}, actual {actual}')
+    if drift:
+        raise click.ClickException(f'{len(drift)} counters drifted; run "flask counters rebuild"')
+    click.echo('Counters are consistent')
+
+@counters_cli.command('rebuild')
+def rebuild_counters_command():
+    """Recompute every counter from the applications table."""
+    init_db()
+    database.rebuild_counters()
+    click.echo('Counters rebuilt')
+
 # Error handlers
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'message': 'Endpoint not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'message': 'Internal server error'}), 500
 
-@app.errorhandler(413)
+@api.app_errorhandler(413)
 def too_large(error):
     return jsonify({'message': 'File too large. Maximum size is 16MB'}), 413
 
+# Module-level app for `gunicorn app:app`, `flask --app app` and asgi.py
+app = create_app()
+
 if __name__ == '__main__':
+    LOCAL_IP = get_local_ip()
     print("=" * 60)
     print("Job Tracker API Server")
     print("=" * 60)
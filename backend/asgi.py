@@ -0,0 +1,195 @@
+"""ASGI entry point: the same Flask routes served from an event loop.
+
+    gunicorn --worker-class uvicorn.workers.UvicornWorker asgi:application
+
+The event loop owns every socket. It reads request bodies (spooling large
+uploads to disk, and refusing with a 413 any body over Flask's
+MAX_CONTENT_LENGTH before it is stored) and writes responses, so a slow client ties up no thread. A
+handler only takes a thread from a bounded pool once its whole request has
+arrived. The handlers themselves stay synchronous. SQLite, bcrypt and file
+I/O block in C with the GIL released, so a thread pool gives the same
+concurrency as async handlers without a second copy of every route.
+
+asgiref's stock WsgiToAsgi runs each request with thread_sensitive=True,
+which funnels all of them onto one shared thread. This adapter runs them on
+its own pool instead. It is written against the WSGI and ASGI specs plus
+asgiref.sync's public helpers only, not WsgiToAsgi's internals.
+"""
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from asgiref.sync import AsyncToSync, sync_to_async
+
+from app import app
+
+# Handler threads per worker process. Each one holds its own SQLite connection.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '16'))
+
+# Request bodies above this size are spooled to disk while they arrive
+BODY_SPOOL_SIZE = 64 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-handler')
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope, reading the request from `body`."""
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin1')
+        # Repeated headers are joined, as a proxy would
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class WsgiRequest:
+    """One request: runs the WSGI app in a pool thread and relays its response."""
+
+    def __init__(self, wsgi_application, scope, send):
+        self.wsgi_application = wsgi_application
+        self.scope = scope
+        self.send = AsyncToSync(send)
+        self.response_start = None
+        self.response_started = False
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info:
+            if self.response_started:
+                raise exc_info[1].with_traceback(exc_info[2])
+        elif self.response_start is not None:
+            raise RuntimeError('start_response called twice without exc_info')
+        self.response_start = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+        }
+        return self.write
+
+    def write(self, data):
+        # Legacy WSGI write() callable; Flask never uses it
+        self._send_body(data)
+
+    def _send_body(self, data):
+        if not self.response_started:
+            self.response_started = True
+            self.send(self.response_start)
+        if data:
+            self.send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    def run(self, body):
+        output = self.wsgi_application(build_environ(self.scope, body), self.start_response)
+        try:
+            for data in output:
+                self._send_body(data)
+            self._send_body(b'')
+            self.send({'type': 'http.response.body'})
+        finally:
+            if hasattr(output, 'close'):
+                output.close()
+
+
+def content_length(scope):
+    """The request's Content-Length as an int, or None if absent or invalid."""
+    for name, value in scope.get('headers', []):
+        if name == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class PooledWsgiToAsgi:
+    """ASGI app that runs a WSGI app's requests on `_executor` and answers lifespan events.
+
+    Bodies larger than `max_body_size` bytes get a 413 without being stored:
+    straight from the headers when Content-Length announces it, or as soon
+    as that many bytes of a chunked body have arrived.
+    """
+
+    def __init__(self, wsgi_application, max_body_size=None):
+        self.wsgi_application = wsgi_application
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+        limit = self.max_body_size
+        if limit is not None and (content_length(scope) or 0) > limit:
+            await self.too_large(send)
+            return
+        with SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE) as body:
+            size = 0
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    # Client went away mid-upload; there is no one to answer
+                    return
+                chunk = message.get('body', b'')
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    await self.too_large(send)
+                    return
+                body.write(chunk)
+                if not message.get('more_body'):
+                    break
+            body.seek(0)
+            request = WsgiRequest(self.wsgi_application, scope, send)
+            await sync_to_async(request.run, thread_sensitive=False, executor=_executor)(body)
+
+    async def too_large(self, send):
+        # The rest of the body is never read, so the connection cannot be reused
+        body = json.dumps({'message': f'Request too large. Maximum size is {self.max_body_size // (1024 * 1024)}MB'})
+        await send({'type': 'http.response.start', 'status': 413, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'connection', b'close'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body.encode()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                _executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = PooledWsgiToAsgi(app, max_body_size=app.config['MAX_CONTENT_LENGTH'])
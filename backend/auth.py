@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class TokenCache:
+    """Bounded LRU cache of verified JWT claims.
+
+    Keys are SHA-256 digests of the raw token, so tokens themselves are never
+    held in memory. An entry lives until the earlier of the token's own `exp`
+    and `ttl` seconds after it was verified; expired entries are dropped on
+    lookup, so the cache can never accept a token jwt.decode would reject.
+    """
+
+    def __init__(self, maxsize=4096, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, claims = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if 'exp' in claims:
+            expires_at = min(expires_at, float(claims['exp']))
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class HasherBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+def hash_cost(pw_hash):
+    """Work factor of a bcrypt hash such as '$2b$12$...', or None if unparseable."""
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so with threaded workers the other request
+    threads keep serving while a login hashes. `workers` caps how many hashes
+    run at once per process and `max_pending` caps how many may wait; beyond
+    that callers get HasherBusy immediately instead of queueing behind a
+    login storm.
+    """
+
+    def __init__(self, bcrypt, workers=2, max_pending=16):
+        self.bcrypt = bcrypt
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    @property
+    def rounds(self):
+        return self.bcrypt._log_rounds
+
+    def _run(self, op, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            # Includes time queued behind other hashes
+            with metrics.AUTH_SECONDS.time(op=op):
+                return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run('bcrypt_hash', self.bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def check(self, pw_hash, password):
+        return self._run('bcrypt_check', self.bcrypt.check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        return hash_cost(pw_hash) != self.rounds
@@ -0,0 +1,109 @@
+"""Time /api/analytics against history size, and against doing it in Python.
+
+Seeds one user with N applications at a fixed rate per day, so a larger N
+means a longer history rather than a denser one (plus a second user, so the
+index has to discriminate). Times the single-pass SQL series for the last 12
+months and 26 weeks, and the naive alternative of fetching every row of the
+user's and bucketing in Python. The SQL time should stay flat as N grows.
+
+    python benchmarks/bench_analytics.py --sizes 10000 50000 100000 --repeat 20
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+PER_DAY = 20
+END = datetime.date(2025, 12, 31)
+
+
+def seed(conn, user_id, count):
+    rng = random.Random(user_id)
+    rows = []
+    for i in range(count):
+        day = END - datetime.timedelta(days=i // PER_DAY)
+        interview = day + datetime.timedelta(days=rng.randint(3, 40)) if rng.random() < 0.25 else None
+        rejected = day + datetime.timedelta(days=rng.randint(5, 60)) if rng.random() < 0.4 else None
+        status = 'rejected' if rejected else 'interview' if interview else 'pending'
+        rows.append((user_id, f'Company {i}', day.isoformat(), status,
+                     interview and interview.isoformat(), rejected and rejected.isoformat()))
+    conn.executemany('INSERT INTO applications (user_id, company, application_date, status, interview_date, '
+                     'rejected_date) VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+
+
+def python_series(cursor, user_id, interval, start, end):
+    # Fetch everything, then bucket and take medians in Python
+    cursor.execute('SELECT application_date, status, interview_date, rejected_date FROM applications '
+                   'WHERE user_id = ?', (user_id,))
+    buckets = {}
+    for application_date, status, interview_date, rejected_date in cursor.fetchall():
+        day = datetime.date.fromisoformat(application_date)
+        if not start <= day <= end:
+            continue
+        bucket = buckets.setdefault(analytics.period_start(interval, day), ([], [], []))
+        bucket[0].append(status != 'pending')
+        if interview_date:
+            bucket[1].append((datetime.date.fromisoformat(interview_date) - day).days)
+        if rejected_date:
+            bucket[2].append((datetime.date.fromisoformat(rejected_date) - day).days)
+    return {period: (len(sent), sum(sent), statistics.median(interviews) if interviews else None,
+                     statistics.median(rejections) if rejections else None)
+            for period, (sent, interviews, rejections) in buckets.items()}
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    windows = {
+        'month': (datetime.date(2025, 1, 1), END),
+        'week': (analytics.period_start('week', END - datetime.timedelta(weeks=25)), END),
+    }
+    print(f"{'applications':>12}  {'history':>8}  {'interval':<8}  {'sql ms':>7}  {'python ms':>9}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = db.connect(os.path.join(tmp, 'bench.db'))
+            migrations.migrate(conn)
+            seed(conn, 1, size)
+            seed(conn, 2, size // 10)
+            conn.execute('ANALYZE')
+            cursor = conn.cursor()
+            for interval, (start, end) in windows.items():
+                sql_series = analytics.series(cursor, 1, interval, start, end)
+                check = python_series(cursor, 1, interval, start, end)
+                for entry in sql_series:
+                    expected = check.get(datetime.date.fromisoformat(entry['period']))
+                    got = (entry['sent'], entry['responded'],
+                           entry['median_days_to_interview'], entry['median_days_to_rejection'])
+                    if expected and expected != got:
+                        sys.exit(f"Mismatch in {entry['period']}: {entry} vs {expected}")
+
+                sql_ms = timed(lambda: analytics.series(cursor, 1, interval, start, end), args.repeat)
+                python_ms = timed(lambda: python_series(cursor, 1, interval, start, end), max(1, args.repeat // 5))
+                years = size / PER_DAY / 365
+                print(f'{size:>12}  {years:>6.1f} y  {interval:<8}  {sql_ms:>7.2f}  {python_ms:>9.2f}')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Microbenchmarks for the auth hot paths.
+
+1. Per-request token verification: jwt.decode (HMAC + claims) vs a TokenCache hit.
+2. Login storm: `--storm` threads hashing passwords back to back while one
+   thread serves cheap requests, once with unbounded bcrypt on every request
+   thread and once through PasswordHasher's bounded pool. Reports login
+   throughput and the cheap requests' latency percentiles.
+
+    python benchmarks/bench_auth.py --rounds 12 --storm 16 --seconds 5
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt  # noqa: E402
+from flask_bcrypt import Bcrypt  # noqa: E402
+
+import auth  # noqa: E402
+
+SECRET = 'bench-secret'
+
+
+def bench_token_verification(iterations):
+    token = jwt.encode({
+        'user_id': 1,
+        'username': 'bench',
+        'exp': datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=7)
+    }, SECRET, algorithm='HS256')
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        jwt.decode(token, SECRET, algorithms=['HS256'])
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    cache = auth.TokenCache()
+    cache.put(token, jwt.decode(token, SECRET, algorithms=['HS256']))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cache.get(token)
+    cached_us = (time.perf_counter() - start) / iterations * 1e6
+
+    print(f'jwt.decode        {decode_us:8.2f} us/request')
+    print(f'TokenCache hit    {cached_us:8.2f} us/request  ({decode_us / cached_us:.1f}x faster)')
+
+
+def cheap_request():
+    # Stand-in for a cached-token, single-index-lookup request
+    sum(range(2000))
+
+
+def login_storm(label, check, storm, seconds):
+    stop = threading.Event()
+    logins = []
+    latencies = []
+
+    def stormer():
+        done = 0
+        while not stop.is_set():
+            try:
+                check()
+                done += 1
+            except auth.HasherBusy:
+                pass
+        logins.append(done)
+
+    def server():
+        while not stop.is_set():
+            start = time.perf_counter()
+            cheap_request()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=stormer) for _ in range(storm)] + [threading.Thread(target=server)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f'{label:<18} {sum(logins) / seconds:7.1f} logins/s   '
+          f'cheap request p50 {cuts[49]:6.3f} ms  p99 {cuts[98]:6.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--storm', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--workers', type=int, default=2, help='PasswordHasher pool size')
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    bench_token_verification(args.iterations)
+
+    bcrypt = Bcrypt()
+    bcrypt._log_rounds = args.rounds
+    pw_hash = bcrypt.generate_password_hash('correct horse').decode('utf-8')
+    hasher = auth.PasswordHasher(bcrypt, workers=args.workers, max_pending=args.storm)
+
+    print(f'\nlogin storm: {args.storm} threads, bcrypt cost {args.rounds}, {os.cpu_count()} CPUs')
+    login_storm('inline bcrypt', lambda: bcrypt.check_password_hash(pw_hash, 'correct horse'),
+                args.storm, args.seconds)
+    login_storm(f'pool ({args.workers} workers)', lambda: hasher.check(pw_hash, 'correct horse'),
+                args.storm, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare per-request sqlite3.connect() against the pooled WAL connections in db.py.
+
+Each simulated request runs the queries of GET /api/applications and
+GET /api/stats for one user, which is what the Dashboard does on every refresh.
+
+    python benchmarks/bench_db_connections.py --apps 2000 --threads 4 --requests 500
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+SCHEMA = '''
+    CREATE TABLE applications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        company TEXT NOT NULL,
+        application_date DATE NOT NULL,
+        cover_letter TEXT,
+        cv_filename TEXT,
+        status TEXT DEFAULT 'pending',
+        accepted_date DATE,
+        rejected_date DATE,
+        interview_date DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+STATUSES = ['pending', 'accepted', 'rejected', 'interview']
+
+
+def seed(path, users, apps_per_user):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    rows = []
+    for user_id in range(1, users + 1):
+        for i in range(apps_per_user):
+            rows.append((user_id, f'Company {i}', f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+                         'Dear hiring manager, ' * 20, STATUSES[i % 4]))
+    conn.executemany('INSERT INTO applications (user_id, company, application_date, cover_letter, status) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def run_queries(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, company, application_date, cover_letter, cv_filename, status,
+               accepted_date, rejected_date, interview_date, created_at
+        FROM applications WHERE user_id = ? ORDER BY application_date DESC
+    ''', (user_id,))
+    cursor.fetchall()
+    cursor.execute('SELECT COUNT(*) FROM applications WHERE user_id = ?', (user_id,))
+    cursor.fetchone()
+    cursor.execute('SELECT status, COUNT(*) FROM applications WHERE user_id = ? GROUP BY status', (user_id,))
+    cursor.fetchall()
+
+
+def fresh_request(path, user_id):
+    conn = sqlite3.connect(path)
+    try:
+        run_queries(conn, user_id)
+    finally:
+        conn.close()
+
+
+def pooled_request(path, user_id):
+    run_queries(db.get_connection(path), user_id)
+    db.release_connections()
+
+
+def measure(name, request_fn, path, users, threads, requests):
+    def worker(offset):
+        for i in range(requests):
+            request_fn(path, (offset + i) % users + 1)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = threads * requests
+    print(f'{name:<10} {total:>7} requests  {elapsed:8.3f}s  {total / elapsed:10.1f} req/s')
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--apps', type=int, default=200, help='applications per user')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500, help='requests per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        seed(path, args.users, args.apps)
+        before = measure('connect', fresh_request, path, args.users, args.threads, args.requests)
+        db.connect(path).close()  # switch the file to WAL like the app does
+        after = measure('pooled', pooled_request, path, args.users, args.threads, args.requests)
+        print(f'speedup    {after / before:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Full-text search (FTS5) vs a LIKE '%term%' scan over applications.
+
+Seeds generated cover letters for several users of very different sizes
+(`--rows` for the largest, then a tenth, a thousandth, and an empty account)
+and times a few representative queries both ways for each of them. A search
+should cost in proportion to the searching user's own data: the small users'
+FTS5 times must not grow with the big user's rows.
+
+    python benchmarks/bench_search.py --rows 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import search  # noqa: E402
+
+WORDS = ('experience team product platform python react cloud data engineering delivery '
+         'customer growth mission culture remote agile backend frontend scale reliable '
+         'passionate collaborate design system payments banking logistics retail').split()
+RARE = ('kubernetes', 'fintech', 'terraform', 'blockchain')
+
+
+def cover_letter(rng):
+    words = rng.choices(WORDS, k=rng.randint(80, 200))
+    if rng.random() < 0.02:
+        words.insert(rng.randrange(len(words)), rng.choice(RARE))
+    return 'Dear hiring manager, ' + ' '.join(words)
+
+
+def user_sizes(rows):
+    """user_id -> applications; the largest user first."""
+    return {1: rows, 2: rows // 10, 3: rows // 1000, 4: 0}
+
+
+def seed(conn, sizes):
+    rng = random.Random(42)
+    for user_id, rows in sizes.items():
+        conn.execute('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                     (user_id, f'user{user_id}', f'user{user_id}@example.com', 'x'))
+        conn.executemany(
+            'INSERT INTO applications (user_id, company, application_date, cover_letter) VALUES (?, ?, ?, ?)',
+            ((user_id, f'{rng.choice(WORDS).title()} {i}', '2025-01-01', cover_letter(rng)) for i in range(rows)))
+    conn.commit()
+
+
+def like_search(cursor, user_id, term, limit):
+    pattern = f'%{term}%'
+    cursor.execute('''
+        SELECT id, company, status, application_date, cover_letter FROM applications
+        WHERE user_id = ? AND (company LIKE ? OR cover_letter LIKE ?)
+        ORDER BY application_date DESC LIMIT ?
+    ''', (user_id, pattern, pattern, limit))
+    return cursor.fetchall()
+
+
+def fts_search(cursor, user_id, term, limit):
+    return search.search(cursor, user_id, search.match_query(search.terms(term)), limit, 0)[0]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.connect(os.path.join(tmp, 'bench.db'))
+        migrations.migrate(conn)
+        sizes = user_sizes(args.rows)
+        start = time.perf_counter()
+        seed(conn, sizes)
+        print(f'seeded {sum(sizes.values())} rows (with FTS triggers) in {time.perf_counter() - start:.1f}s')
+        cursor = conn.cursor()
+
+        for user_id, rows in sizes.items():
+            print(f"\nuser {user_id} ({rows} applications)\n{'term':<14} {'LIKE ms':>9} {'FTS5 ms':>9} {'speedup':>8}  hits")
+            for term in ('kubernetes', 'fintech', 'payments', 'terra'):
+                like_ms, like_hits = timed(lambda: like_search(cursor, user_id, term, args.limit), args.repeat)
+                fts_ms, fts_hits = timed(lambda: fts_search(cursor, user_id, term, args.limit), args.repeat)
+                print(f'{term:<14} {like_ms:>9.2f} {fts_ms:>9.2f} {like_ms / fts_ms:>7.1f}x  {like_hits}/{fts_hits}')
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Bytes on the wire and encoding CPU for large application lists.
+
+Seeds one user with N applications carrying cover letters, reads the list
+the way get_applications does, then times each way of producing the body:
+the old path (dict per row, standard library json with Flask's settings),
+the JSON provider (orjson when installed) with objects and with the compact
+columnar format, each also gzipped and, when the brotli module is installed,
+brotli-compressed. Run once with every column and once with the list view's
+columns (no cover letter).
+
+    python benchmarks/bench_serialization.py --sizes 1000 10000 --repeat 20
+"""
+import argparse
+import datetime
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+import db  # noqa: E402
+import migrations  # noqa: E402
+import serialization  # noqa: E402
+
+ALL_FIELDS = ('id', 'company', 'application_date', 'cover_letter', 'cv_filename', 'status',
+              'accepted_date', 'rejected_date', 'interview_date', 'created_at')
+LIST_FIELDS = ('id', 'company', 'application_date', 'cv_filename', 'status',
+               'accepted_date', 'rejected_date', 'interview_date', 'created_at')
+STATUSES = ('pending', 'accepted', 'rejected', 'interview')
+WORDS = ('experience', 'team', 'product', 'engineering', 'customers', 'growth', 'design', 'data',
+         'platform', 'passionate', 'role', 'skills', 'years', 'leadership', 'impact', 'build')
+
+
+def cover_letter(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(150, 350)))
+
+
+def seed(conn, user_id, count):
+    rng = random.Random(user_id)
+    start = datetime.date(2020, 1, 1)
+    rows = ((user_id, f'Company {i}', (start + datetime.timedelta(days=i % 2000)).isoformat(),
+             cover_letter(rng), STATUSES[i % 4]) for i in range(count))
+    conn.executemany('INSERT INTO applications (user_id, company, application_date, cover_letter, status) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+
+
+def stdlib_objects(rows, fields):
+    # What jsonify([dict(row) for row in rows]) produced before
+    return json.dumps([dict(row) for row in rows], sort_keys=True, ensure_ascii=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def timed(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = fn()
+    return (time.process_time() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--gzip-level', type=int, default=6)
+    args = parser.parse_args()
+
+    provider = serialization.JSONProvider(Flask(__name__))
+    encoders = {
+        'stdlib objects': stdlib_objects,
+        'provider objects': lambda rows, fields: provider.dumps(
+            serialization.rows_payload(rows, fields)).encode('utf-8'),
+        'provider compact': lambda rows, fields: provider.dumps(
+            serialization.rows_payload(rows, fields, 'compact')).encode('utf-8'),
+    }
+    compressors = {'gzip': lambda body: gzip.compress(body, compresslevel=args.gzip_level, mtime=0)}
+    if serialization.brotli is not None:
+        compressors['br'] = lambda body: serialization.brotli.compress(body, quality=serialization.BROTLI_QUALITY)
+
+    print(f"orjson: {'yes' if serialization.orjson else 'no'}, "
+          f"brotli: {'yes' if serialization.brotli else 'no'}, gzip level {args.gzip_level}")
+    header = f"{'rows':>6}  {'columns':<8}  {'encoding':<17} {'encode ms':>9}  {'bytes':>10}"
+    for name in compressors:
+        header += f"  {name + ' bytes':>10}  {name + ' ms':>8}"
+    print(header)
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = db.connect(os.path.join(tmp, 'bench.db'))
+            migrations.migrate(conn)
+            seed(conn, 1, size)
+            for label, fields in (('all', ALL_FIELDS), ('list', LIST_FIELDS)):
+                rows = conn.execute(f"SELECT {', '.join(fields)} FROM applications WHERE user_id = ? "
+                                    'ORDER BY application_date DESC, id DESC', (1,)).fetchall()
+                for name, encode in encoders.items():
+                    ms, body = timed(lambda: encode(rows, fields), args.repeat)
+                    line = f'{size:>6}  {label:<8}  {name:<17} {ms:>9.2f}  {len(body):>10}'
+                    for compress in compressors.values():
+                        compress_ms, compressed = timed(lambda: compress(body), max(1, args.repeat // 4))
+                        line += f'  {len(compressed):>10}  {compress_ms:>8.2f}'
+                    print(line)
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
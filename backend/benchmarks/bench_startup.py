@@ -0,0 +1,112 @@
+"""Measure backend startup: module import, first request, and gunicorn readiness.
+
+Each measurement runs in a fresh process on a fresh scratch directory:
+
+- import:        `import app`
+- first request: import, then GET / and a register (the first database use,
+                 which creates the schema)
+- gunicorn:      from launching `--workers` workers to the first 200 on /
+
+`--backend` points at another checkout of backend/ to compare against it.
+
+    python benchmarks/bench_startup.py --repeat 5 --workers 4
+    python benchmarks/bench_startup.py --backend /tmp/old-checkout/backend
+"""
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT = '''
+import time
+start = time.perf_counter()
+import app
+print(time.perf_counter() - start)
+'''
+
+FIRST_REQUEST = '''
+import time
+start = time.perf_counter()
+import app
+client = app.app.test_client()
+assert client.get('/').status_code == 200
+assert client.post('/api/register', json={'username': 'u', 'email': 'u@example.com', 'password': 'password'}).status_code == 201
+print(time.perf_counter() - start)
+'''
+
+
+def run_python(backend, code):
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    try:
+        env = dict(os.environ, PYTHONPATH=backend, BCRYPT_LOG_ROUNDS='4', JOB_WORKERS='0',
+                   METRICS_DIR=os.path.join(workdir, 'metrics'))
+        out = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, check=True,
+                             capture_output=True, text=True).stdout
+        return float(out.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_ready(backend, workers):
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--pythonpath', backend, '--bind', f'127.0.0.1:{port}',
+               '--workers', str(workers), '--worker-class', 'gthread', '--threads', '4', '--log-level', 'warning']
+    config = os.path.join(backend, 'gunicorn.conf.py')
+    if os.path.exists(config):
+        command += ['--config', config]
+    env = dict(os.environ, BCRYPT_LOG_ROUNDS='4', METRICS_DIR=os.path.join(workdir, 'metrics'))
+    start = time.perf_counter()
+    process = subprocess.Popen(command + ['app:app'], cwd=workdir, env=env)
+    try:
+        while time.perf_counter() - start < 60:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/')
+                if conn.getresponse().status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn did not become ready')
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def report(name, samples):
+    print(f'{name:<14} median {statistics.median(samples) * 1000:8.1f} ms   '
+          f'min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', default=BACKEND, help='backend directory to measure')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    backend = os.path.abspath(args.backend)
+    print(f'{backend} ({args.repeat} runs, {args.workers} gunicorn workers)')
+    report('import', [run_python(backend, IMPORT) for _ in range(args.repeat)])
+    report('first request', [run_python(backend, FIRST_REQUEST) for _ in range(args.repeat)])
+    report('gunicorn', [gunicorn_ready(backend, args.workers) for _ in range(args.repeat)])
+
+
+if __name__ == '__main__':
+    main()
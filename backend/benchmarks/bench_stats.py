@@ -0,0 +1,78 @@
+"""Compare the old three-query /api/stats path with the counters lookup.
+
+Seeds one user with N applications (plus a second user, so the indexes have
+to discriminate) and times both ways of producing the stats payload.
+
+    python benchmarks/bench_stats.py --sizes 10000 100000 --repeat 200
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import counters  # noqa: E402
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+STATUSES = ('pending', 'accepted', 'rejected', 'interview')
+
+
+def seed(conn, user_id, count):
+    start = datetime.date(2020, 1, 1)
+    rows = ((user_id, f'Company {i}', (start + datetime.timedelta(days=i % 2000)).isoformat(),
+             STATUSES[i % 4]) for i in range(count))
+    conn.executemany('INSERT INTO applications (user_id, company, application_date, status) '
+                     'VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+
+
+def aggregate_stats(cursor, user_id, month_start, next_month_start):
+    cursor.execute('SELECT COUNT(*) FROM applications WHERE user_id = ?', (user_id,))
+    total = cursor.fetchone()[0]
+    cursor.execute('SELECT status, COUNT(*) FROM applications WHERE user_id = ? GROUP BY status', (user_id,))
+    status_counts = dict(cursor.fetchall())
+    cursor.execute('SELECT COUNT(*) FROM applications WHERE user_id = ? '
+                   'AND application_date >= ? AND application_date < ?',
+                   (user_id, month_start, next_month_start))
+    return total, status_counts, cursor.fetchone()[0]
+
+
+def counter_stats(cursor, user_id, month):
+    return counters.read_stats(cursor, user_id, STATUSES, month)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    month = datetime.date(2021, 6, 15)
+    print(f"{'applications':>12}  {'aggregate ms':>12}  {'counters ms':>11}  {'speedup':>7}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = db.connect(os.path.join(tmp, 'bench.db'))
+            migrations.migrate(conn)
+            seed(conn, 1, size)
+            seed(conn, 2, size // 10)
+            cursor = conn.cursor()
+
+            old = timed(lambda: aggregate_stats(cursor, 1, '2021-06-01', '2021-07-01'), args.repeat)
+            new = timed(lambda: counter_stats(cursor, 1, month), args.repeat)
+            print(f'{size:>12}  {old:>12.3f}  {new:>11.3f}  {old / new:>6.0f}x')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Disk usage and memory peak of CV uploads: per-upload copies vs content-addressed blobs.
+
+Uploads the same PDF `--count` times through two apps, feeding the request
+body from a file on disk so only server-side allocations are measured:
+
+- copy:   default Flask request parsing + file.save() to a unique name
+          (the previous behaviour)
+- stream: the real app, with cvstore.UploadRequest hashing to a temp file
+          and content-addressed, reference-counted blobs
+
+    python benchmarks/bench_uploads.py --size-mb 8 --count 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from flask import Flask, request  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+BOUNDARY = 'benchboundary'
+
+
+def write_body(path, size):
+    """Multipart body with form fields and a `size`-byte PDF, written to disk."""
+    chunk = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        for name, value in (('company', 'Bench Corp'), ('application_date', '2025-01-15')):
+            f.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        f.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="cv"; filename="cv.pdf"\r\n'
+                'Content-Type: application/pdf\r\n\r\n%PDF-1.4\n'.encode())
+        written = 0
+        while written < size:
+            part = chunk[:min(len(chunk), size - written)]
+            f.write(part)
+            written += len(part)
+        f.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+def upload(wsgi_app, body_path, headers=None):
+    """Run one upload through `wsgi_app`; returns (status, peak traced bytes, seconds)."""
+    with open(body_path, 'rb') as body:
+        environ = EnvironBuilder(
+            path='/api/applications', method='POST', input_stream=body,
+            content_type=f'multipart/form-data; boundary={BOUNDARY}',
+            content_length=os.path.getsize(body_path), headers=headers or {},
+        ).get_environ()
+        statuses = []
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = wsgi_app(environ, lambda status, _headers, exc_info=None: statuses.append(status))
+        b''.join(result)
+        if hasattr(result, 'close'):
+            result.close()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return statuses[0], peak, elapsed
+
+
+def disk_usage(root):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+def copy_app(upload_folder):
+    legacy = Flask('legacy')
+
+    @legacy.route('/api/applications', methods=['POST'])
+    def create():
+        file = request.files['cv']
+        file.save(os.path.join(upload_folder, f'{uuid.uuid4().hex}_{file.filename}'))
+        return '', 201
+
+    return legacy
+
+
+def report(label, results, upload_folder):
+    peaks = [peak for _, peak, _ in results]
+    seconds = sum(elapsed for _, _, elapsed in results)
+    print(f'{label:<7} status {results[0][0]:<12} disk {disk_usage(upload_folder) / 2**20:8.1f} MiB   '
+          f'peak mem {max(peaks) / 2**20:6.2f} MiB/upload   {len(results) / seconds:6.1f} uploads/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=8)
+    parser.add_argument('--count', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        body_path = os.path.join(tmp, 'body.bin')
+        write_body(body_path, int(args.size_mb * 2**20))
+
+        legacy_uploads = os.path.join(tmp, 'legacy-uploads')
+        os.makedirs(legacy_uploads)
+        legacy = copy_app(legacy_uploads)
+        report('copy', [upload(legacy.wsgi_app, body_path) for _ in range(args.count)], legacy_uploads)
+
+        # Import the real app inside a scratch directory so it creates its
+        # database and uploads there
+        os.chdir(tmp)
+        # --count uploads from one user would run into the per-user write limit
+        os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+        import app as backend
+        client = backend.app.test_client()
+        client.post('/api/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'benchpass'})
+        token = client.post('/api/login', json={'username': 'bench', 'password': 'benchpass'}).json['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        report('stream', [upload(backend.app.wsgi_app, body_path, headers) for _ in range(args.count)],
+               backend.app.config['UPLOAD_FOLDER'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Assert that importing the app does no I/O beyond reading its own code.
+
+Imports `app` (which builds the module-level app through create_app) from an
+empty scratch directory under an audit hook. It fails if the import opens a
+socket, connects to SQLite, creates, writes or removes a file or directory,
+or starts a process. Reading modules to import them is allowed. Exits
+non-zero with the offending events.
+
+    python benchmarks/check_import_side_effects.py
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORBIDDEN_EVENTS = {
+    'socket.connect', 'socket.bind', 'socket.getaddrinfo', 'socket.sendto',
+    'sqlite3.connect',
+    'os.mkdir', 'os.remove', 'os.rename', 'os.rmdir', 'os.truncate', 'shutil.rmtree',
+    'subprocess.Popen', 'os.system', 'os.fork',
+}
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+events = []
+
+
+def audit(event, args):
+    if event in FORBIDDEN_EVENTS:
+        events.append((event, args))
+    elif event == 'open':
+        path, mode, flags = args
+        if (mode and any(c in mode for c in 'wax+')) or (flags and flags & WRITE_FLAGS):
+            events.append((event, args))
+
+
+def main():
+    # Compiled bytecode would otherwise be written while importing
+    sys.dont_write_bytecode = True
+    sys.path.insert(0, BACKEND)
+    scratch = tempfile.mkdtemp(prefix='import-check-')
+    os.chdir(scratch)
+
+    sys.addaudithook(audit)
+    import app  # noqa: F401
+    found = list(events)
+
+    created = os.listdir(scratch)
+    for event, args in found:
+        print(f'FAIL {event} {args!r}')
+    for name in created:
+        print(f'FAIL created {name} in the working directory')
+    if found or created:
+        sys.exit(f'Importing app did {len(found) + len(created)} I/O operations')
+    print('ok   importing app did no I/O')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Assert that the hot per-user queries are served from an index.
+
+Runs the migrations against a scratch database and checks EXPLAIN QUERY PLAN
+for each query: every plan must search an index, never SCAN a table. Exits
+non-zero on the first query that would fall back to a full scan.
+
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import migrations  # noqa: E402
+
+HOT_QUERIES = {
+    'list applications': (
+        'SELECT id, company, application_date, cover_letter, cv_filename, status, '
+        'accepted_date, rejected_date, interview_date, created_at '
+        'FROM applications WHERE user_id = ? ORDER BY application_date DESC, id DESC',
+        (1,),
+    ),
+    'list applications page': (
+        'SELECT id, company, application_date, status FROM applications '
+        'WHERE user_id = ? AND (application_date, id) < (?, ?) '
+        'ORDER BY application_date DESC, id DESC LIMIT ?',
+        (1, '2025-01-01', 10, 51),
+    ),
+    'get application': (
+        'SELECT id FROM applications WHERE id = ? AND user_id = ?',
+        (1, 1),
+    ),
+    'download ownership check': (
+        'SELECT id FROM applications WHERE user_id = ? AND cv_filename = ?',
+        (1, 'cv.pdf'),
+    ),
+    'stats counters': (
+        'SELECT bucket, count FROM application_counters WHERE user_id = ? AND bucket IN (?, ?, ?)',
+        (1, 'total', 'status:pending', 'month:2025-01'),
+    ),
+    'calendar window': (
+        "SELECT application_date AS day, 'application' AS type, id, company, status FROM applications "
+        'WHERE user_id = ? AND application_date >= ? AND application_date <= ? '
+        "UNION ALL SELECT interview_date, 'interview', id, company, status FROM applications "
+        "WHERE user_id = ? AND interview_date >= ? AND interview_date <= ? AND status = ? "
+        "UNION ALL SELECT accepted_date, 'accepted', id, company, status FROM applications "
+        "WHERE user_id = ? AND accepted_date >= ? AND accepted_date <= ? AND status = ? "
+        "UNION ALL SELECT rejected_date, 'rejected', id, company, status FROM applications "
+        "WHERE user_id = ? AND rejected_date >= ? AND rejected_date <= ? AND status = ? "
+        'ORDER BY day, id',
+        (1, '2025-01-01', '2025-01-31',
+         1, '2025-01-01', '2025-01-31', 'interview',
+         1, '2025-01-01', '2025-01-31', 'accepted',
+         1, '2025-01-01', '2025-01-31', 'rejected'),
+    ),
+    'change feed': (
+        'SELECT id, company, change_seq, updated_at FROM applications '
+        'WHERE user_id = ? AND change_seq > ? ORDER BY change_seq LIMIT ?',
+        (1, 100, 501),
+    ),
+    'change feed tombstones': (
+        'SELECT application_id FROM application_tombstones '
+        'WHERE user_id = ? AND change_seq > ? AND change_seq <= ? ORDER BY change_seq',
+        (1, 100, 200),
+    ),
+    'notes page': (
+        'SELECT id, body, created_at, updated_at FROM application_notes '
+        'WHERE application_id = ? AND id < ? ORDER BY id DESC LIMIT ?',
+        (1, 100, 21),
+    ),
+    'notes on application delete': (
+        'DELETE FROM application_notes WHERE application_id = ?',
+        (1,),
+    ),
+    'analytics monthly series': (
+        analytics.SERIES_SQL['month'],
+        (1, '2025-01-01', '2026-01-01'),
+    ),
+    'login': (
+        'SELECT id, username, password FROM users WHERE username = ?',
+        ('admin',),
+    ),
+}
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def uses_index(plan, tables):
+    # Scans of CTEs and subqueries are fine, scans of stored tables are not
+    def full_scan(step):
+        words = step.split()
+        return (words[0] == 'SCAN' and len(words) > 1 and words[1] in tables
+                and not ('USING' in step and 'INDEX' in step))
+    return bool(plan) and not any(full_scan(step) for step in plan)
+
+
+def main():
+    conn = sqlite3.connect(':memory:')
+    migrations.migrate(conn)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    failures = 0
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = query_plan(conn, sql, params)
+        ok = uses_index(plan, tables)
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<26} {' | '.join(plan)}")
+
+    if failures:
+        sys.exit(f'{failures} hot quer{"y" if failures == 1 else "ies"} without an index')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Check a CV storage driver end to end, and time S3 reads with and without pooling.
+
+Runs the operations cvstore.py and download_file rely on: put_file (which
+must consume its source), exists, list (recursive and top level), ranged
+get, local_copy, presigned URLs (fetched over HTTP, with their headers) and
+delete. Always checks LocalStorage in a scratch directory; checks S3Storage
+too when S3_BUCKET is set, e.g. against a local MinIO:
+
+    docker run -d -p 9000:9000 -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio123 \\
+        minio/minio server /data
+    S3_ENDPOINT_URL=http://localhost:9000 S3_BUCKET=cv-check S3_ACCESS_KEY_ID=minio \\
+        S3_SECRET_ACCESS_KEY=minio123 python benchmarks/check_storage.py
+
+The bucket is created if missing. For S3 it then times --requests small
+ranged reads through the shared, pooled client against a new client (and
+connection) per read. Exits non-zero on the first failed check.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cvstore  # noqa: E402
+import storage  # noqa: E402
+
+SHA256 = 'ab' + '0' * 62
+BODY = b'%PDF-1.4\n' + bytes(range(256)) * 512 + b'\n%%EOF\n'
+
+
+def check(condition, message):
+    if not condition:
+        sys.exit(f'FAIL {message}')
+    print(f'ok   {message}')
+
+
+def scratch_file(directory, data):
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        f.write(data)
+    return f.name
+
+
+def read(store, key, byte_range=None):
+    if isinstance(store, storage.LocalStorage):
+        with open(store.path(key), 'rb') as f:
+            return f.read()
+    return b''.join(store.get(key, byte_range).chunks)
+
+
+def check_driver(store):
+    print(f'--- {store.name}')
+    key, preview, legacy = cvstore.blob_key(SHA256), cvstore.preview_key(SHA256), '1_1700000000.0_cv.pdf'
+    for name in (key, preview, legacy):
+        source = scratch_file(store.scratch_dir, BODY)
+        store.put_file(name, source, content_type='application/pdf')
+        check(not os.path.exists(source), f'put_file consumes its source ({name})')
+
+    check(store.exists(key) and not store.exists(cvstore.blob_key('cd' + '0' * 62)), 'exists')
+    check(read(store, key) == BODY, 'read back the whole object')
+
+    blobs = {name for name, _ in store.list(cvstore.BLOB_PREFIX)}
+    top = {name for name, _ in store.list(recursive=False)}
+    check(blobs == {key, preview}, f'list blobs/ recursively: {sorted(blobs)}')
+    check(legacy in top and not any(name.startswith(cvstore.BLOB_PREFIX) for name in top),
+          f'list top level only: {sorted(top)}')
+
+    with store.local_copy(key) as path:
+        with open(path, 'rb') as f:
+            check(f.read() == BODY, 'local_copy')
+
+    if isinstance(store, storage.S3Storage):
+        obj = store.get(key, 'bytes=100-199')
+        check(b''.join(obj.chunks) == BODY[100:200] and obj.length == 100
+              and obj.content_range == f'bytes 100-199/{len(BODY)}', f'ranged get ({obj.content_range})')
+        try:
+            store.get(key, f'bytes={len(BODY) + 10}-')
+            check(False, 'range past the end is refused')
+        except storage.RangeNotSatisfiable:
+            check(True, 'range past the end is refused')
+        try:
+            store.get(cvstore.blob_key('cd' + '0' * 62))
+            check(False, 'missing key raises FileNotFoundError')
+        except FileNotFoundError:
+            check(True, 'missing key raises FileNotFoundError')
+
+        url = store.presigned_url(key, 'application/pdf', 'inline; filename=cv.pdf', 60)
+        request = urllib.request.Request(url, headers={'Range': 'bytes=0-99'})
+        with urllib.request.urlopen(request) as response:
+            check(response.status == 206 and response.read() == BODY[:100]
+                  and response.headers['Content-Disposition'] == 'inline; filename=cv.pdf'
+                  and response.headers['Content-Type'] == 'application/pdf',
+                  'presigned URL serves ranges with the requested headers')
+    else:
+        check(store.presigned_url(key, 'application/pdf', 'inline', 60) is None, 'no presigned URLs locally')
+
+    for name in (key, preview, legacy):
+        store.delete(name)
+    check(not store.exists(key) and not list(store.list(cvstore.BLOB_PREFIX)), 'delete')
+
+
+def time_pooling(store, requests):
+    key = cvstore.blob_key(SHA256)
+    store.put_file(key, scratch_file(store.scratch_dir, BODY), content_type='application/pdf')
+
+    def timed(make_store):
+        start = time.perf_counter()
+        for _ in range(requests):
+            b''.join(make_store().get(key, 'bytes=0-4095').chunks)
+        return (time.perf_counter() - start) / requests * 1000
+
+    timed(lambda: store)  # warm up the shared client
+    pooled = timed(lambda: store)
+    fresh = timed(lambda: s3_from_env(store.scratch_dir))
+    store.delete(key)
+    print(f'4 KiB ranged read: {pooled:.2f} ms with the pooled client, {fresh:.2f} ms with a new client each time')
+
+
+def s3_from_env(scratch_dir):
+    return storage.S3Storage(
+        os.environ['S3_BUCKET'], scratch_dir,
+        prefix=os.environ.get('S3_PREFIX', 'check-storage'),
+        endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+        region=os.environ.get('S3_REGION') or 'us-east-1',
+        access_key=os.environ.get('S3_ACCESS_KEY_ID'),
+        secret_key=os.environ.get('S3_SECRET_ACCESS_KEY'),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_driver(storage.LocalStorage(os.path.join(tmp, 'uploads')))
+
+        if not os.environ.get('S3_BUCKET'):
+            print('S3_BUCKET not set, skipping S3Storage')
+            return
+        store = s3_from_env(os.path.join(tmp, 'scratch'))
+        try:
+            store.client.create_bucket(Bucket=store.bucket)
+        except (store.client.exceptions.BucketAlreadyOwnedByYou, store.client.exceptions.BucketAlreadyExists):
+            pass
+        check_driver(store)
+        time_pooling(store, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""Reproducible load test of the whole API against a local gunicorn.
+
+Seeds a fresh database with `--users` users x `--per-user` applications
+(generated cover letters, a pool of `--cv-blobs` CV files shared by
+`--cv-ratio` of the applications). Seeding writes SQLite directly, so the
+triggers maintain counters, search index and blob refcounts exactly as the
+API would. Then, for each level in `--concurrency`, it runs that many clients
+for `--duration` seconds. Each client draws operations from a weighted mix:
+
+    register, login, list, get, search, stats, calendar, export,
+    create, upload (create with a CV), update, status, batch, import,
+    delete (applications this run created), download
+
+It reports throughput and latency percentiles per operation, plus database
+and upload folder size before and after each level. `--output` writes the
+results as JSON along with the commit, versions and arguments. `--compare`
+prints the difference from an earlier run's JSON.
+
+    python benchmarks/loadtest.py --users 1000 --per-user 1000 --seed-cache /tmp/seed-1k \\
+        --concurrency 1 8 32 --duration 30 --output results.json
+    python benchmarks/loadtest.py --mix list=1,get=1 --compare results.json
+
+Seeding 1k x 1k takes several minutes. `--seed-cache` keeps a pristine copy
+keyed by the seed arguments, and each run starts from a copy of it.
+"""
+import argparse
+import datetime
+import hashlib
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import bcrypt
+
+from loadtest_modes import BACKEND, BOUNDARY, MODES, free_port, multipart, request, start_server, stop_server
+
+sys.path.insert(0, BACKEND)
+
+import cvstore  # noqa: E402
+import db  # noqa: E402
+import migrations  # noqa: E402
+
+PASSWORD = 'loadtest-password'
+STATUSES = ('pending', 'accepted', 'rejected', 'interview')
+
+MIX = {
+    'register': 1,
+    'login': 2,
+    'list': 20,
+    'get': 15,
+    'search': 6,
+    'stats': 10,
+    'calendar': 4,
+    'export': 1,
+    'create': 6,
+    'upload': 4,
+    'update': 5,
+    'status': 8,
+    'batch': 2,
+    'import': 1,
+    'delete': 4,
+    'download': 6,
+}
+
+PERCENTILES = (0.50, 0.90, 0.95, 0.99)
+
+WORDS = ('experience team product customer platform design data engineering role company growth '
+         'project delivery python backend systems scale reliable ownership mentoring culture remote '
+         'passion impact analytics cloud infrastructure collaborate stakeholders roadmap quality '
+         'testing performance security mission startup enterprise opportunity background skills').split()
+COMPANIES = ('Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Wonka', 'Tyrell',
+             'Cyberdyne', 'Soylent', 'Aperture', 'Vandelay', 'Massive Dynamic', 'Pied Piper')
+
+
+def cover_letter(rng):
+    sentences = []
+    for _ in range(rng.randint(6, 18)):
+        words = rng.choices(WORDS, k=rng.randint(8, 20))
+        sentences.append(' '.join(words).capitalize() + '.')
+    return ' '.join(sentences)
+
+
+def fake_pdf(rng, size):
+    """A valid one-page PDF with a cover letter's worth of text, padded to about `size` bytes."""
+    lines = [cover_letter(rng)[i:i + 80] for i in range(0, 800, 80)]
+    text = ' '.join(f'({line.replace("(", "").replace(")", "")}) Tj T*' for line in lines)
+    stream = f'BT /F1 10 Tf 14 TL 50 750 Td {text} ET'.encode()
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R '
+        b'/Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    # Comment lines stand in for images and fonts a real CV would carry
+    padding = b''.join(b'%' + rng.randbytes(32).hex().encode() + b'\n' for _ in range(max(0, size - 1500) // 66))
+    out = b'%PDF-1.4\n' + padding
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return out
+
+
+def seed_database(workdir, args):
+    """Create the schema and bulk-insert users, applications and CV blobs."""
+    rng = random.Random(args.random_seed)
+    upload_folder = os.path.join(workdir, 'uploads')
+    os.makedirs(upload_folder, exist_ok=True)
+    conn = db.connect(os.path.join(workdir, 'jobtracker.db'))
+    migrations.migrate(conn)
+
+    blobs = []
+    for _ in range(args.cv_blobs):
+        data = fake_pdf(rng, args.cv_kb * 1024)
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = os.path.join(upload_folder, *cvstore.blob_key(sha256).split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        # Marked extracted so the reconcile job does not queue work for every blob
+        # (their text is not searchable; uploads during the run are extracted)
+        conn.execute('INSERT INTO cv_blobs (sha256, size, extracted_at) VALUES (?, ?, CURRENT_TIMESTAMP)',
+                     (sha256, len(data)))
+        blobs.append(sha256)
+    conn.commit()
+
+    # One hash for everyone, at the cost the server uses, so logins never rehash
+    password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(args.bcrypt_rounds)).decode()
+    conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                     ((f'seed{n}', f'seed{n}@example.com', password) for n in range(args.users)))
+    conn.commit()
+
+    start = datetime.date(2023, 1, 1)
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+    for number, user_id in enumerate(user_ids):
+        rows = []
+        for i in range(args.per_user):
+            applied = start + datetime.timedelta(days=rng.randrange(1000))
+            status = rng.choice(STATUSES)
+            outcome = (applied + datetime.timedelta(days=rng.randint(3, 60))).isoformat()
+            cv = rng.choice(blobs) if blobs and rng.random() < args.cv_ratio else None
+            rows.append((user_id, f'{rng.choice(COMPANIES)} {rng.randrange(10000)}', applied.isoformat(),
+                         cover_letter(rng), f'{user_id}_seed{i}_cv.pdf' if cv else None, cv, status,
+                         outcome if status == 'accepted' else None,
+                         outcome if status == 'rejected' else None,
+                         outcome if status == 'interview' else None))
+        conn.executemany('''
+            INSERT INTO applications (user_id, company, application_date, cover_letter, cv_filename, cv_sha256,
+                                      status, accepted_date, rejected_date, interview_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        if args.users >= 20 and (number + 1) % (args.users // 10) == 0:
+            print(f'  seeded {number + 1}/{args.users} users', file=sys.stderr)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.execute('ANALYZE')
+    conn.close()
+
+
+def prepare_workdir(args):
+    """A fresh copy of the seeded database (from `--seed-cache` when possible)."""
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    if not args.seed_cache:
+        print('Seeding...', file=sys.stderr)
+        seed_database(workdir, args)
+        return workdir
+
+    key = json.dumps({name: getattr(args, name) for name in
+                      ('users', 'per_user', 'cv_blobs', 'cv_kb', 'cv_ratio', 'bcrypt_rounds', 'random_seed')},
+                     sort_keys=True)
+    template = os.path.join(args.seed_cache, hashlib.sha256(key.encode()).hexdigest()[:16])
+    if not os.path.exists(os.path.join(template, 'seed.json')):
+        print(f'Seeding into {template}...', file=sys.stderr)
+        shutil.rmtree(template, ignore_errors=True)
+        os.makedirs(template)
+        seed_database(template, args)
+        with open(os.path.join(template, 'seed.json'), 'w') as f:
+            f.write(key)
+    shutil.copytree(template, workdir, dirs_exist_ok=True)
+    return workdir
+
+
+def storage_size(workdir):
+    database = sum(os.path.getsize(os.path.join(workdir, name))
+                   for name in ('jobtracker.db', 'jobtracker.db-wal', 'jobtracker.db-shm')
+                   if os.path.exists(os.path.join(workdir, name)))
+    uploads = 0
+    for root, _, files in os.walk(os.path.join(workdir, 'uploads')):
+        uploads += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    with sqlite3.connect(os.path.join(workdir, 'jobtracker.db')) as conn:
+        applications = conn.execute('SELECT COUNT(*) FROM applications').fetchone()[0]
+        users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    return {'database_bytes': database, 'uploads_bytes': uploads, 'users': users, 'applications': applications}
+
+
+def open_sessions(port, workdir, count, rng):
+    """Log in `count` seeded users and collect ids and CV filenames to work on."""
+    with sqlite3.connect(os.path.join(workdir, 'jobtracker.db')) as conn:
+        usernames = [row[0] for row in conn.execute('SELECT username FROM users WHERE username LIKE ?', ('seed%',))]
+        sessions = []
+        for username in rng.sample(usernames, min(count, len(usernames))):
+            status, data = request(port, 'POST', '/api/login',
+                                   json.dumps({'username': username, 'password': PASSWORD}),
+                                   {'Content-Type': 'application/json'})
+            if status != 200:
+                raise RuntimeError(f'login failed: {status} {data[:200]}')
+            user_id = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()[0]
+            rows = conn.execute('SELECT id, cv_filename FROM applications WHERE user_id = ?', (user_id,)).fetchall()
+            sessions.append({
+                'username': username,
+                'token': json.loads(data)['token'],
+                'ids': [row[0] for row in rows],
+                'cv_filenames': [row[1] for row in rows if row[1]],
+                'created': [],
+                'lock': threading.Lock(),
+            })
+    return sessions
+
+
+class Client:
+    """One simulated user agent: a keep-alive connection and its own RNG."""
+
+    def __init__(self, port, sessions, pdf, seed, registrations):
+        self.port = port
+        self.sessions = sessions
+        self.pdf = pdf
+        self.rng = random.Random(seed)
+        self.registrations = registrations
+        self.conn = None
+
+    def call(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            return request(self.port, method, path, body, headers, conn=self.conn)
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return 0, b''
+
+    def run(self, op):
+        """Perform `op`; returns (op actually performed, status)."""
+        rng = self.rng
+        session = rng.choice(self.sessions)
+        auth = {'Authorization': f"Bearer {session['token']}"}
+        as_json = dict(auth, **{'Content-Type': 'application/json'})
+        as_form = dict(auth, **{'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'})
+
+        if op == 'delete':
+            with session['lock']:
+                app_id = session['created'].pop() if session['created'] else None
+            if app_id is None:
+                op = 'create'
+            else:
+                return op, self.call('DELETE', f'/api/applications/{app_id}', headers=auth)[0]
+
+        if op == 'register':
+            username = f'reg{next(self.registrations)}-{rng.randrange(10 ** 9)}'
+            body = json.dumps({'username': username, 'email': f'{username}@example.com', 'password': PASSWORD})
+            return op, self.call('POST', '/api/register', body, {'Content-Type': 'application/json'})[0]
+        if op == 'login':
+            body = json.dumps({'username': session['username'], 'password': PASSWORD})
+            return op, self.call('POST', '/api/login', body, {'Content-Type': 'application/json'})[0]
+        if op == 'list':
+            query = rng.choice(('limit=50', 'limit=50&status=pending', 'limit=20&company=acme', 'limit=50&fields=id,company,status'))
+            return op, self.call('GET', f'/api/applications?{query}', headers=auth)[0]
+        if op == 'get':
+            return op, self.call('GET', f"/api/applications/{rng.choice(session['ids'])}", headers=auth)[0]
+        if op == 'search':
+            return op, self.call('GET', f'/api/search?q={rng.choice(WORDS)}', headers=auth)[0]
+        if op == 'stats':
+            return op, self.call('GET', '/api/stats', headers=auth)[0]
+        if op == 'calendar':
+            first = datetime.date(2023, 1, 1) + datetime.timedelta(days=rng.randrange(1000))
+            last = first + datetime.timedelta(days=41)
+            return op, self.call('GET', f'/api/calendar?start={first}&end={last}', headers=auth)[0]
+        if op == 'export':
+            return op, self.call('GET', '/api/applications/export?format=ndjson', headers=auth)[0]
+        if op == 'status':
+            body = json.dumps({'status': rng.choice(STATUSES)})
+            return op, self.call('PATCH', f"/api/applications/{rng.choice(session['ids'])}/status", body, as_json)[0]
+        if op == 'update':
+            fields = {'company': f'{rng.choice(COMPANIES)} {rng.randrange(10000)}', 'application_date': '2025-03-01',
+                      'cover_letter': cover_letter(rng), 'status': rng.choice(STATUSES)}
+            return op, self.call('PUT', f"/api/applications/{rng.choice(session['ids'])}", multipart(fields), as_form)[0]
+        if op == 'batch':
+            operations = [{'op': 'status', 'id': app_id, 'status': rng.choice(STATUSES)}
+                          for app_id in rng.sample(session['ids'], min(10, len(session['ids'])))]
+            return op, self.call('POST', '/api/applications/batch', json.dumps({'operations': operations}), as_json)[0]
+        if op == 'import':
+            ndjson = ''.join(json.dumps({'company': f'Imported {rng.randrange(10000)}', 'application_date': '2025-02-01',
+                                         'cover_letter': cover_letter(rng)}) + '\n' for _ in range(10))
+            return op, self.call('POST', '/api/applications/import', ndjson.encode(),
+                                 dict(auth, **{'Content-Type': 'application/x-ndjson'}))[0]
+        if op == 'download':
+            if not session['cv_filenames']:
+                return op, self.call('GET', '/api/stats', headers=auth)[0]
+            return op, self.call('GET', f"/api/uploads/{rng.choice(session['cv_filenames'])}", headers=auth)[0]
+
+        # create / upload (each upload unique, so blob dedup does not hide storage growth)
+        fields = {'company': f'{rng.choice(COMPANIES)} {rng.randrange(10000)}', 'application_date': '2025-06-01',
+                  'cover_letter': cover_letter(rng)}
+        status, data = self.call('POST', '/api/applications',
+                                 multipart(fields, self.pdf + b'%' + rng.randbytes(8).hex().encode() + b'\n'
+                                           if op == 'upload' else None), as_form)
+        if status == 201:
+            with session['lock']:
+                session['created'].append(json.loads(data)['application_id'])
+        return op, status
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_level(port, sessions, mix, concurrency, args):
+    pdf = fake_pdf(random.Random(args.random_seed), args.upload_kb * 1024)
+    ops, weights = zip(*mix.items())
+    registrations = iter(range(10 ** 9))
+    results = []
+    stop = threading.Event()
+
+    def drive(n):
+        client = Client(port, sessions, pdf, args.random_seed * 1000 + concurrency * 100 + n, registrations)
+        rows = []
+        while not stop.is_set():
+            wanted = client.rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            op, status = client.run(wanted)
+            rows.append((op, time.perf_counter() - start, status))
+        client.close()
+        results.extend(rows)
+
+    threads = [threading.Thread(target=drive, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarise(rows, duration):
+    latencies = sorted(latency for _, latency, _ in rows)
+    summary = {
+        'requests': len(rows),
+        'errors': sum(1 for _, _, status in rows if status == 0 or status >= 500),
+        'rps': round(len(rows) / duration, 2),
+        'statuses': {},
+    }
+    for _, _, status in rows:
+        summary['statuses'][str(status)] = summary['statuses'].get(str(status), 0) + 1
+    if latencies:
+        summary['mean_ms'] = round(sum(latencies) / len(latencies) * 1000, 2)
+        for fraction in PERCENTILES:
+            summary[f'p{int(fraction * 100)}_ms'] = round(percentile(latencies, fraction) * 1000, 2)
+        summary['max_ms'] = round(latencies[-1] * 1000, 2)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    if not text:
+        return dict(MIX)
+    mix = {}
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        if op not in MIX:
+            raise SystemExit(f'Unknown operation {op!r}; choose from {", ".join(MIX)}')
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def print_level(level):
+    total = level['total']
+    print(f"\nconcurrency {level['concurrency']}: {total['rps']} req/s, p50 {total.get('p50_ms')} ms, "
+          f"p99 {total.get('p99_ms')} ms, {total['errors']} errors / {total['requests']} requests")
+    for op, row in level['operations'].items():
+        print(f"  {op:<9} {row['requests']:>7} req {row['rps']:>8} req/s  p50 {row.get('p50_ms')!s:>8}  "
+              f"p95 {row.get('p95_ms')!s:>8}  p99 {row.get('p99_ms')!s:>8} ms  errors {row['errors']}")
+    before, after = level['storage_before'], level['storage_after']
+    print(f"  database {before['database_bytes'] / 2 ** 20:.1f} -> {after['database_bytes'] / 2 ** 20:.1f} MiB, "
+          f"uploads {before['uploads_bytes'] / 2 ** 20:.1f} -> {after['uploads_bytes'] / 2 ** 20:.1f} MiB, "
+          f"applications {before['applications']} -> {after['applications']}")
+
+
+def print_comparison(results, baseline):
+    """Relative change in throughput and p50/p99 per level and operation."""
+    def change(new, old):
+        if new is None or not old:
+            return '     n/a'
+        return f'{(new - old) / old * 100:+7.1f}%'
+
+    previous = {level['concurrency']: level for level in baseline['levels']}
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('started')}):")
+    for level in results['levels']:
+        old = previous.get(level['concurrency'])
+        if old is None:
+            continue
+        print(f"  concurrency {level['concurrency']}")
+        rows = [('total', level['total'], old['total'])]
+        rows += [(op, row, old['operations'][op]) for op, row in level['operations'].items() if op in old['operations']]
+        for op, new_row, old_row in rows:
+            print(f"    {op:<9} rps {change(new_row['rps'], old_row['rps'])}  "
+                  f"p50 {change(new_row.get('p50_ms'), old_row.get('p50_ms'))}  "
+                  f"p99 {change(new_row.get('p99_ms'), old_row.get('p99_ms'))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--per-user', type=int, default=200, help='seeded applications per user')
+    parser.add_argument('--cv-blobs', type=int, default=50, help='distinct CV files in the seed')
+    parser.add_argument('--cv-kb', type=int, default=200)
+    parser.add_argument('--cv-ratio', type=float, default=0.3, help='share of seeded applications with a CV')
+    parser.add_argument('--seed-cache', help='directory to keep seeded databases in between runs')
+    parser.add_argument('--sessions', type=int, default=32, help='seeded users the clients act as')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=20, help='seconds per concurrency level')
+    parser.add_argument('--mix', help='operation weights, e.g. list=5,get=3 (default: built-in mix)')
+    parser.add_argument('--upload-kb', type=int, default=200)
+    parser.add_argument('--mode', choices=sorted(MODES), default='wsgi')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--bcrypt-rounds', type=int, default=10)
+    parser.add_argument('--random-seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--keep', action='store_true', help='keep the working directory')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.bcrypt_rounds)
+    os.environ.setdefault('CV_DOWNLOAD_MODE', 'sendfile')
+    workdir = prepare_workdir(args)
+    os.environ['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    results = {
+        'meta': {
+            'started': datetime.datetime.now(datetime.UTC).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+            'mix': mix,
+        },
+        'levels': [],
+    }
+
+    port = free_port()
+    process = start_server(args.mode, port, workdir, args.workers)
+    try:
+        sessions = open_sessions(port, workdir, args.sessions, random.Random(args.random_seed))
+        for concurrency in args.concurrency:
+            before = storage_size(workdir)
+            rows = run_level(port, sessions, mix, concurrency, args)
+            level = {
+                'concurrency': concurrency,
+                'total': summarise(rows, args.duration),
+                'operations': {op: summarise([row for row in rows if row[0] == op], args.duration) for op in mix},
+                'storage_before': before,
+                'storage_after': storage_size(workdir),
+            }
+            results['levels'].append(level)
+            print_level(level)
+    finally:
+        stop_server(process)
+        if args.keep:
+            print(f'\nWorking directory kept at {workdir}', file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+    if baseline:
+        print_comparison(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
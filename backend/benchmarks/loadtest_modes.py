@@ -0,0 +1,325 @@
+"""Load test: the WSGI (gthread) and ASGI (uvicorn) serving modes side by side.
+
+Starts gunicorn in each mode on a fresh database in a temp directory, then
+drives the same mix of traffic against both from `--clients` threads for
+`--duration` seconds:
+
+- reads:   paginated list, stats, single application
+- writes:  create application, status change
+- uploads: create application with a `--upload-kb` PDF
+- logins:  bcrypt check
+- slow:    `--slow-clients` extra clients that trickle an upload body over
+           `--slow-seconds`, like a phone on a bad connection
+
+and reports throughput and p50/p99 latency per mode and per operation
+(slow clients are excluded from the numbers; they only apply pressure).
+
+Before the run, each mode is also sent two login bodies over the 16MB
+MAX_CONTENT_LENGTH: one announced by Content-Length, which must be refused
+with a 413 without being sent, and a chunked one, which must be refused
+before much more than the limit has gone out.
+
+    python benchmarks/loadtest_modes.py --duration 20 --clients 32 --slow-clients 8
+    python benchmarks/loadtest_modes.py --modes asgi --json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import select
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'wsgi': ['--worker-class', 'gthread', '--threads', '4', 'app:app'],
+    'asgi': ['--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:application'],
+}
+
+# Relative weights of each operation in the mix
+MIX = (
+    ('list', 30),
+    ('stats', 15),
+    ('get', 20),
+    ('create', 10),
+    ('status', 10),
+    ('upload', 10),
+    ('login', 5),
+)
+
+BOUNDARY = 'loadtestboundary'
+# The backend's MAX_CONTENT_LENGTH
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+PASSWORD = 'loadtest-password'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, workdir, workers):
+    # Every virtual user logs in from 127.0.0.1, which the login limit would throttle
+    env = dict(os.environ, BCRYPT_LOG_ROUNDS=os.environ.get('BCRYPT_LOG_ROUNDS', '10'),
+               RATE_LIMIT_ENABLED=os.environ.get('RATE_LIMIT_ENABLED', '0'))
+    # The backend's gunicorn.conf.py migrates in the master before forking workers
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(BACKEND, 'gunicorn.conf.py'),
+         '--pythonpath', BACKEND, '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--log-level', 'warning', *MODES[mode]],
+        cwd=workdir, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            status, _ = request(port, 'GET', '/')
+            if status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{mode} server did not start')
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def request(port, method, path, body=None, headers=None, conn=None):
+    own = conn is None
+    conn = conn or http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        if own:
+            conn.close()
+
+
+def response_status(sock):
+    """Status code of the response waiting on `sock`, or None if there is none."""
+    try:
+        line = sock.makefile('rb').readline()
+        return int(line.split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def check_body_limit(port, limit=MAX_CONTENT_LENGTH):
+    """Send /api/login bodies over `limit`; returns {case: (status, bytes sent)}."""
+    results = {}
+    headers = 'POST /api/login HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+    with socket.create_connection(('127.0.0.1', port), timeout=30) as sock:
+        # Only the headers: a server that waits for the body never answers
+        sock.sendall(f'{headers}Content-Length: {limit * 2 + 1}\r\n\r\n'.encode())
+        results['content_length'] = (response_status(sock), 0)
+
+    chunk = b'x' * 65536
+    framed = f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n'
+    sent = 0
+    with socket.create_connection(('127.0.0.1', port), timeout=30) as sock:
+        sock.sendall(f'{headers}Transfer-Encoding: chunked\r\n\r\n'.encode())
+        try:
+            # Stop as soon as the server answers
+            while sent <= limit * 2 and not select.select([sock], [], [], 0)[0]:
+                sock.sendall(framed)
+                sent += len(chunk)
+        except OSError:
+            pass
+        results['chunked'] = (response_status(sock), sent)
+    return results
+
+
+def multipart(fields, pdf_bytes=None):
+    parts = [f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+             for name, value in fields.items()]
+    if pdf_bytes is not None:
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="cv"; filename="cv.pdf"\r\n'
+                     'Content-Type: application/pdf\r\n\r\n'.encode() + pdf_bytes + b'\r\n')
+    parts.append(f'--{BOUNDARY}--\r\n'.encode())
+    return b''.join(parts)
+
+
+def seed(port, users, per_user):
+    """Register users, log them in and give each `per_user` applications."""
+    sessions = []
+    for n in range(users):
+        username = f'load{n}'
+        body = json.dumps({'username': username, 'email': f'{username}@example.com', 'password': PASSWORD})
+        request(port, 'POST', '/api/register', body, {'Content-Type': 'application/json'})
+        status, data = request(port, 'POST', '/api/login',
+                               json.dumps({'username': username, 'password': PASSWORD}),
+                               {'Content-Type': 'application/json'})
+        if status != 200:
+            raise RuntimeError(f'login failed during seeding: {status} {data[:200]}')
+        token = json.loads(data)['token']
+        ndjson = ''.join(json.dumps({'company': f'Seed {i}', 'application_date': f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+                                     'status': 'pending'}) + '\n' for i in range(per_user))
+        request(port, 'POST', '/api/applications/import', ndjson.encode(),
+                {'Content-Type': 'application/x-ndjson', 'Authorization': f'Bearer {token}'})
+        status, data = request(port, 'GET', '/api/applications?limit=200&fields=id',
+                               headers={'Authorization': f'Bearer {token}'})
+        ids = [row['id'] for row in json.loads(data)['applications']]
+        sessions.append({'username': username, 'token': token, 'ids': ids})
+    return sessions
+
+
+def run_operation(port, conn, op, session, pdf):
+    auth = {'Authorization': f"Bearer {session['token']}"}
+    if op == 'list':
+        return request(port, 'GET', '/api/applications?limit=50', headers=auth, conn=conn)[0]
+    if op == 'stats':
+        return request(port, 'GET', '/api/stats', headers=auth, conn=conn)[0]
+    if op == 'get':
+        return request(port, 'GET', f"/api/applications/{random.choice(session['ids'])}", headers=auth, conn=conn)[0]
+    if op == 'status':
+        body = json.dumps({'status': random.choice(('pending', 'interview', 'accepted', 'rejected'))})
+        return request(port, 'PATCH', f"/api/applications/{random.choice(session['ids'])}/status", body,
+                       dict(auth, **{'Content-Type': 'application/json'}), conn=conn)[0]
+    if op == 'login':
+        body = json.dumps({'username': session['username'], 'password': PASSWORD})
+        return request(port, 'POST', '/api/login', body, {'Content-Type': 'application/json'}, conn=conn)[0]
+    fields = {'company': f'Load {random.randrange(10 ** 6)}', 'application_date': '2025-06-01'}
+    body = multipart(fields, pdf if op == 'upload' else None)
+    return request(port, 'POST', '/api/applications', body,
+                   dict(auth, **{'Content-Type': f'multipart/form-data; boundary={BOUNDARY}'}), conn=conn)[0]
+
+
+def client(port, sessions, pdf, stop, results):
+    ops = [op for op, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        op = random.choices(ops, weights)[0]
+        start = time.perf_counter()
+        try:
+            status = run_operation(port, conn, op, random.choice(sessions), pdf)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            status = 0
+        results.append((op, time.perf_counter() - start, status))
+    conn.close()
+
+
+def slow_client(port, sessions, pdf, stop, seconds):
+    """Upload a CV in small pieces spread over `seconds`, over and over."""
+    while not stop.is_set():
+        session = random.choice(sessions)
+        body = multipart({'company': 'Slow upload', 'application_date': '2025-06-01'}, pdf)
+        pieces = 20
+        step = len(body) // pieces + 1
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=60) as sock:
+                head = (f'POST /api/applications HTTP/1.1\r\nHost: localhost\r\n'
+                        f"Authorization: Bearer {session['token']}\r\n"
+                        f'Content-Type: multipart/form-data; boundary={BOUNDARY}\r\n'
+                        f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode()
+                sock.sendall(head)
+                for offset in range(0, len(body), step):
+                    if stop.is_set():
+                        break
+                    sock.sendall(body[offset:offset + step])
+                    time.sleep(seconds / pieces)
+                sock.recv(65536)
+        except OSError:
+            pass
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarise(results, duration):
+    def stats(rows):
+        latencies = [latency for _, latency, _ in rows]
+        return {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, status in rows if status == 0 or status >= 500),
+            'rps': round(len(rows) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if rows else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if rows else None,
+        }
+
+    summary = stats(results)
+    summary['operations'] = {op: stats([row for row in results if row[0] == op]) for op, _ in MIX}
+    return summary
+
+
+def run_mode(mode, args):
+    workdir = tempfile.mkdtemp(prefix=f'loadtest-{mode}-')
+    port = free_port()
+    process = start_server(mode, port, workdir, args.workers)
+    try:
+        body_limit = check_body_limit(port)
+        sessions = seed(port, args.users, args.seed)
+        pdf = b'%PDF-1.4\n' + os.urandom(args.upload_kb * 1024)
+        stop = threading.Event()
+        results = []
+        threads = [threading.Thread(target=client, args=(port, sessions, pdf, stop, results))
+                   for _ in range(args.clients)]
+        threads += [threading.Thread(target=slow_client, args=(port, sessions, pdf, stop, args.slow_seconds))
+                    for _ in range(args.slow_clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return {**summarise(results, args.duration), 'body_limit': body_limit}
+    finally:
+        stop_server(process)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(mode, summary):
+    print(f"\n{mode}: {summary['rps']} req/s, p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, "
+          f"{summary['errors']} errors / {summary['requests']} requests")
+    for op, row in summary['operations'].items():
+        print(f"  {op:<8} {row['requests']:>7} req  {row['rps']:>7} req/s  "
+              f"p50 {row['p50_ms']!s:>7} ms  p99 {row['p99_ms']!s:>7} ms  errors {row['errors']}")
+    for case, (status, sent) in summary['body_limit'].items():
+        print(f"  oversized body ({case}): {status}, {sent / 1024 / 1024:.1f} MB sent")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['wsgi', 'asgi'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--slow-clients', type=int, default=8)
+    parser.add_argument('--slow-seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=200, help='applications per user before the run')
+    parser.add_argument('--upload-kb', type=int, default=256)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = {mode: run_mode(mode, args) for mode in args.modes}
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for mode, summary in results.items():
+            print_table(mode, summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Row readers and writers for bulk import/export of applications.
+
+Both directions work on streams: import reads the request body incrementally,
+export yields the response in chunks, so neither side holds a whole dataset
+in memory.
+"""
+import csv
+import io
+import json
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+MIMETYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+
+
+def detect_format(explicit, mimetype):
+    """Format name from ?format= or the request Content-Type, or None."""
+    if explicit:
+        return explicit if explicit in FORMATS else None
+    return MIMETYPE_FORMATS.get(mimetype)
+
+
+def read_rows(stream, fmt):
+    """Yield (row_number, row) from a binary stream; row is a dict or a ValueError.
+
+    Row numbers are 1-based data rows (the CSV header is not counted), so they
+    match what a user sees in a spreadsheet below the header.
+    """
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from _read_csv(text)
+    else:
+        yield from _read_ndjson(text)
+
+
+def _read_csv(text):
+    reader = csv.DictReader(text)
+    try:
+        for row_number, row in enumerate(reader, start=1):
+            if None in row:
+                yield row_number, ValueError('Row has more values than the header')
+                continue
+            yield row_number, row
+    except csv.Error as e:
+        yield reader.line_num, ValueError(f'Malformed CSV: {e}')
+    except UnicodeDecodeError:
+        yield reader.line_num, ValueError('File is not valid UTF-8')
+
+
+def _read_ndjson(text):
+    row_number = 0
+    try:
+        for line in text:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield row_number, ValueError('Invalid JSON')
+                continue
+            if not isinstance(row, dict):
+                yield row_number, ValueError('Each line must be a JSON object')
+                continue
+            yield row_number, row
+    except UnicodeDecodeError:
+        yield row_number + 1, ValueError('File is not valid UTF-8')
+
+
+def export_chunks(cursor, fields, fmt, batch_size=500):
+    """Yield the cursor's rows serialised as CSV or NDJSON, one batch per chunk."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue()
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if fmt == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(tuple(row) for row in rows)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(json.dumps(dict(zip(fields, row))) + '\n' for row in rows)
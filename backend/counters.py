@@ -0,0 +1,136 @@
+"""Materialised per-user application counters behind /api/stats.
+
+`application_counters` holds one row per (user_id, bucket), where a bucket is
+'total', 'status:<status>' or 'month:<YYYY-MM>'. Triggers created by the
+migrations keep it in step with `applications` inside the same transaction as
+every insert, update and delete, so any write path - single routes, bulk
+imports, batch operations - stays consistent without extra code.
+
+`verify_counters()` and `fill_counters()` recompute everything from the
+applications table, for checking and repairing drift (see the `counters`
+CLI commands).
+"""
+
+TOTAL_BUCKET = 'total'
+
+# Expected buckets computed from the applications table, in the same shape as
+# application_counters. Used by both verify and rebuild.
+EXPECTED_COUNTS_SQL = '''
+    SELECT user_id, 'total' AS bucket, COUNT(*) AS count
+    FROM applications GROUP BY user_id
+    UNION ALL
+    SELECT user_id, 'status:' || IFNULL(status, ''), COUNT(*)
+    FROM applications GROUP BY user_id, status
+    UNION ALL
+    SELECT user_id, 'month:' || substr(application_date, 1, 7), COUNT(*)
+    FROM applications GROUP BY user_id, substr(application_date, 1, 7)
+'''
+
+# EXPECTED_COUNTS_SQL for DATABASE_BACKEND=postgres, where dates are not strings
+POSTGRES_EXPECTED_COUNTS_SQL = '''
+    SELECT user_id, 'total' AS bucket, COUNT(*) AS count
+    FROM applications GROUP BY user_id
+    UNION ALL
+    SELECT user_id, 'status:' || COALESCE(status, ''), COUNT(*)
+    FROM applications GROUP BY user_id, status
+    UNION ALL
+    SELECT user_id, 'month:' || to_char(application_date, 'YYYY-MM'), COUNT(*)
+    FROM applications GROUP BY user_id, to_char(application_date, 'YYYY-MM')
+'''
+
+
+def status_bucket(status):
+    return f'status:{status}'
+
+
+def month_bucket(day):
+    return f'month:{day.strftime("%Y-%m")}'
+
+
+def _bucket_upserts(prefix, sign):
+    """Trigger body statement adding `sign` to the three buckets of row `prefix` (NEW/OLD)."""
+    return f'''
+        INSERT INTO application_counters (user_id, bucket, count)
+        VALUES ({prefix}.user_id, 'total', {sign}),
+               ({prefix}.user_id, 'status:' || IFNULL({prefix}.status, ''), {sign}),
+               ({prefix}.user_id, 'month:' || substr({prefix}.application_date, 1, 7), {sign})
+        ON CONFLICT (user_id, bucket) DO UPDATE SET count = count + excluded.count;
+    '''
+
+
+def create_counters(cursor):
+    """Create the counters table and its maintenance triggers, then backfill it."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS application_counters (
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, bucket)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_counters_insert
+        AFTER INSERT ON applications
+        BEGIN
+            {_bucket_upserts('NEW', 1)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_counters_delete
+        AFTER DELETE ON applications
+        BEGIN
+            {_bucket_upserts('OLD', -1)}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_counters_update
+        AFTER UPDATE OF user_id, status, application_date ON applications
+        WHEN OLD.user_id IS NOT NEW.user_id
+          OR OLD.status IS NOT NEW.status
+          OR OLD.application_date IS NOT NEW.application_date
+        BEGIN
+            {_bucket_upserts('OLD', -1)}
+            {_bucket_upserts('NEW', 1)}
+        END
+    ''')
+    fill_counters(cursor)
+
+
+def fill_counters(cursor, expected_sql=EXPECTED_COUNTS_SQL):
+    """Replace every counter with a recount; run inside a write transaction."""
+    cursor.execute('DELETE FROM application_counters')
+    cursor.execute(f'INSERT INTO application_counters (user_id, bucket, count) {expected_sql}')
+
+
+def read_stats(cursor, user_id, statuses, month):
+    """Counters for one user as {bucket: count}; a single primary key lookup."""
+    buckets = [TOTAL_BUCKET, month_bucket(month)] + [status_bucket(s) for s in statuses]
+    cursor.execute(f'''
+        SELECT bucket, count FROM application_counters
+        WHERE user_id = ? AND bucket IN ({', '.join('?' * len(buckets))})
+    ''', [user_id] + buckets)
+    return dict(cursor.fetchall())
+
+
+def verify_counters(conn, expected_sql=EXPECTED_COUNTS_SQL):
+    """Compare stored counters with a full recount.
+
+    Returns a list of (user_id, bucket, stored, actual) for every bucket that
+    has drifted; an empty list means the table is exact. Zero-count rows left
+    behind by deletes are not drift.
+    """
+    rows = conn.execute(f'''
+        WITH expected AS ({expected_sql})
+        SELECT c.user_id, c.bucket, c.count, COALESCE(e.count, 0)
+        FROM application_counters c
+        LEFT JOIN expected e ON e.user_id = c.user_id AND e.bucket = c.bucket
+        WHERE c.count != COALESCE(e.count, 0)
+        UNION ALL
+        SELECT e.user_id, e.bucket, 0, e.count
+        FROM expected e
+        LEFT JOIN application_counters c ON c.user_id = e.user_id AND c.bucket = e.bucket
+        WHERE c.user_id IS NULL
+        ORDER BY 1, 2
+    ''').fetchall()
+    return [tuple(row) for row in rows]
+
@@ -0,0 +1,334 @@
+"""Content-addressed CV storage.
+
+Uploads are streamed by Werkzeug straight into a temp file in the storage's
+scratch directory (`<UPLOAD_FOLDER>/tmp`) while being hashed (see
+UploadRequest), then put under the key `blobs/<aa>/<sha256>` of the
+configured storage (storage.py): renamed into place on local disk, or
+uploaded to the S3 bucket. Identical files are stored once.
+
+`cv_blobs` tracks every blob and how many applications reference it; triggers
+on applications.cv_sha256 keep the refcount exact. The functions here take
+the repository (repository.py), so the index lives in the same database as
+the applications, PostgreSQL included. A blob file is only
+unlinked by release() once its refcount is zero. store() counts itself into
+the row's uploads_pending before it uploads, with no lock held, and release()
+leaves rows with recent pending uploads alone, so a concurrent upload of the
+same content can never lose its file.
+
+Background jobs build derived data with extract(): a one-page PDF of the
+first page (`<sha256>.p1.pdf`, for quick previews) and the CV text for
+search. reconcile() removes files nothing refers to.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+from flask import Request, current_app
+
+import metrics
+
+try:
+    import pypdf
+except ImportError:  # optional: without it CVs get no preview page or searchable text
+    pypdf = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Limits for text extraction, so one huge CV cannot stall the job worker
+MAX_TEXT_PAGES = 20
+MAX_TEXT_CHARS = 100_000
+
+PREVIEW_SUFFIX = '.p1.pdf'
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+BLOB_PREFIX = 'blobs/'
+
+
+def blob_key(sha256):
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256}'
+
+
+def preview_key(sha256):
+    return blob_key(sha256) + PREVIEW_SUFFIX
+
+
+class HashingFile:
+    """Temp file that hashes everything written to it.
+
+    Used as Werkzeug's upload stream, so each chunk of the request body is
+    written to disk and fed to SHA-256 once, without buffering the file in
+    memory. The temp file is removed on close() unless it was committed.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload-', delete=False)
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+
+    @property
+    def name(self):
+        return self._file.name
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def write(self, data):
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        if not self.committed:
+            try:
+                os.remove(self._file.name)
+            except FileNotFoundError:
+                pass
+
+    def __getattr__(self, name):
+        # read/seek/tell etc. for code that still reads the upload back
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """Request class that streams uploaded files through HashingFile."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(current_app.extensions['storage'].scratch_dir)
+
+
+def store(repo, storage, upload):
+    """Register the uploaded HashingFile as a blob and put it in `storage`.
+
+    A short transaction on `repo` first creates the cv_blobs row (refcount 0)
+    and adds a pending upload, which keeps release() off the blob for its
+    grace period. The upload itself then runs outside any transaction, so a
+    slow S3 link never holds the write lock. The caller inserts/updates the
+    referencing application afterwards, in a transaction of its own, and the
+    applications triggers turn the pending upload into a reference; if that
+    never happens, reconcile() releases the blob once the grace period is
+    over. Returns the SHA-256.
+    """
+    metrics.CV_UPLOAD_BYTES.observe(upload.size)
+    with metrics.CV_STORE_SECONDS.time():
+        upload.flush()
+        os.fsync(upload.fileno())
+        sha256 = upload.sha256
+        key = blob_key(sha256)
+
+        with repo.transaction():
+            repo.hold_cv_blob(sha256, upload.size)
+
+        if storage.exists(key):
+            # Same content already stored; the temp copy is dropped on close()
+            return sha256
+
+        storage.put_file(key, upload.name, content_type='application/pdf')
+        upload.committed = True
+        return sha256
+
+
+def release(repo, storage, sha256, grace=3600):
+    """Delete the blob if no application references it any more.
+
+    Call after the transaction that dropped the reference has committed.
+    Blobs with an upload that store() began within the last `grace` seconds
+    are kept: it is about to reference them. The files are deleted while
+    the transaction holds the row, so store() cannot mark it in between.
+    Returns True if the file was removed.
+    """
+    if not sha256:
+        return False
+    held_since = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - grace))
+    with repo.transaction():
+        removed = repo.delete_cv_blob(sha256, held_since)
+        if removed:
+            storage.delete(blob_key(sha256))
+            storage.delete(preview_key(sha256))
+    return removed
+
+
+def extract(repo, storage, sha256):
+    """Write the first-page preview and index the text of a stored CV.
+
+    Idempotent: does nothing if the blob is gone or already extracted, or if
+    pypdf is not installed (the blob stays pending for a later run). A PDF
+    pypdf cannot parse is marked extracted with no preview and no text.
+    Returns True if the blob was processed.
+    """
+    if pypdf is None:
+        return False
+    row = repo.find_cv_blob(sha256, ('extracted_at',))
+    if not row or row['extracted_at']:
+        return False
+
+    text, has_preview = '', False
+    try:
+        with storage.local_copy(blob_key(sha256)) as path:
+            reader = pypdf.PdfReader(path)
+            text = '\n'.join(page.extract_text() or '' for page in reader.pages[:MAX_TEXT_PAGES])[:MAX_TEXT_CHARS]
+            # A one-page CV is its own preview
+            if len(reader.pages) > 1:
+                writer = pypdf.PdfWriter()
+                writer.add_page(reader.pages[0])
+                os.makedirs(storage.scratch_dir, exist_ok=True)
+                with tempfile.NamedTemporaryFile(dir=storage.scratch_dir, prefix='preview-', delete=False) as tmp:
+                    writer.write(tmp)
+                storage.put_file(preview_key(sha256), tmp.name, content_type='application/pdf')
+                has_preview = True
+    except Exception as e:
+        logger.warning('Could not extract CV %s: %s', sha256, e)
+
+    with repo.transaction():
+        updated = repo.finish_cv_extraction(sha256, has_preview, text)
+        if not updated and has_preview:
+            # Released while we were working
+            storage.delete(preview_key(sha256))
+    return updated
+
+
+def reconcile(repo, storage, grace=3600, sweep_storage=True):
+    """Garbage-collect CV files that nothing refers to.
+
+    - blob rows whose refcount is zero (a release job never ran)
+    - keys under blobs/ without a cv_blobs row, and previews of missing blobs
+    - abandoned temp files in this process's scratch directory
+    - pre-blob uploads at the top level no application points at
+
+    The two sweeps over stored keys need `repo` to know every reference to
+    the storage. Pass sweep_storage=False when it may not (a bucket shared
+    by nodes with databases of their own): a node would delete the others'
+    files. Files and blob rows younger than `grace` seconds are left alone,
+    since an upload may be between storing its blob and committing the
+    application that references it. Returns counts removed.
+    """
+    cutoff = time.time() - grace
+    removed = {'unreferenced_blobs': 0, 'orphan_files': 0, 'temp_files': 0, 'legacy_files': 0}
+
+    for sha256 in repo.unreferenced_cv_blobs():
+        if release(repo, storage, sha256, grace):
+            removed['unreferenced_blobs'] += 1
+
+    candidates = [key for key, mtime in storage.list(BLOB_PREFIX) if mtime < cutoff] if sweep_storage else []
+    for start in range(0, len(candidates), 500):
+        # Check and delete under the lock so store() cannot add a row in between
+        with repo.transaction():
+            repo.lock_cv_blobs()
+            for key in candidates[start:start + 500]:
+                name = key.rsplit('/', 1)[-1]
+                sha256 = name[:-len(PREVIEW_SUFFIX)] if name.endswith(PREVIEW_SUFFIX) else name
+                known = _SHA256_RE.match(sha256) and repo.find_cv_blob(sha256, ('1',))
+                if not known and storage.delete(key):
+                    removed['orphan_files'] += 1
+
+    for directory, _, names in os.walk(storage.scratch_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            if _older(path, cutoff) and _remove(path):
+                removed['temp_files'] += 1
+
+    for key, mtime in storage.list(recursive=False) if sweep_storage else ():
+        if mtime >= cutoff:
+            continue
+        # Legacy names are '<user_id>_<timestamp>_<name>'; the user id keeps the lookup indexed
+        user_id = key.split('_', 1)[0]
+        referenced = user_id.isdigit() and repo.find_cv(int(user_id), key)
+        if not referenced and storage.delete(key):
+            removed['legacy_files'] += 1
+
+    return removed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _older(path, cutoff):
+    try:
+        return os.path.getmtime(path) < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def create_blob_table(cursor):
+    """Schema for blobs and the triggers that keep refcounts in step with applications.
+
+    SQLite; pgdb.py has the PostgreSQL schema.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cv_blobs (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_ref_insert
+        AFTER INSERT ON applications
+        WHEN NEW.cv_sha256 IS NOT NULL
+        BEGIN
+            UPDATE cv_blobs SET refcount = refcount + 1 WHERE sha256 = NEW.cv_sha256;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_ref_delete
+        AFTER DELETE ON applications
+        WHEN OLD.cv_sha256 IS NOT NULL
+        BEGIN
+            UPDATE cv_blobs SET refcount = refcount - 1 WHERE sha256 = OLD.cv_sha256;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_ref_update
+        AFTER UPDATE OF cv_sha256 ON applications
+        WHEN OLD.cv_sha256 IS NOT NEW.cv_sha256
+        BEGIN
+            UPDATE cv_blobs SET refcount = refcount - 1 WHERE sha256 = OLD.cv_sha256;
+            UPDATE cv_blobs SET refcount = refcount + 1 WHERE sha256 = NEW.cv_sha256;
+        END
+    ''')
+
+
+def create_upload_marks(cursor, columns):
+    """cv_blobs.uploads_pending/upload_started_at, and the triggers that settle them.
+
+    Each reference an application takes settles one pending upload of the
+    blob (store() always runs before the application write).
+    """
+    if 'uploads_pending' not in columns:
+        cursor.execute('ALTER TABLE cv_blobs ADD COLUMN uploads_pending INTEGER NOT NULL DEFAULT 0')
+    if 'upload_started_at' not in columns:
+        cursor.execute('ALTER TABLE cv_blobs ADD COLUMN upload_started_at TIMESTAMP')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_upload_insert
+        AFTER INSERT ON applications
+        WHEN NEW.cv_sha256 IS NOT NULL
+        BEGIN
+            UPDATE cv_blobs SET uploads_pending = MAX(uploads_pending - 1, 0) WHERE sha256 = NEW.cv_sha256;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_upload_update
+        AFTER UPDATE OF cv_sha256 ON applications
+        WHEN NEW.cv_sha256 IS NOT NULL AND OLD.cv_sha256 IS NOT NEW.cv_sha256
+        BEGIN
+            UPDATE cv_blobs SET uploads_pending = MAX(uploads_pending - 1, 0) WHERE sha256 = NEW.cv_sha256;
+        END
+    ''')
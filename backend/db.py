@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+# Pragmas applied to every new connection. journal_mode=WAL is persistent in
+# the database file, the rest are per-connection settings.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),       # safe with WAL, avoids an fsync per commit
+    ('cache_size', -16000),          # ~16MB page cache per connection
+    ('mmap_size', 128 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),          # wait for the writer instead of failing
+)
+
+# Number of compiled statements kept per connection. All queries in app.py are
+# parameterised constants, so they are prepared once and reused.
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execution time to metrics."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_query(sql, time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors, including conn.execute() shortcuts, are timed."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(path):
+    """Open a new tuned connection to the database at `path`."""
+    with metrics.DB_CONNECT_SECONDS.time():
+        conn = sqlite3.connect(path, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE,
+                               factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def get_connection(path):
+    """Return the connection for `path` owned by the current thread.
+
+    Connections are kept per thread and per process, so gunicorn workers never
+    share a handle inherited across fork() and each request thread reuses the
+    same connection (and its statement cache) for its whole lifetime.
+    """
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.connections = {}
+
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = connect(path)
+        _local.connections[path] = conn
+    return conn
+
+
+def release_connections():
+    """Roll back any transaction a request left open on this thread's connections.
+
+    Called at the end of every request so an early return (e.g. a 404 after an
+    UPDATE matched no rows) cannot leak a write lock into the next request.
+    """
+    if getattr(_local, 'pid', None) != os.getpid():
+        return
+    for conn in _local.connections.values():
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def close_connections():
+    """Close every connection owned by the current thread."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        return
+    for conn in _local.connections.values():
+        conn.close()
+    _local.connections = {}
+
+
+class WriterBusy(Exception):
+    """Raised when the writer queue is full or a writer waited too long."""
+
+
+class WriterGate:
+    """Per-process queue for SQLite writes.
+
+    SQLite allows one writer at a time. If many threads contend for the lock
+    inside SQLite, each one sleeps and retries in its busy handler, and those
+    sleeps add latency. This gate makes writers from the same process wait
+    their turn on a plain lock, so the next writer starts the moment the
+    previous one commits. Other processes are still serialised by
+    busy_timeout.
+
+    At most `max_pending` writers may wait. Beyond that, or after `timeout`
+    seconds of waiting, the gate raises WriterBusy rather than tying up a
+    request thread.
+
+        with writer_gate:
+            conn.execute('BEGIN IMMEDIATE')
+            ...
+            conn.commit()
+    """
+
+    def __init__(self, max_pending=32, timeout=5.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending + 1)
+
+    def __enter__(self):
+        if not self._slots.acquire(blocking=False):
+            raise WriterBusy('Writer queue is full')
+        start = time.perf_counter()
+        acquired = self._lock.acquire(timeout=self.timeout)
+        metrics.DB_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, lock='writer_gate')
+        if not acquired:
+            self._slots.release()
+            raise WriterBusy('Timed out waiting for the writer')
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+        self._slots.release()
+        return False
@@ -0,0 +1,28 @@
+"""Gunicorn settings, read automatically from the working directory.
+
+The app module is imported once in the master and workers are forked from it
+(preload_app). Importing it does no I/O (see create_app), so this only
+shares the imported code. Migrations run here, once, before any worker
+starts; workers then find the schema current. With preload, a HUP reloads
+configuration but not code, so deploy new code with a full restart.
+"""
+preload_app = True
+
+
+def on_starting(server):
+    import app as backend
+    import metrics
+
+    # The app context's teardown closes the connection before workers fork
+    with backend.app.app_context():
+        backend.init_db()
+    # Workers inherit this process's memory: start them without the migrations' samples
+    metrics.REGISTRY.reset()
+    metrics.REGISTRY.clear()
+
+
+def worker_exit(server, worker):
+    import metrics
+
+    # Leave a final snapshot for the metrics archive (see metrics.Registry.collect)
+    metrics.REGISTRY.flush(force=True)
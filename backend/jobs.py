@@ -0,0 +1,334 @@
+"""Durable background jobs in a database table.
+
+Request handlers call enqueue() inside the same transaction as the change
+that needs follow-up work, so a job exists if and only if its change
+committed. A crash after the commit still leaves the job behind for a
+worker to pick up.
+
+The table lives in the repository's database (repository.py): the DATABASE
+file, or the PostgreSQL database every node shares. Every gunicorn worker
+process runs `workers` JobQueue threads. A job is claimed with a single
+UPDATE (skipping rows another node has locked, on PostgreSQL), so each job
+runs once even with several processes or nodes polling. Jobs that fail are retried with exponential backoff up to
+`max_attempts` times. A job left 'running' by a dead process is requeued
+after `lease` seconds. Handlers must therefore be idempotent.
+
+Finished jobs are kept for `retention` seconds so stats() can report recent
+latency.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def enqueue(conn, kind, payload=None, delay=0, key=None):
+    """Add a job; call inside the transaction whose commit should trigger it.
+
+    `key` deduplicates: while a queued job has the same key, the new one is
+    dropped. (Once a job is running a new one may queue behind it, so work
+    that arrives mid-run is not lost.) Returns the job id, or None if it was
+    deduplicated.
+    """
+    now = time.time()
+    row = conn.execute('''
+        INSERT INTO jobs (kind, payload, dedupe_key, status, run_after, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    ''', (kind, json.dumps(payload or {}), key, QUEUED, now + delay, now)).fetchone()
+    return row[0] if row else None
+
+
+# Marks the next due job as running; the repository picks the variant (claim_job_sql)
+CLAIM_SQL = '''
+    UPDATE jobs
+    SET status = ?, started_at = ?, attempts = attempts + 1, worker = ?
+    WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ?
+                ORDER BY run_after, id LIMIT 1)
+    RETURNING id, kind, payload, dedupe_key, attempts, created_at
+'''
+
+# Workers on other nodes claim concurrently: each skips the rows the others hold
+POSTGRES_CLAIM_SQL = '''
+    UPDATE jobs
+    SET status = ?, started_at = ?, attempts = attempts + 1, worker = ?
+    WHERE id = (SELECT id FROM jobs WHERE status = ? AND run_after <= ?
+                ORDER BY run_after, id LIMIT 1 FOR UPDATE SKIP LOCKED)
+    RETURNING id, kind, payload, dedupe_key, attempts, created_at
+'''
+
+
+def claim(repo, worker_id):
+    """Mark the next due job as running and return it, or None.
+
+    Checks with a read first so an idle worker never takes the write lock.
+    """
+    now = time.time()
+    ready = repo.connection().execute('SELECT 1 FROM jobs WHERE status = ? AND run_after <= ? LIMIT 1',
+                                      (QUEUED, now)).fetchone()
+    if not ready:
+        return None
+    with repo.transaction() as conn:
+        return conn.execute(repo.claim_job_sql, (RUNNING, now, worker_id, QUEUED, now)).fetchone()
+
+
+def _make_way(conn, job_id, key):
+    """Drop a queued job with the same dedupe key, so job `job_id` can be queued again in its place."""
+    if key is not None:
+        conn.execute('DELETE FROM jobs WHERE dedupe_key = ? AND status = ? AND id <> ?', (key, QUEUED, job_id))
+
+
+def requeue_stale(repo, lease):
+    """Put jobs whose worker died mid-run back on the queue. Returns how many.
+
+    If an identical job was queued meanwhile, the requeued one takes its place.
+    """
+    with repo.transaction() as conn:
+        stale = conn.execute('SELECT id, dedupe_key FROM jobs WHERE status = ? AND started_at < ?',
+                             (RUNNING, time.time() - lease)).fetchall()
+        for job in stale:
+            _make_way(conn, job['id'], job['dedupe_key'])
+            conn.execute('UPDATE jobs SET status = ?, worker = NULL WHERE id = ?', (QUEUED, job['id']))
+    return len(stale)
+
+
+def prune(repo, retention):
+    """Delete finished jobs older than `retention` seconds. Returns how many."""
+    with repo.transaction() as conn:
+        cursor = conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                              (DONE, FAILED, time.time() - retention))
+        return cursor.rowcount
+
+
+class JobQueue:
+    """Registry of job handlers plus the worker threads that run them.
+
+        queue = JobQueue(repository.SQLiteRepository('jobtracker.db'), workers=1)
+
+        @queue.handler('release_cv')
+        def release_cv(conn, payload): ...
+
+        @queue.handler('reconcile', every=3600)
+        def reconcile(conn, payload): ...
+
+        queue.start()
+
+    Handlers registered with `every` are periodic. start() makes sure one is
+    scheduled, and each run queues the next.
+
+    Handlers get the worker thread's connection; they open their own
+    transactions on the repository as needed.
+
+    With Flask, create the queue without a repository and call init_app(app):
+    it takes the app's repository and worker count, `every` may name a
+    config key, and handlers run inside the app context.
+    """
+
+    def __init__(self, database=None, workers=1, poll_interval=1.0, max_attempts=5, lease=300, retention=86400):
+        self.database = database
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.retention = retention
+        self.handlers = {}
+        self.periodic = {}
+        self.app = None
+        self._every = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        self.database = app.extensions['database']
+        self.workers = app.config['JOB_WORKERS']
+        self.periodic = {kind: app.config[every] if isinstance(every, str) else every
+                         for kind, every in self._every.items()}
+
+    def handler(self, kind, every=None):
+        def register(fn):
+            self.handlers[kind] = fn
+            if every:
+                self._every[kind] = every
+                if not isinstance(every, str):
+                    self.periodic[kind] = every
+            return fn
+        return register
+
+    def schedule_periodic(self):
+        """Queue each periodic job that has no queued or running instance."""
+        now = time.time()
+        try:
+            with self.database.transaction() as conn:
+                for kind in self.periodic:
+                    conn.execute('''
+                        INSERT INTO jobs (kind, dedupe_key, status, run_after, created_at)
+                        SELECT ?, ?, ?, ?, ?
+                        WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = ? AND status IN (?, ?))
+                        ON CONFLICT DO NOTHING
+                    ''', (kind, kind, QUEUED, now, now, kind, QUEUED, RUNNING))
+        finally:
+            self.database.release()
+
+    def start(self):
+        """Start the worker threads once per process (safe to call on every request)."""
+        if self._pid == os.getpid() or self.workers <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self.schedule_periodic()
+            for n in range(self.workers):
+                threading.Thread(target=self._loop, args=(f'{self._pid}-{n}',),
+                                 name=f'jobs-{n}', daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run_pending(self, worker_id='cli'):
+        """Run due jobs on the calling thread until none are left. Returns how many ran."""
+        ran = 0
+        while self.run_once(worker_id):
+            ran += 1
+        return ran
+
+    def run_once(self, worker_id):
+        with self._context():
+            try:
+                job = claim(self.database, worker_id)
+                if not job:
+                    return False
+                self._run(job)
+                return True
+            finally:
+                self.database.release()
+
+    def _context(self):
+        return self.app.app_context() if self.app is not None else contextlib.nullcontext()
+
+    def _loop(self, worker_id):
+        while not self._stopping.is_set():
+            try:
+                busy = self.run_once(worker_id)
+            except Exception:
+                logger.exception('Job worker %s failed to claim a job', worker_id)
+                busy = False
+            if not busy:
+                self._stopping.wait(self.poll_interval)
+
+    def _run(self, job):
+        handler = self.handlers.get(job['kind'])
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job['kind']!r}")
+            handler(self.database.connection(), json.loads(job['payload']))
+        except Exception as e:
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started, kind=job['kind'], outcome='error')
+            # Rolls back whatever the handler left open
+            self.database.release()
+            retry = job['attempts'] < self.max_attempts and handler is not None
+            logger.warning('Job %s (%s) attempt %s failed: %s', job['id'], job['kind'], job['attempts'], e)
+            with self.database.transaction() as conn:
+                if retry:
+                    _make_way(conn, job['id'], job['dedupe_key'])
+                conn.execute('''
+                    UPDATE jobs
+                    SET status = ?, run_after = ?, finished_at = ?, last_error = ?, worker = NULL
+                    WHERE id = ?
+                ''', (QUEUED if retry else FAILED, time.time() + 2 ** job['attempts'],
+                      None if retry else time.time(), str(e)[:1000], job['id']))
+                if not retry:
+                    self._schedule_next(conn, job['kind'])
+            return
+        metrics.JOB_SECONDS.observe(time.perf_counter() - started, kind=job['kind'], outcome='done')
+        with self.database.transaction() as conn:
+            conn.execute('UPDATE jobs SET status = ?, finished_at = ?, worker = NULL WHERE id = ?',
+                         (DONE, time.time(), job['id']))
+            self._schedule_next(conn, job['kind'])
+
+    def _schedule_next(self, conn, kind):
+        if kind in self.periodic:
+            enqueue(conn, kind, delay=self.periodic[kind], key=kind)
+
+
+def stats(conn, window=3600):
+    """Queue depth per kind/status and latency of jobs finished in the last `window` seconds.
+
+    Wait is created -> started (queueing delay), run is started -> finished.
+    """
+    now = time.time()
+    depth = {}
+    for row in conn.execute('SELECT kind, status, COUNT(*) AS jobs FROM jobs GROUP BY kind, status'):
+        depth.setdefault(row['kind'], {})[row['status']] = row['jobs']
+
+    oldest = conn.execute('SELECT MIN(created_at) FROM jobs WHERE status = ? AND run_after <= ?',
+                          (QUEUED, now)).fetchone()[0]
+
+    latency = {}
+    rows = conn.execute('''
+        SELECT kind, started_at - created_at AS wait, finished_at - started_at AS run
+        FROM jobs WHERE status = ? AND finished_at >= ?
+    ''', (DONE, now - window)).fetchall()
+    for kind in {row['kind'] for row in rows}:
+        waits = sorted(row['wait'] for row in rows if row['kind'] == kind)
+        runs = sorted(row['run'] for row in rows if row['kind'] == kind)
+        latency[kind] = {
+            'jobs': len(waits),
+            'wait_p50': _percentile(waits, 0.50),
+            'wait_p95': _percentile(waits, 0.95),
+            'run_p50': _percentile(runs, 0.50),
+            'run_p95': _percentile(runs, 0.95),
+        }
+
+    return {
+        'depth': depth,
+        'oldest_ready_age': now - oldest if oldest else 0,
+        'latency': latency,
+    }
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def create_jobs_table(cursor):
+    """SQLite schema; pgdb.py has the PostgreSQL one."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedupe_key TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            worker TEXT,
+            last_error TEXT
+        )
+    ''')
+    # Polling and claiming: next due job
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, run_after)')
+    # One queued job per dedupe key
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_queued_key ON jobs(dedupe_key)
+        WHERE dedupe_key IS NOT NULL AND status = 'queued'
+    ''')
@@ -0,0 +1,358 @@
+"""In-process metrics with Prometheus text export, aggregated across workers.
+
+Each gunicorn worker keeps its own counters and histograms in memory and
+writes a snapshot to `<directory>/<pid>.json` at most once per
+`flush_interval`. The metrics endpoint merges the snapshots of every live
+worker, summing counters and histogram buckets, so a scrape sees the whole
+server whichever worker answers it. A dead worker's snapshot is folded into
+`<directory>/archive.json` before it is removed, so its counts stay in the
+totals and a worker restart never looks like a counter reset. (Snapshots
+hold only counters and histograms; gauges are computed at scrape time.)
+
+Query timings can also be collected per request (start_trace/end_trace) for
+the slow-request log.
+"""
+import contextlib
+import contextvars
+import fcntl
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+# Distinct SQL statements tracked before the rest are folded into 'other'
+MAX_STATEMENTS = 200
+STATEMENT_LENGTH = 200
+
+ARCHIVE_NAME = 'archive.json'
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# A leading /* name */ comment names a statement whose text varies per request
+_NAME_RE = re.compile(r'^\s*/\*\s*([\w.]+)\s*\*/')
+_IN_LIST_RE = re.compile(r'\bIN \(\?(?:, ?\?)*\)', re.IGNORECASE)
+
+
+class Counter:
+    def __init__(self, registry, name, help, labelnames):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._registry = registry
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        return {'type': 'counter', 'help': self.help, 'labels': self.labelnames,
+                'samples': [[list(key), value] for key, value in self._values.items()]}
+
+
+class Histogram:
+    def __init__(self, registry, name, help, labelnames, buckets):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(buckets)
+        self._registry = registry
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._registry.lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # one slot per bucket, then +Inf count and sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        return {'type': 'histogram', 'help': self.help, 'labels': self.labelnames, 'buckets': self.buckets,
+                'samples': [[list(key), list(counts)] for key, counts in self._values.items()]}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.directory = None
+        self.flush_interval = 1.0
+        self._flushed_at = 0.0
+
+    def counter(self, name, help, labelnames=()):
+        self.metrics[name] = Counter(self, name, help, tuple(labelnames))
+        return self.metrics[name]
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.metrics[name] = Histogram(self, name, help, tuple(labelnames), buckets)
+        return self.metrics[name]
+
+    def snapshot(self):
+        with self.lock:
+            return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self, force=False):
+        """Write this process's snapshot if `flush_interval` has passed (or `force`)."""
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.flush_interval:
+            return
+        self._flushed_at = now
+        os.makedirs(self.directory, exist_ok=True)
+        _write(os.path.join(self.directory, f'{os.getpid()}.json'), self.snapshot())
+
+    def reset(self):
+        """Drop this process's samples and statement labels, e.g. the migrations' in gunicorn's master."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric._values.clear()
+            _labels_seen.clear()
+
+    def clear(self):
+        """Remove every snapshot in `directory`, e.g. ones left by a previous server."""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(('.json', '.tmp')):
+                _unlink(os.path.join(self.directory, name))
+
+    def collect(self):
+        """Merge the archive and the snapshots of every live worker (this one freshly flushed).
+
+        Dead workers' snapshots are archived first. The whole pass holds an
+        exclusive lock, so two workers answering scrapes at once neither
+        archive a snapshot twice nor see it in neither place.
+        """
+        merged = {}
+        if self.directory is None:
+            _merge(merged, self.snapshot())
+            return merged
+        self.flush(force=True)
+        archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+        with open(os.path.join(self.directory, 'archive.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for name in os.listdir(self.directory):
+                pid = name[:-len('.json')]
+                if not name.endswith('.json') or not pid.isdigit():
+                    continue
+                path = os.path.join(self.directory, name)
+                snapshot = _load(path)
+                if not _alive(int(pid)):
+                    dead.append((path, snapshot))
+                elif snapshot is not None:
+                    _merge(merged, snapshot)
+
+            archive = _load(archive_path) or {}
+            if dead:
+                archived = {}
+                _merge(archived, archive)
+                for _, snapshot in dead:
+                    _merge(archived, snapshot or {})
+                archive = _unmerge(archived)
+                _write(archive_path, archive)
+                for path, _ in dead:
+                    _unlink(path)
+            _merge(merged, archive)
+        return merged
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, snapshot):
+    """Replace `path` atomically, so readers never see half a snapshot."""
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as tmp:
+        json.dump(snapshot, tmp)
+    os.replace(tmp.name, path)
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _merge(merged, snapshot):
+    for name, metric in snapshot.items():
+        target = merged.setdefault(name, {**metric, 'samples': {}})
+        samples = target['samples']
+        for labels, value in metric['samples']:
+            key = tuple(labels)
+            if metric['type'] == 'counter':
+                samples[key] = samples.get(key, 0) + value
+            else:
+                current = samples.get(key)
+                samples[key] = value if current is None else [a + b for a, b in zip(current, value)]
+
+
+def _unmerge(merged):
+    """Turn merge() output back into the snapshot format, for the archive."""
+    return {name: {**metric, 'samples': [[list(key), value] for key, value in metric['samples'].items()]}
+            for name, metric in merged.items()}
+
+
+def render(merged, gauges=()):
+    """Prometheus text exposition format for merged metrics plus extra gauges.
+
+    `gauges` is an iterable of (name, help, labelnames, [(label_values, value), ...]).
+    """
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labels']
+        for key, value in sorted(metric['samples'].items()):
+            if metric['type'] == 'counter':
+                lines.append(f'{name}{_labels(labelnames, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{name}_bucket{_labels(list(labelnames) + ["le"], key + (le,))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labelnames, key)} {_number(value[-1])}')
+            lines.append(f'{name}_count{_labels(labelnames, key)} {cumulative}')
+    for name, help, labelnames, samples in gauges:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} gauge')
+        for key, value in samples:
+            lines.append(f'{name}{_labels(labelnames, tuple(key))} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Per-request query trace for the slow-request log
+_trace = contextvars.ContextVar('metrics_trace', default=None)
+
+
+def start_trace():
+    """Start collecting (statement, seconds) pairs for the current request."""
+    _trace.set([])
+
+
+def end_trace():
+    """Stop collecting and return what was collected (None if not tracing)."""
+    trace = _trace.get()
+    _trace.set(None)
+    return trace
+
+
+_labels_seen = set()
+
+
+@functools.lru_cache(maxsize=1024)
+def _normalize(sql):
+    named = _NAME_RE.match(sql)
+    if named:
+        return named.group(1)
+    return _IN_LIST_RE.sub('IN (?…)', _WHITESPACE_RE.sub(' ', sql).strip())[:STATEMENT_LENGTH]
+
+
+def statement_label(sql):
+    """Bounded label for a SQL statement.
+
+    The name in a leading /* name */ comment if there is one (statements
+    built from request parameters, such as a column list or optional
+    filters, carry one), else the text with whitespace collapsed, IN lists
+    of placeholders folded to one, and truncated. Either way the labels
+    come from the code, not from what clients send.
+    """
+    label = _normalize(sql)
+    if label not in _labels_seen:
+        if len(_labels_seen) >= MAX_STATEMENTS:
+            return 'other'
+        _labels_seen.add(label)
+    return label
+
+
+def observe_query(sql, seconds):
+    label = statement_label(sql)
+    DB_QUERY_SECONDS.observe(seconds, statement=label)
+    if sql.lstrip().upper().startswith('BEGIN IMMEDIATE'):
+        DB_LOCK_WAIT_SECONDS.observe(seconds, lock='sqlite')
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((label, seconds))
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('route', 'method'))
+HTTP_REQUESTS = REGISTRY.counter(
+    'http_requests_total', 'Requests by route and status', ('route', 'method', 'status'))
+HTTP_REQUEST_BYTES = REGISTRY.counter(
+    'http_request_bytes_total', 'Request body bytes by route', ('route',))
+HTTP_RESPONSE_BYTES = REGISTRY.counter(
+    'http_response_bytes_total', 'Response body bytes by route (when the length is known)', ('route',))
+DB_CONNECT_SECONDS = REGISTRY.histogram(
+    'db_connect_seconds', 'Time to open and configure a SQLite connection', buckets=QUERY_BUCKETS)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'db_query_seconds', 'Statement execution time (up to the first row)', ('statement',), buckets=QUERY_BUCKETS)
+DB_LOCK_WAIT_SECONDS = REGISTRY.histogram(
+    'db_lock_wait_seconds', 'Time waiting for the write lock (in-process gate, then SQLite)', ('lock',),
+    buckets=QUERY_BUCKETS)
+AUTH_SECONDS = REGISTRY.histogram(
+    'auth_seconds', 'Token verification and password hashing time', ('op',))
+TOKEN_CACHE = REGISTRY.counter(
+    'auth_token_cache_total', 'Verified-token cache lookups', ('result',))
+CV_UPLOAD_BYTES = REGISTRY.histogram(
+    'cv_upload_bytes', 'Size of stored CV uploads', buckets=SIZE_BUCKETS)
+CV_STORE_SECONDS = REGISTRY.histogram(
+    'cv_store_seconds', 'Time to fsync and move an upload into blob storage')
+RATE_LIMITED = REGISTRY.counter(
+    'rate_limited_total', 'Requests rejected with 429 by the rate limiter', ('budget',))
+JOB_SECONDS = REGISTRY.histogram(
+    'job_duration_seconds', 'Background job run time', ('kind', 'outcome'))
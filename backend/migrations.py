@@ -0,0 +1,276 @@
+"""Versioned schema migrations.
+
+The schema version lives in SQLite's `PRAGMA user_version`. Each migration is
+a function that receives a cursor and is applied, in order, exactly once per
+database; `migrate()` is safe to call on every startup.
+
+To change the schema, append a new function to MIGRATIONS - never edit or
+reorder one that has already shipped.
+"""
+import counters
+import cvstore
+import jobs
+import notes
+import search
+import sync
+
+
+def _columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+
+def initial_schema(cursor):
+    """Users and applications tables, including databases created before migrations existed."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS applications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            company TEXT NOT NULL,
+            application_date DATE NOT NULL,
+            cover_letter TEXT,
+            cv_filename TEXT,
+            status TEXT DEFAULT 'pending',
+            accepted_date DATE,
+            rejected_date DATE,
+            interview_date DATE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Databases from before the date columns were added
+    columns = _columns(cursor, 'applications')
+    for column in ('accepted_date', 'rejected_date', 'interview_date'):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE applications ADD COLUMN {column} DATE')
+
+
+def application_indexes(cursor):
+    """Indexes for the per-user list, stats and download lookups."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_date '
+                   'ON applications (user_id, application_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_status '
+                   'ON applications (user_id, status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_cv '
+                   'ON applications (user_id, cv_filename)')
+
+
+def calendar_indexes(cursor):
+    """Indexes for the calendar's per-user date window lookups."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_interview '
+                   'ON applications (user_id, interview_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_accepted '
+                   'ON applications (user_id, accepted_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_rejected '
+                   'ON applications (user_id, rejected_date)')
+
+
+def application_counters(cursor):
+    """Trigger-maintained per-user counters for /api/stats."""
+    counters.create_counters(cursor)
+
+
+def user_data_versions(cursor):
+    """Per-user data version, bumped by triggers on every application write.
+
+    Used as the ETag validator for the read endpoints.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    bump = '''
+        INSERT INTO user_data_versions (user_id, version) VALUES ({row}.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_version_insert
+        AFTER INSERT ON applications
+        BEGIN
+            {bump.format(row='NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_version_delete
+        AFTER DELETE ON applications
+        BEGIN
+            {bump.format(row='OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_version_update
+        AFTER UPDATE ON applications
+        BEGIN
+            {bump.format(row='NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_version_move
+        AFTER UPDATE OF user_id ON applications
+        WHEN OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            {bump.format(row='OLD')}
+        END
+    ''')
+
+
+def cv_blobs(cursor):
+    """Content-addressed, reference-counted CV storage."""
+    if 'cv_sha256' not in _columns(cursor, 'applications'):
+        cursor.execute('ALTER TABLE applications ADD COLUMN cv_sha256 TEXT')
+    cvstore.create_blob_table(cursor)
+
+
+def covering_download_index(cursor):
+    """Let the download ownership check resolve the blob from the index alone."""
+    cursor.execute('DROP INDEX IF EXISTS idx_applications_user_cv')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_cv '
+                   'ON applications (user_id, cv_filename, cv_sha256)')
+
+
+def application_search(cursor):
+    """FTS5 index over company and cover_letter, kept in sync by triggers."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS applications_fts USING fts5(
+            company, cover_letter,
+            content='applications', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_fts_insert
+        AFTER INSERT ON applications
+        BEGIN
+            INSERT INTO applications_fts (rowid, company, cover_letter)
+            VALUES (NEW.id, NEW.company, NEW.cover_letter);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_fts_delete
+        AFTER DELETE ON applications
+        BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, company, cover_letter)
+            VALUES ('delete', OLD.id, OLD.company, OLD.cover_letter);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_fts_update
+        AFTER UPDATE OF company, cover_letter ON applications
+        BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, company, cover_letter)
+            VALUES ('delete', OLD.id, OLD.company, OLD.cover_letter);
+            INSERT INTO applications_fts (rowid, company, cover_letter)
+            VALUES (NEW.id, NEW.company, NEW.cover_letter);
+        END
+    ''')
+    cursor.execute("INSERT INTO applications_fts (applications_fts) VALUES ('rebuild')")
+
+
+def background_jobs(cursor):
+    """Job queue, plus the CV preview/text columns its extraction jobs fill in."""
+    jobs.create_jobs_table(cursor)
+    columns = _columns(cursor, 'cv_blobs')
+    if 'extracted_at' not in columns:
+        cursor.execute('ALTER TABLE cv_blobs ADD COLUMN extracted_at TIMESTAMP')
+    if 'preview' not in columns:
+        cursor.execute('ALTER TABLE cv_blobs ADD COLUMN preview INTEGER NOT NULL DEFAULT 0')
+    # CV text, keyed by the cv_blobs rowid
+    cursor.execute('CREATE VIRTUAL TABLE IF NOT EXISTS cv_text_fts USING fts5(body)')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cv_blobs_text_delete
+        AFTER DELETE ON cv_blobs
+        BEGIN
+            DELETE FROM cv_text_fts WHERE rowid = OLD.rowid;
+        END
+    ''')
+    # Newly extracted text changes search results: invalidate the owners' ETags
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS cv_blobs_version_extract
+        AFTER UPDATE OF extracted_at ON cv_blobs
+        BEGIN
+            UPDATE user_data_versions SET version = version + 1
+            WHERE user_id IN (SELECT user_id FROM applications WHERE cv_sha256 = NEW.sha256);
+        END
+    ''')
+
+
+def change_feed(cursor):
+    """change_seq/updated_at on applications and delete tombstones, for delta sync."""
+    sync.create_change_feed(cursor, _columns(cursor, 'applications'))
+
+
+def interview_notes(cursor):
+    """Notes table plus trigger-maintained note_count/notes_updated_at on applications."""
+    notes.create_notes(cursor, _columns(cursor, 'applications'))
+
+
+def search_by_user(cursor):
+    """Owner tokens in both search indexes, so a search only visits its user's rows."""
+    search.create_user_partitioned_indexes(cursor)
+
+
+def cv_upload_marks(cursor):
+    """Pending-upload counts on cv_blobs, so CVs can be uploaded outside the write lock."""
+    cvstore.create_upload_marks(cursor, _columns(cursor, 'cv_blobs'))
+
+
+MIGRATIONS = [
+    initial_schema,
+    application_indexes,
+    calendar_indexes,
+    application_counters,
+    user_data_versions,
+    cv_blobs,
+    covering_download_index,
+    application_search,
+    background_jobs,
+    change_feed,
+    interview_notes,
+    search_by_user,
+    cv_upload_marks,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration and return the resulting schema version.
+
+    Each migration runs in its own transaction together with the version bump,
+    so a failure leaves the database at the last fully applied version. The
+    write lock is taken up front, which makes concurrent callers (e.g. several
+    workers starting at once) apply each migration only once.
+    """
+    version = current_version(conn)
+    while version < LATEST_VERSION:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-read under the lock: another process may have migrated meanwhile
+            version = current_version(conn)
+            if version >= LATEST_VERSION:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn.cursor())
+            version += 1
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return version
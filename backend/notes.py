@@ -0,0 +1,108 @@
+"""Interview notes: timestamped free-text entries per application.
+
+Bodies live in their own table, so the list and detail queries on
+applications never read them. Each application carries `note_count` and
+`notes_updated_at`, kept exact by triggers on application_notes in the same
+statement as the note write. Lists get the summary without a join or a
+per-row lookup. Because the triggers update the application row, a note
+change also bumps the owner's data version (ETags) and shows up in the
+change feed like any other edit.
+
+Notes are read newest first, a page at a time, with a keyset seek on the
+note id.
+"""
+
+
+def create_notes(cursor, columns):
+    """Create the notes table, the summary columns and their triggers.
+
+    `columns` are the current applications columns.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS application_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            application_id INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (application_id) REFERENCES applications (id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_application_notes_application '
+                   'ON application_notes (application_id, id)')
+    if 'note_count' not in columns:
+        cursor.execute('ALTER TABLE applications ADD COLUMN note_count INTEGER NOT NULL DEFAULT 0')
+    if 'notes_updated_at' not in columns:
+        cursor.execute('ALTER TABLE applications ADD COLUMN notes_updated_at TIMESTAMP')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS application_notes_insert
+        AFTER INSERT ON application_notes
+        BEGIN
+            UPDATE applications
+            SET note_count = note_count + 1, notes_updated_at = NEW.updated_at
+            WHERE id = NEW.application_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS application_notes_update
+        AFTER UPDATE OF body ON application_notes
+        BEGIN
+            UPDATE applications SET notes_updated_at = NEW.updated_at
+            WHERE id = NEW.application_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS application_notes_delete
+        AFTER DELETE ON application_notes
+        BEGIN
+            UPDATE applications
+            SET note_count = note_count - 1, notes_updated_at = CURRENT_TIMESTAMP
+            WHERE id = OLD.application_id;
+        END
+    ''')
+    # Notes go with their application (foreign keys are not enforced). The
+    # application row is already gone, so the trigger above updates nothing.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS applications_notes_delete
+        AFTER DELETE ON applications
+        BEGIN
+            DELETE FROM application_notes WHERE application_id = OLD.id;
+        END
+    ''')
+
+
+def owns_application(cursor, user_id, application_id):
+    cursor.execute('SELECT 1 FROM applications WHERE id = ? AND user_id = ?', (application_id, user_id))
+    return cursor.fetchone() is not None
+
+
+def page(cursor, application_id, limit, before=None):
+    """Up to `limit` notes, newest first, older than note id `before` if given.
+
+    Returns (notes, next_before); pass next_before back as `before` for the
+    following page. It is None on the last page.
+    """
+    sql = 'SELECT id, body, created_at, updated_at FROM application_notes WHERE application_id = ?'
+    params = [application_id]
+    if before is not None:
+        sql += ' AND id < ?'
+        params.append(before)
+    sql += ' ORDER BY id DESC LIMIT ?'
+    params.append(limit + 1)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    notes = [dict(row) for row in rows[:limit]]
+    next_before = notes[-1]['id'] if len(rows) > limit else None
+    return notes, next_before
+
+
+def get(cursor, user_id, application_id, note_id):
+    """One note, if it belongs to `application_id` of `user_id`."""
+    cursor.execute('''
+        SELECT n.id, n.body, n.created_at, n.updated_at
+        FROM application_notes n JOIN applications a ON a.id = n.application_id
+        WHERE n.id = ? AND n.application_id = ? AND a.user_id = ?
+    ''', (note_id, application_id, user_id))
+    row = cursor.fetchone()
+    return dict(row) if row else None
@@ -0,0 +1,435 @@
+"""PostgreSQL connections and schema for DATABASE_BACKEND=postgres.
+
+The counterpart of db.py and migrations.py, used by repository.py. Its
+connections accept the same SQL the SQLite code runs: cursors translate `?`
+placeholders to psycopg's `%s`, rows can be read by position and by column
+name like sqlite3.Row, and DATE/TIMESTAMP values come back as the same ISO
+strings SQLite stores. Statements are timed into the same query metrics.
+
+Each process gets its own pool (psycopg_pool), created on first use so
+nothing is opened before gunicorn forks. Connections are in autocommit mode:
+a read is a single statement, and writes run in explicit transactions (see
+PostgresRepository.transaction).
+
+The schema mirrors the SQLite one for the tables the repository uses, with
+the trigger-maintained data (ETag versions, change feed sequence and
+tombstones, stats counters, note summaries, CV refcounts) written as PL/pgSQL
+triggers. Full-text search uses tsvector columns with GIN indexes where
+SQLite has its FTS5 tables.
+"""
+import functools
+import itertools
+import os
+import threading
+import time
+
+import psycopg
+from psycopg.types.string import TextLoader
+from psycopg_pool import ConnectionPool, PoolTimeout
+
+import metrics
+
+IntegrityError = psycopg.IntegrityError
+
+# Serialises migrations across every node and worker (pg_advisory_xact_lock key)
+MIGRATION_LOCK = 0x6A6F6274
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(sql):
+    """`sql` with ? placeholders rewritten for psycopg (%s), and literal % escaped.
+
+    A ? inside a quoted string is left alone.
+    """
+    out = []
+    quote = None
+    for char in sql:
+        if char == '%':
+            out.append('%%')
+        elif quote:
+            out.append(char)
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+            out.append(char)
+        elif char == '?':
+            out.append('%s')
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+class Row(tuple):
+    """A result row readable by index and by column name, like sqlite3.Row."""
+
+    def __new__(cls, values, index):
+        row = super().__new__(cls, values)
+        row._index = index
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._index)
+
+
+def row_factory(cursor):
+    index = {column.name: i for i, column in enumerate(cursor.description or ())}
+    return lambda values: Row(values, index)
+
+
+class TimedCursor(psycopg.Cursor):
+    """Cursor taking ? placeholders, reporting each statement's time to metrics."""
+
+    def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(translate(query) if params is not None else query, params, **kwargs)
+        finally:
+            metrics.observe_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, params_seq, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(translate(query), params_seq, **kwargs)
+        finally:
+            metrics.observe_query(query, time.perf_counter() - start)
+
+
+class RowStream:
+    """Rows of a query streamed from the server, read with fetchmany() like a cursor.
+
+    A plain cursor fetches the whole result on execute; this reads it as it
+    arrives, so exporting a large account does not hold it all in memory.
+    The connection can run nothing else until the stream is exhausted.
+    """
+
+    def __init__(self, cursor, query, params):
+        self._rows = cursor.stream(translate(query), params)
+
+    def fetchmany(self, size):
+        return list(itertools.islice(self._rows, size))
+
+
+def configure(conn):
+    """Per-connection setup, for pooled and direct connections alike."""
+    # Dates and timestamps as the strings SQLite would return
+    for type_name in ('date', 'timestamp', 'timestamptz'):
+        conn.adapters.register_loader(type_name, TextLoader)
+    conn.execute("SET datestyle TO 'ISO'")
+    conn.execute("SET timezone TO 'UTC'")
+
+
+def _options():
+    return {'autocommit': True, 'cursor_factory': TimedCursor, 'row_factory': row_factory}
+
+
+def connect(url):
+    """Open a new configured connection, outside any pool."""
+    with metrics.DB_CONNECT_SECONDS.time():
+        conn = psycopg.connect(url, **_options())
+        configure(conn)
+    return conn
+
+
+class Pool:
+    """One psycopg connection pool per process, opened on first use.
+
+    `timeout` is how long getconn() waits for a free connection before
+    raising PoolTimeout.
+    """
+
+    def __init__(self, url, max_size=5, timeout=5.0):
+        self.url = url
+        self.max_size = max_size
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self):
+        # A pool inherited across fork() has no worker threads and shares
+        # its sockets with the parent; start over in the child
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = ConnectionPool(self.url, min_size=1, max_size=self.max_size,
+                                                timeout=self.timeout, kwargs=_options(),
+                                                configure=configure, name=f'jobtracker-{os.getpid()}',
+                                                open=True)
+                    self._pid = os.getpid()
+        return self._pool
+
+    def getconn(self):
+        start = time.perf_counter()
+        try:
+            return self.pool.getconn()
+        finally:
+            metrics.DB_LOCK_WAIT_SECONDS.observe(time.perf_counter() - start, lock='pg_pool')
+
+    def putconn(self, conn):
+        self.pool.putconn(conn)
+
+    def close(self):
+        if self._pid == os.getpid() and self._pool is not None:
+            self._pool.close()
+        self._pool = self._pid = None
+
+
+# CURRENT_TIMESTAMP as SQLite has it: UTC, whole seconds, whatever the session time zone
+NOW = "date_trunc('second', now() AT TIME ZONE 'UTC')"
+
+
+# Statements adding `sign` to the three counter buckets of row `prefix` (NEW/OLD), see counters.py
+def _bucket_upserts(prefix, sign):
+    return f'''
+        INSERT INTO application_counters (user_id, bucket, count)
+        VALUES ({prefix}.user_id, 'total', {sign}),
+               ({prefix}.user_id, 'status:' || COALESCE({prefix}.status, ''), {sign}),
+               ({prefix}.user_id, 'month:' || to_char({prefix}.application_date, 'YYYY-MM'), {sign})
+        ON CONFLICT (user_id, bucket) DO UPDATE SET count = application_counters.count + excluded.count;
+    '''
+
+
+def _bump_version(prefix):
+    return f'''
+        INSERT INTO user_data_versions (user_id, version) VALUES ({prefix}.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = user_data_versions.version + 1
+    '''
+
+
+INITIAL_SCHEMA = f'''
+    CREATE TABLE users (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at TIMESTAMP(0) DEFAULT {NOW}
+    );
+
+    CREATE TABLE applications (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (id),
+        company TEXT NOT NULL,
+        application_date DATE NOT NULL,
+        cover_letter TEXT,
+        cv_filename TEXT,
+        cv_sha256 TEXT,
+        status TEXT DEFAULT 'pending',
+        accepted_date DATE,
+        rejected_date DATE,
+        interview_date DATE,
+        created_at TIMESTAMP(0) DEFAULT {NOW},
+        change_seq BIGINT,
+        updated_at TIMESTAMP(0),
+        note_count INTEGER NOT NULL DEFAULT 0,
+        notes_updated_at TIMESTAMP(0)
+    );
+    -- id is spelled out: the keyset pages order by (application_date, id)
+    CREATE INDEX idx_applications_user_date ON applications (user_id, application_date, id);
+    CREATE INDEX idx_applications_user_status ON applications (user_id, status);
+    CREATE INDEX idx_applications_user_cv ON applications (user_id, cv_filename) INCLUDE (cv_sha256);
+    CREATE INDEX idx_applications_user_interview ON applications (user_id, interview_date);
+    CREATE INDEX idx_applications_user_accepted ON applications (user_id, accepted_date);
+    CREATE INDEX idx_applications_user_rejected ON applications (user_id, rejected_date);
+    CREATE INDEX idx_applications_user_change ON applications (user_id, change_seq);
+
+    CREATE TABLE user_data_versions (
+        user_id BIGINT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE application_counters (
+        user_id BIGINT NOT NULL,
+        bucket TEXT NOT NULL,
+        count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, bucket)
+    );
+
+    CREATE TABLE application_tombstones (
+        user_id BIGINT NOT NULL,
+        application_id BIGINT NOT NULL,
+        change_seq BIGINT NOT NULL,
+        deleted_at TIMESTAMP(0) DEFAULT {NOW},
+        PRIMARY KEY (user_id, change_seq)
+    );
+
+    CREATE TABLE sync_horizons (
+        user_id BIGINT PRIMARY KEY,
+        change_seq BIGINT NOT NULL
+    );
+
+    CREATE TABLE application_notes (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        application_id BIGINT NOT NULL REFERENCES applications (id) ON DELETE CASCADE,
+        body TEXT NOT NULL,
+        created_at TIMESTAMP(0) DEFAULT {NOW},
+        updated_at TIMESTAMP(0) DEFAULT {NOW}
+    );
+    CREATE INDEX idx_application_notes_application ON application_notes (application_id, id);
+
+    -- Every write bumps the owner's data version (ETags) and stamps the row
+    -- with it as change_seq (delta sync), see sync.py. Setting NEW directly
+    -- in a BEFORE trigger needs no second UPDATE of the row.
+    CREATE FUNCTION applications_stamp() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        {_bump_version('NEW')}
+        RETURNING version INTO NEW.change_seq;
+        NEW.updated_at := {NOW};
+        IF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+            {_bump_version('OLD')};
+        END IF;
+        RETURN NEW;
+    END $$;
+    CREATE TRIGGER applications_stamp BEFORE INSERT OR UPDATE ON applications
+        FOR EACH ROW EXECUTE FUNCTION applications_stamp();
+
+    CREATE FUNCTION applications_tombstone() RETURNS trigger LANGUAGE plpgsql AS $$
+    DECLARE
+        seq BIGINT;
+    BEGIN
+        {_bump_version('OLD')}
+        RETURNING version INTO seq;
+        INSERT INTO application_tombstones (user_id, application_id, change_seq)
+        VALUES (OLD.user_id, OLD.id, seq);
+        RETURN NULL;
+    END $$;
+    CREATE TRIGGER applications_tombstone AFTER DELETE ON applications
+        FOR EACH ROW EXECUTE FUNCTION applications_tombstone();
+
+    -- Stats counters, see counters.py
+    CREATE FUNCTION applications_count() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            {_bucket_upserts('OLD', -1)}
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            {_bucket_upserts('NEW', 1)}
+        END IF;
+        RETURN NULL;
+    END $$;
+    CREATE TRIGGER applications_count AFTER INSERT OR DELETE ON applications
+        FOR EACH ROW EXECUTE FUNCTION applications_count();
+    CREATE TRIGGER applications_count_update AFTER UPDATE OF user_id, status, application_date ON applications
+        FOR EACH ROW
+        WHEN (OLD.user_id IS DISTINCT FROM NEW.user_id
+              OR OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.application_date IS DISTINCT FROM NEW.application_date)
+        EXECUTE FUNCTION applications_count();
+
+    -- note_count/notes_updated_at on the application, see notes.py. The
+    -- application update goes through applications_stamp like any edit.
+    CREATE FUNCTION application_notes_summary() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE applications SET note_count = note_count + 1, notes_updated_at = NEW.updated_at
+            WHERE id = NEW.application_id;
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE applications SET notes_updated_at = NEW.updated_at WHERE id = NEW.application_id;
+        ELSE
+            UPDATE applications SET note_count = note_count - 1, notes_updated_at = {NOW}
+            WHERE id = OLD.application_id;
+        END IF;
+        RETURN NULL;
+    END $$;
+    CREATE TRIGGER application_notes_summary AFTER INSERT OR DELETE OR UPDATE OF body ON application_notes
+        FOR EACH ROW EXECUTE FUNCTION application_notes_summary();
+'''
+
+# The job queue (jobs.py), CV blobs (cvstore.py) and full-text search (search.py)
+CV_JOBS_SEARCH_SCHEMA = f'''
+    CREATE TABLE jobs (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{{}}',
+        dedupe_key TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after DOUBLE PRECISION NOT NULL,
+        created_at DOUBLE PRECISION NOT NULL,
+        started_at DOUBLE PRECISION,
+        finished_at DOUBLE PRECISION,
+        worker TEXT,
+        last_error TEXT
+    );
+    CREATE INDEX idx_jobs_ready ON jobs (status, run_after);
+    CREATE UNIQUE INDEX idx_jobs_queued_key ON jobs (dedupe_key)
+        WHERE dedupe_key IS NOT NULL AND status = 'queued';
+
+    -- body is the extracted CV text; SQLite keeps it in cv_text_fts instead
+    CREATE TABLE cv_blobs (
+        sha256 TEXT PRIMARY KEY,
+        size BIGINT NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP(0) DEFAULT {NOW},
+        extracted_at TIMESTAMP(0),
+        preview INTEGER NOT NULL DEFAULT 0,
+        uploads_pending INTEGER NOT NULL DEFAULT 0,
+        upload_started_at TIMESTAMP(0),
+        body TEXT,
+        body_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', COALESCE(body, ''))) STORED
+    );
+    -- A blob's owners, and the users whose ETags an extraction invalidates
+    CREATE INDEX idx_applications_cv_sha256 ON applications (cv_sha256) WHERE cv_sha256 IS NOT NULL;
+
+    -- Refcounts, and each new reference settles one pending upload of the
+    -- blob (store() always runs before the application write)
+    CREATE FUNCTION applications_cv_ref() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND OLD.cv_sha256 IS NOT NULL THEN
+            UPDATE cv_blobs SET refcount = refcount - 1 WHERE sha256 = OLD.cv_sha256;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW.cv_sha256 IS NOT NULL THEN
+            UPDATE cv_blobs SET refcount = refcount + 1, uploads_pending = GREATEST(uploads_pending - 1, 0)
+            WHERE sha256 = NEW.cv_sha256;
+        END IF;
+        RETURN NULL;
+    END $$;
+    CREATE TRIGGER applications_cv_ref AFTER INSERT OR DELETE ON applications
+        FOR EACH ROW EXECUTE FUNCTION applications_cv_ref();
+    CREATE TRIGGER applications_cv_ref_update AFTER UPDATE OF cv_sha256 ON applications
+        FOR EACH ROW WHEN (OLD.cv_sha256 IS DISTINCT FROM NEW.cv_sha256)
+        EXECUTE FUNCTION applications_cv_ref();
+
+    -- Search vector of each application: the owner token `u<user_id>` at
+    -- weight D, so a query ANDs it in and only visits that user's rows,
+    -- then company (A) and cover letter (B), see search.py
+    ALTER TABLE applications ADD COLUMN search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', 'u' || user_id::text), 'D')
+        || setweight(to_tsvector('simple', company), 'A')
+        || setweight(to_tsvector('simple', COALESCE(cover_letter, '')), 'B')
+    ) STORED;
+    CREATE INDEX idx_applications_search ON applications USING gin (search_vector);
+'''
+
+# Append new schema versions; never edit one that has shipped
+MIGRATIONS = [
+    INITIAL_SCHEMA,
+    CV_JOBS_SEARCH_SCHEMA,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """Apply pending migrations on `conn`; returns the schema version.
+
+    Each migration runs in its own transaction under an advisory lock, so
+    nodes starting together apply it once.
+    """
+    version = 0
+    while True:
+        with conn.transaction():
+            conn.execute('SELECT pg_advisory_xact_lock(?)', (MIGRATION_LOCK,))
+            conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+            row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+            version = row[0] or 0
+            if version >= LATEST_VERSION:
+                return version
+            conn.execute(MIGRATIONS[version])
+            conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version + 1,))
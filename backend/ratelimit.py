@@ -0,0 +1,113 @@
+"""Token-bucket rate limiting shared by every worker of a server.
+
+Each budget ("login", "writes", ...) allows `capacity` requests in a burst,
+refilled at `capacity / per` tokens a second, separately for every key (a
+client IP, a user id or a login name). Buckets live in a small SQLite
+database of their own, next to the application database, so all gunicorn
+workers see the same counts without an external service. It is a separate
+file so that limiting never waits on the application's write lock.
+
+A check is one UPSERT ... RETURNING statement: refill, take a token if there
+is one and report the outcome, atomically. If the store fails the request is
+let through, since rate limiting is a safeguard rather than a dependency.
+"""
+import logging
+import math
+import sqlite3
+import time
+
+import db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# {refilled} is the bucket after refilling for the time since its last use;
+# :take is 0 to only look at the bucket
+CHECK_SQL = '''
+    INSERT INTO rate_limits (key, tokens, updated_at, allowed)
+    VALUES (:key, :capacity - :take, :now, 1)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - :take ELSE {refilled} END,
+        allowed = {refilled} >= 1,
+        updated_at = :now
+    RETURNING tokens, allowed
+'''.format(refilled='MIN(:capacity, tokens + (:now - updated_at) * :rate)')
+
+
+def parse_budget(value):
+    """(capacity, per_seconds) from 'count/seconds', or None for '' or '0' (unlimited)."""
+    if not value or value == '0':
+        return None
+    try:
+        count, per = value.split('/')
+        capacity, per = int(count), float(per)
+    except ValueError:
+        raise ValueError(f'Invalid rate limit {value!r}, expected count/seconds') from None
+    if capacity <= 0 or per <= 0:
+        raise ValueError(f'Invalid rate limit {value!r}, both parts must be positive')
+    return capacity, per
+
+
+class RateLimiter:
+    """Token buckets in the SQLite database at `path`.
+
+    `budgets` maps a budget name to 'count/seconds' (see parse_budget).
+    Nothing is opened until the first check.
+    """
+
+    def __init__(self, path, budgets, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.budgets = {name: parse_budget(value) for name, value in budgets.items()}
+        self._ready = False
+
+    def _connection(self):
+        conn = db.get_connection(self.path)
+        if not self._ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    allowed INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            self._ready = True
+        return conn
+
+    def check(self, budget, key, take=True):
+        """Take a token from `key`'s bucket in `budget`.
+
+        Returns None if the request may proceed, else the number of seconds
+        until a token is available (for Retry-After). With take=False the
+        bucket is only checked, for budgets charged after the fact.
+        """
+        limit = self.budgets.get(budget)
+        if not self.enabled or limit is None:
+            return None
+        capacity, per = limit
+        rate = capacity / per
+        try:
+            conn = self._connection()
+            tokens, allowed = conn.execute(CHECK_SQL, {
+                'key': f'{budget}:{key}', 'capacity': capacity, 'rate': rate, 'now': time.time(),
+                'take': int(take),
+            }).fetchone()
+            conn.commit()
+        except sqlite3.Error:
+            logger.exception('Rate limit check failed, letting the request through')
+            return None
+        if allowed:
+            return None
+        metrics.RATE_LIMITED.inc(budget=budget)
+        return max(1, math.ceil((1 - tokens) / rate))
+
+    def prune(self):
+        """Drop buckets idle long enough to be full again; returns how many."""
+        periods = [limit[1] for limit in self.budgets.values() if limit is not None]
+        if not self.enabled or not periods:
+            return 0
+        conn = self._connection()
+        cursor = conn.execute('DELETE FROM rate_limits WHERE updated_at < ?', (time.time() - max(periods),))
+        conn.commit()
+        return cursor.rowcount
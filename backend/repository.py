@@ -0,0 +1,542 @@
+"""Data access for users, applications and everything attached to them.
+
+Routes go through a Repository instead of running SQL themselves. Every query
+on users, applications, interview notes, the change feed, the ETag data
+versions and the stats counters is made here, or in the feature module a
+method hands its connection to (counters, notes, sync, analytics). The SQL
+is written once, in SQLite's dialect with ? placeholders, and runs as is on
+both backends; the few statements that differ pick the backend's variant.
+
+SQLiteRepository is the single-node setup: the DATABASE file, each thread's
+connection from db.py, and writes queued on the writer gate.
+
+PostgresRepository (DATABASE_BACKEND=postgres) keeps the same tables in one
+PostgreSQL database that any number of backend nodes share, through a
+connection pool per process (see pgdb.py). A request holds one pooled
+connection from its first query until release(). Writes of different users
+no longer queue behind one another; writes of one user still serialise on
+that user's data version row.
+
+The background job queue (jobs.py) and the CV blob index (cvstore.py) live
+in the same database, so on postgres every node sees the same queue and the
+same blob refcounts. Full-text search is FTS5 on SQLite and tsvector columns
+with GIN indexes on postgres (search.py).
+"""
+import contextlib
+import importlib.util
+import os
+import sqlite3
+import threading
+
+import analytics
+import counters
+import db
+import jobs
+import migrations
+import notes
+import search
+import sync
+
+BACKENDS = ('sqlite', 'postgres')
+
+
+class DuplicateUser(Exception):
+    """The username or email is taken; `field` names which one, if known."""
+
+    def __init__(self, field=None):
+        super().__init__(field)
+        self.field = field
+
+
+class Rollback(Exception):
+    """Raise inside transaction() to roll it back without an error."""
+
+
+class Repository:
+    """Queries shared by both backends; subclasses supply connections and transactions."""
+
+    name = None
+    # Dialect differences
+    series_sql = analytics.SERIES_SQL
+    expected_counts_sql = counters.EXPECTED_COUNTS_SQL
+    claim_job_sql = jobs.CLAIM_SQL
+    prefix_match = 'LIKE'
+
+    def connection(self):
+        """This thread's connection, for the duration of the request."""
+        raise NotImplementedError
+
+    def release(self):
+        """End of request: give back the connection, rolling back anything left open."""
+        raise NotImplementedError
+
+    def transaction(self):
+        """Context manager: one write transaction on this thread's connection.
+
+        Commits when the block ends, rolls back if it raises (Rollback is
+        swallowed). May raise db.WriterBusy before the block starts.
+        """
+        raise NotImplementedError
+
+    def snapshot(self):
+        """Context manager: a read transaction whose queries all see the same data."""
+        raise NotImplementedError
+
+    def migrate(self):
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def savepoint(self, name):
+        """Undo the block's writes if it raises, keeping the rest of the transaction."""
+        conn = self.connection()
+        conn.execute(f'SAVEPOINT {name}')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f'ROLLBACK TO {name}')
+            conn.execute(f'RELEASE {name}')
+            raise
+        conn.execute(f'RELEASE {name}')
+
+    def _duplicate_field(self, error):
+        message = str(error)
+        return next((field for field in ('username', 'email') if f'users.{field}' in message), None)
+
+    # Users
+
+    def create_user(self, username, email, password):
+        """Insert a user and return the id; raises DuplicateUser. Call inside transaction()."""
+        try:
+            return self.connection().execute(
+                'INSERT INTO users (username, email, password) VALUES (?, ?, ?) RETURNING id',
+                (username, email, password)).fetchone()[0]
+        except self.integrity_error as e:
+            raise DuplicateUser(self._duplicate_field(e)) from None
+
+    def find_user(self, username):
+        """(id, username, password) of the user, or None."""
+        return self.connection().execute('SELECT id, username, password FROM users WHERE username = ?',
+                                         (username,)).fetchone()
+
+    def set_password(self, user_id, password):
+        self.connection().execute('UPDATE users SET password = ? WHERE id = ?', (password, user_id))
+
+    # Applications
+
+    def data_version(self, user_id):
+        """The user's data version, bumped by triggers on every application write (ETags)."""
+        row = self.connection().execute('SELECT version FROM user_data_versions WHERE user_id = ?',
+                                        (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def list_applications(self, user_id, columns, statuses=None, date_from=None, date_to=None,
+                          company=None, before=None, limit=None):
+        """The user's applications, newest first, filtered.
+
+        `company` matches as a prefix. `before` is an (application_date, id)
+        keyset position: only rows after it in list order are returned, so a
+        page costs the same however deep it is.
+        """
+        where = ['user_id = ?']
+        params = [user_id]
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if date_from:
+            where.append('application_date >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('application_date <= ?')
+            params.append(date_to)
+        if company:
+            prefix = company.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append(f"company {self.prefix_match} ? ESCAPE '\\'")
+            params.append(prefix + '%')
+        if before:
+            # Row-value comparison lets the (user_id, application_date) index seek
+            where.append('(application_date, id) < (?, ?)')
+            params.extend(before)
+        sql = f'''/* list_applications */
+            SELECT {', '.join(columns)}
+            FROM applications
+            WHERE {' AND '.join(where)}
+            ORDER BY application_date DESC, id DESC
+        '''
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self.connection().execute(sql, params).fetchall()
+
+    def export_applications(self, user_id, columns):
+        """All of the user's applications, oldest first, as a cursor to read with fetchmany()."""
+        return self.connection().execute(f'''/* export_applications */
+            SELECT {', '.join(columns)}
+            FROM applications
+            WHERE user_id = ?
+            ORDER BY application_date, id
+        ''', (user_id,))
+
+    def find_application(self, user_id, app_id, columns):
+        """`columns` of one of the user's applications, or None."""
+        return self.connection().execute(f"/* find_application */ SELECT {', '.join(columns)} FROM applications WHERE id = ? AND user_id = ?",
+                                          (app_id, user_id)).fetchone()
+
+    def find_cv(self, user_id, cv_filename):
+        """(cv_sha256,) if one of the user's applications has this CV, else None."""
+        return self.connection().execute('SELECT cv_sha256 FROM applications WHERE user_id = ? AND cv_filename = ?',
+                                          (user_id, cv_filename)).fetchone()
+
+    def insert_application(self, user_id, fields, cv_filename=None, cv_sha256=None):
+        """Insert one application from validated `fields` and return its id."""
+        return self.connection().execute('''
+            INSERT INTO applications (user_id, company, application_date, cover_letter, cv_filename, cv_sha256, status, accepted_date, rejected_date, interview_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            RETURNING id
+        ''', (user_id, fields['company'], fields['application_date'], fields['cover_letter'], cv_filename, cv_sha256,
+              fields['status'], fields['accepted_date'], fields['rejected_date'], fields['interview_date'])).fetchone()[0]
+
+    def insert_applications(self, user_id, rows):
+        """Insert many applications (validated field dicts, without CVs) in one statement."""
+        self.connection().cursor().executemany('''
+            INSERT INTO applications (user_id, company, application_date, cover_letter, status, accepted_date, rejected_date, interview_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(user_id, fields['company'], fields['application_date'], fields['cover_letter'], fields['status'],
+               fields['accepted_date'], fields['rejected_date'], fields['interview_date']) for fields in rows])
+
+    def update_application(self, user_id, app_id, values):
+        """Set the columns in `values` on one of the user's applications; False if there is none."""
+        cursor = self.connection().execute(
+            f"/* update_application */ UPDATE applications SET {', '.join(f'{name} = ?' for name in values)} "
+            "WHERE id = ? AND user_id = ?",
+            (*values.values(), app_id, user_id))
+        return cursor.rowcount > 0
+
+    def delete_application(self, user_id, app_id):
+        """Delete one of the user's applications (and its notes); False if there is none."""
+        cursor = self.connection().execute('DELETE FROM applications WHERE id = ? AND user_id = ?',
+                                           (app_id, user_id))
+        return cursor.rowcount > 0
+
+    def stats(self, user_id, statuses, month):
+        """Counters for /api/stats as {bucket: count}, see counters.py."""
+        return counters.read_stats(self.connection().cursor(), user_id, statuses, month)
+
+    def calendar_events(self, user_id, events, start, end):
+        """Rows (day, type, id, company, status) between `start` and `end`, ordered by day.
+
+        `events` are (type, date column, required status or None); each is a
+        range seek on its own (user_id, <date column>) index.
+        """
+        selects = []
+        params = []
+        for event_type, column, required_status in events:
+            sql = (f"SELECT {column} AS day, '{event_type}' AS type, id, company, status "
+                   f"FROM applications WHERE user_id = ? AND {column} >= ? AND {column} <= ?")
+            params.extend([user_id, start, end])
+            if required_status:
+                sql += ' AND status = ?'
+                params.append(required_status)
+            selects.append(sql)
+        return self.connection().execute('/* calendar_events */ ' + ' UNION ALL '.join(selects) + ' ORDER BY day, id',
+                                         params).fetchall()
+
+    def analytics(self, user_id, interval, start, end):
+        """Funnel series for /api/analytics, see analytics.py."""
+        return analytics.series(self.connection().cursor(), user_id, interval, start, end, self.series_sql)
+
+    def changes(self, user_id, since, limit, fields, fmt='objects'):
+        """One page of the change feed, read from a single snapshot (see sync.py)."""
+        with self.snapshot() as conn:
+            return sync.changes(conn, user_id, since, limit, fields, fmt)
+
+    def prune_tombstones(self, retention):
+        with self.transaction() as conn:
+            return sync.prune_tombstones(conn, retention)
+
+    def verify_counters(self):
+        return counters.verify_counters(self.connection(), self.expected_counts_sql)
+
+    def rebuild_counters(self):
+        with self.transaction() as conn:
+            counters.fill_counters(conn.cursor(), self.expected_counts_sql)
+
+    # Interview notes
+
+    def owns_application(self, user_id, app_id):
+        return notes.owns_application(self.connection().cursor(), user_id, app_id)
+
+    def notes_page(self, app_id, limit, before=None):
+        return notes.page(self.connection().cursor(), app_id, limit, before)
+
+    def add_note(self, user_id, app_id, body):
+        """Add a note to one of the user's applications and return it, or None if there is no such application.
+
+        Call inside transaction(); a trigger updates the application's note_count.
+        """
+        cursor = self.connection().cursor()
+        if not notes.owns_application(cursor, user_id, app_id):
+            return None
+        cursor.execute('INSERT INTO application_notes (application_id, body) VALUES (?, ?) RETURNING id',
+                       (app_id, body))
+        return notes.get(cursor, user_id, app_id, cursor.fetchone()[0])
+
+    def update_note(self, user_id, app_id, note_id, body):
+        """Replace a note's body and return the note, or None if the user has no such note."""
+        cursor = self.connection().cursor()
+        cursor.execute('''
+            UPDATE application_notes SET body = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND application_id IN (SELECT id FROM applications WHERE id = ? AND user_id = ?)
+        ''', (body, note_id, app_id, user_id))
+        if cursor.rowcount == 0:
+            return None
+        return notes.get(cursor, user_id, app_id, note_id)
+
+    def delete_note(self, user_id, app_id, note_id):
+        """Delete a note; False if the user has no such note."""
+        cursor = self.connection().execute('''
+            DELETE FROM application_notes
+            WHERE id = ? AND application_id IN (SELECT id FROM applications WHERE id = ? AND user_id = ?)
+        ''', (note_id, app_id, user_id))
+        return cursor.rowcount > 0
+
+    # Search
+
+    def search(self, user_id, words, limit, offset):
+        """One page of the user's matches for search.terms() `words`, see search.py."""
+        return search.search(self.connection().cursor(), user_id, search.match_query(words), limit, offset)
+
+    # CV blobs, see cvstore.py. Triggers on applications.cv_sha256 keep the refcounts.
+
+    def find_cv_blob(self, sha256, columns):
+        """`columns` of the blob's row, or None."""
+        return self.connection().execute(f"/* find_cv_blob */ SELECT {', '.join(columns)} FROM cv_blobs WHERE sha256 = ?",
+                                          (sha256,)).fetchone()
+
+    def hold_cv_blob(self, sha256, size):
+        """Create the blob's row if needed and add a pending upload. Call inside transaction()."""
+        self.connection().execute('''
+            INSERT INTO cv_blobs (sha256, size, uploads_pending, upload_started_at)
+            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (sha256) DO UPDATE SET
+                uploads_pending = cv_blobs.uploads_pending + 1, upload_started_at = CURRENT_TIMESTAMP
+        ''', (sha256, size))
+
+    def delete_cv_blob(self, sha256, held_since):
+        """Delete the blob's row if nothing references it and no upload began at or after `held_since`.
+
+        `held_since` is a UTC 'YYYY-MM-DD HH:MM:SS' timestamp. Returns True
+        if the row was deleted. Call inside transaction().
+        """
+        cursor = self.connection().execute('''
+            DELETE FROM cv_blobs
+            WHERE sha256 = ? AND refcount <= 0
+              AND NOT (uploads_pending > 0 AND upload_started_at >= ?)
+        ''', (sha256, held_since))
+        return cursor.rowcount > 0
+
+    def unreferenced_cv_blobs(self):
+        return [row[0] for row in self.connection().execute('SELECT sha256 FROM cv_blobs WHERE refcount <= 0')]
+
+    def unextracted_cv_blobs(self):
+        return [row[0] for row in self.connection().execute('SELECT sha256 FROM cv_blobs WHERE extracted_at IS NULL')]
+
+    def lock_cv_blobs(self):
+        """Keep other transactions from adding or changing blob rows until this one ends.
+
+        Call inside transaction(). SQLite's write lock already does.
+        """
+
+    def finish_cv_extraction(self, sha256, preview, text):
+        """Mark the blob extracted with its preview flag and index its text.
+
+        Returns False if the blob is gone or was already extracted. Call
+        inside transaction().
+        """
+        raise NotImplementedError
+
+
+class SQLiteRepository(Repository):
+    """The DATABASE file: one writer at a time, queued per process on `writer_gate`."""
+
+    name = 'sqlite'
+    integrity_error = sqlite3.IntegrityError
+
+    def __init__(self, path, writer_gate=None):
+        self.path = path
+        self.writer_gate = writer_gate or db.WriterGate()
+
+    def connection(self):
+        return db.get_connection(self.path)
+
+    def release(self):
+        db.release_connections()
+
+    def close(self):
+        db.close_connections()
+
+    def migrate(self):
+        return migrations.migrate(self.connection())
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # Take the write lock up front, so the transaction cannot fail
+        # half-way with SQLITE_BUSY when upgrading from a read
+        conn = self.connection()
+        with self.writer_gate:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except Rollback:
+                conn.rollback()
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        conn = self.connection()
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+    def finish_cv_extraction(self, sha256, preview, text):
+        # A trigger on extracted_at bumps the owners' data versions
+        conn = self.connection()
+        updated = conn.execute('''
+            UPDATE cv_blobs SET extracted_at = CURRENT_TIMESTAMP, preview = ?
+            WHERE sha256 = ? AND extracted_at IS NULL
+            RETURNING rowid
+        ''', (int(preview), sha256)).fetchone()
+        if updated and text.strip():
+            conn.execute(f'''
+                INSERT INTO cv_text_fts (rowid, owners, body)
+                VALUES (?, ({search.CV_OWNERS_SQL.format(sha256='?')}), ?)
+            ''', (updated[0], sha256, text))
+        return bool(updated)
+
+
+class PostgresRepository(Repository):
+    """A PostgreSQL database shared by every node, through a pool of `pool_size` connections per process.
+
+    A request waits up to `pool_timeout` seconds for a free connection, then
+    gets db.WriterBusy (a 503, like a full SQLite writer queue).
+    """
+
+    name = 'postgres'
+    series_sql = analytics.POSTGRES_SERIES_SQL
+    expected_counts_sql = counters.POSTGRES_EXPECTED_COUNTS_SQL
+    claim_job_sql = jobs.POSTGRES_CLAIM_SQL
+    # SQLite's LIKE ignores ASCII case; keep the company filter behaving the same
+    prefix_match = 'ILIKE'
+
+    def __init__(self, url, pool_size=5, pool_timeout=5.0):
+        # psycopg is optional: only this backend needs it
+        if importlib.util.find_spec('psycopg') is None or importlib.util.find_spec('psycopg_pool') is None:
+            raise RuntimeError('DATABASE_BACKEND=postgres needs psycopg (pip install "psycopg[binary]" psycopg-pool)')
+        if not url:
+            raise ValueError('DATABASE_BACKEND=postgres needs DATABASE_URL')
+        import pgdb
+        self.url = url
+        self.pool = pgdb.Pool(url, max_size=pool_size, timeout=pool_timeout)
+        self.integrity_error = pgdb.IntegrityError
+        self._local = threading.local()
+
+    def connection(self):
+        import pgdb
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.pid = os.getpid()
+            self._local.conn = None
+        if self._local.conn is None:
+            try:
+                self._local.conn = self.pool.getconn()
+            except pgdb.PoolTimeout:
+                raise db.WriterBusy('No database connection free') from None
+        return self._local.conn
+
+    def release(self):
+        # The local rate limit database too
+        db.release_connections()
+        if getattr(self._local, 'pid', None) == os.getpid() and self._local.conn is not None:
+            conn, self._local.conn = self._local.conn, None
+            # The pool rolls back an unfinished transaction
+            self.pool.putconn(conn)
+
+    def close(self):
+        self.release()
+        self.pool.close()
+
+    def migrate(self):
+        # A connection of its own, so gunicorn's master keeps no pool across fork()
+        import pgdb
+        conn = pgdb.connect(self.url)
+        try:
+            return pgdb.migrate(conn)
+        finally:
+            conn.close()
+
+    def _duplicate_field(self, error):
+        constraint = error.diag.constraint_name or ''
+        return next((field for field in ('username', 'email') if constraint == f'users_{field}_key'), None)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self.connection()
+        try:
+            with conn.transaction():
+                yield conn
+        except Rollback:
+            pass
+
+    @contextlib.contextmanager
+    def snapshot(self):
+        conn = self.connection()
+        with conn.transaction():
+            conn.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+            yield conn
+
+    def search(self, user_id, words, limit, offset):
+        return search.postgres_search(self.connection().cursor(), user_id, words, limit, offset)
+
+    def lock_cv_blobs(self):
+        # Conflicts with row writes, not with reads
+        self.connection().execute('LOCK TABLE cv_blobs IN SHARE ROW EXCLUSIVE MODE')
+
+    def finish_cv_extraction(self, sha256, preview, text):
+        conn = self.connection()
+        # New text changes search results: invalidate the owners' ETags. Done
+        # before the blob row is locked, in the order application writes
+        # take the same locks (data version, then blob), so they cannot deadlock.
+        conn.execute('''
+            UPDATE user_data_versions SET version = version + 1
+            WHERE user_id IN (SELECT user_id FROM applications WHERE cv_sha256 = ?)
+        ''', (sha256,))
+        cursor = conn.execute('''
+            UPDATE cv_blobs SET extracted_at = CURRENT_TIMESTAMP, preview = ?, body = ?
+            WHERE sha256 = ? AND extracted_at IS NULL
+        ''', (int(preview), text if text.strip() else None, sha256))
+        return cursor.rowcount > 0
+
+    def export_applications(self, user_id, columns):
+        # Stream the rows instead of buffering the whole result client-side
+        import pgdb
+        return pgdb.RowStream(self.connection().cursor(), f'''/* export_applications */
+            SELECT {', '.join(columns)}
+            FROM applications
+            WHERE user_id = ?
+            ORDER BY application_date, id
+        ''', (user_id,))
+
+
+def from_config(config, writer_gate=None):
+    """The repository selected by DATABASE_BACKEND and the DATABASE_* settings."""
+    backend = config['DATABASE_BACKEND']
+    if backend == 'sqlite':
+        return SQLiteRepository(config['DATABASE'], writer_gate)
+    if backend == 'postgres':
+        return PostgresRepository(config['DATABASE_URL'], pool_size=config['DATABASE_POOL_SIZE'],
+                                  pool_timeout=config['DATABASE_POOL_TIMEOUT'])
+    raise ValueError(f'Invalid DATABASE_BACKEND {backend!r}, expected one of {", ".join(BACKENDS)}')
@@ -0,0 +1,258 @@
+"""Full-text search over applications (company, cover letter and CV text).
+
+On SQLite, company and cover letter are indexed by the FTS5 `applications_fts`
+external-content table, which triggers keep in step with `applications`. CV
+text lives in `cv_text_fts`, one row per blob, filled in by the extract_cv
+background job.
+
+Both indexes are shared by all users, so every row also carries its owners as
+tokens (`u<user_id>`, in the `owner`/`owners` column) and every query ANDs its
+user's token in: FTS5 then only visits, ranks and snippets that user's rows,
+and a search costs the same however much other users have stored.
+
+On PostgreSQL the same search runs on tsvector columns with GIN indexes
+instead, see postgres_search().
+"""
+import re
+
+# Highlight markers wrapped around matched terms in `company` and `snippet`.
+# Control characters never occur in user text, so clients can split on them
+# and render matches without treating the text as HTML.
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+SNIPPET_TOKENS = 16
+# bm25 scores are negative (lower is better); CV hits are scaled towards zero
+# so a cover letter or company match on the same terms ranks first
+CV_RANK_WEIGHT = 0.5
+MAX_TERMS = 12
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def terms(text):
+    """The searchable words of free text, at most MAX_TERMS; FTS operators count as plain words."""
+    return _TERM_RE.findall(text or '')[:MAX_TERMS]
+
+
+def match_query(words):
+    """Turn terms() into a safe FTS5 query: every word is a required prefix term.
+
+    ['fintech', 'kube'] -> '"fintech"* "kube"*'.
+    """
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def tsquery(words, weights=''):
+    """The PostgreSQL counterpart of match_query(), limited to the given weights.
+
+    (['fintech', 'kube'], 'AB') -> "'fintech':*AB & 'kube':*AB".
+    """
+    return ' & '.join(f"'{word}':*{weights}" for word in words)
+
+
+def owner_token(user_id):
+    return f'u{int(user_id)}'
+
+
+def search(cursor, user_id, query, limit, offset):
+    """Ranked matches for one user, best first (bm25, company weighted x4).
+
+    Returns (rows, has_more) where rows carry id, company (highlighted),
+    status, application_date, a snippet, and `source` ('application' or 'cv')
+    saying whether the snippet comes from the cover letter or the CV. An
+    application matching in both places appears once, with its better hit.
+    `query` comes from match_query(); the terms are kept out of the owner
+    columns, so a word like 'u12' cannot match another user's token.
+    """
+    owner = owner_token(user_id)
+    cursor.execute(f'''
+        SELECT a.id, a.status, a.application_date, hit.company, hit.snippet, hit.source,
+               MIN(hit.rank) AS rank
+        FROM (
+            SELECT applications_fts.rowid AS id,
+                   highlight(applications_fts, 1, '{MATCH_START}', '{MATCH_END}') AS company,
+                   snippet(applications_fts, 2, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+                   'application' AS source,
+                   bm25(applications_fts, 0.0, 4.0, 1.0) AS rank
+            FROM applications_fts
+            WHERE applications_fts MATCH :application_query
+            UNION ALL
+            SELECT cv_owner.id, cv_owner.company,
+                   snippet(cv_text_fts, 1, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}),
+                   'cv',
+                   bm25(cv_text_fts, 0.0, 1.0) * {CV_RANK_WEIGHT}
+            FROM cv_text_fts
+            JOIN cv_blobs b ON b.rowid = cv_text_fts.rowid
+            JOIN applications cv_owner ON cv_owner.cv_sha256 = b.sha256 AND cv_owner.user_id = :user_id
+            WHERE cv_text_fts MATCH :cv_query
+        ) hit
+        JOIN applications a ON a.id = hit.id
+        WHERE a.user_id = :user_id
+        GROUP BY a.id
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    ''', {
+        'application_query': f'owner : "{owner}" AND {{company cover_letter}} : ({query})',
+        'cv_query': f'owners : "{owner}" AND body : ({query})',
+        'user_id': user_id, 'limit': limit + 1, 'offset': offset,
+    })
+    rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+# ts_rank weights for {D, C, B, A} on PostgreSQL: company (A) counts 4x the
+# cover letter (B); the owner token (D) is only there to filter
+POSTGRES_RANK_WEIGHTS = '{0, 0, 0.25, 1}'
+
+
+def postgres_search(cursor, user_id, words, limit, offset):
+    """search() for PostgreSQL, with the same rows and ranking order.
+
+    applications.search_vector carries the owner token at weight D, so the
+    GIN index only yields the user's rows. CV text is matched blob by blob
+    for the user's applications that have one. Highlights and snippets are
+    computed for the returned page only.
+    """
+    ranked = tsquery(words, 'AB')
+    owned = f"'{owner_token(user_id)}':D & {ranked}"
+    terms = tsquery(words)
+    highlight = f'HighlightAll=true, StartSel={MATCH_START}, StopSel={MATCH_END}'
+    snippet = (f'StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords={SNIPPET_TOKENS}, '
+               f'MinWords={SNIPPET_TOKENS // 2}, MaxFragments=1, FragmentDelimiter=…')
+    cursor.execute(f'''
+        WITH hit AS (
+            SELECT id, -ts_rank('{POSTGRES_RANK_WEIGHTS}', search_vector, to_tsquery('simple', ?)) AS rank,
+                   'application' AS source
+            FROM applications
+            WHERE search_vector @@ to_tsquery('simple', ?) AND user_id = ?
+            UNION ALL
+            SELECT a.id, -ts_rank(b.body_vector, to_tsquery('simple', ?)) * {CV_RANK_WEIGHT}, 'cv'
+            FROM applications a
+            JOIN cv_blobs b ON b.sha256 = a.cv_sha256
+            WHERE a.user_id = ? AND b.body_vector @@ to_tsquery('simple', ?)
+        ), best AS (
+            SELECT DISTINCT ON (id) id, rank, source FROM hit ORDER BY id, rank
+        ), page AS (
+            SELECT id, rank, source FROM best ORDER BY rank, id LIMIT ? OFFSET ?
+        )
+        SELECT a.id, a.status, a.application_date,
+               CASE page.source WHEN 'cv' THEN a.company
+                    ELSE ts_headline('simple', a.company, to_tsquery('simple', ?), ?) END AS company,
+               CASE page.source WHEN 'cv' THEN ts_headline('simple', b.body, to_tsquery('simple', ?), ?)
+                    ELSE ts_headline('simple', COALESCE(a.cover_letter, ''), to_tsquery('simple', ?), ?)
+               END AS snippet,
+               page.source, page.rank
+        FROM page
+        JOIN applications a ON a.id = page.id
+        LEFT JOIN cv_blobs b ON page.source = 'cv' AND b.sha256 = a.cv_sha256
+        ORDER BY page.rank, page.id
+    ''', (ranked, owned, user_id, terms, user_id, terms, limit + 1, offset,
+          terms, highlight, terms, snippet, terms, snippet))
+    rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+# Space-separated owner tokens of every user whose applications reference the
+# blob with SHA-256 `:sha256`, for cv_text_fts.owners
+CV_OWNERS_SQL = '''
+    SELECT group_concat(owner, ' ') FROM (
+        SELECT DISTINCT 'u' || user_id AS owner FROM applications WHERE cv_sha256 = {sha256}
+    )
+'''
+
+
+def _refresh_cv_owners(sha256):
+    return f'''
+        UPDATE cv_text_fts SET owners = ({CV_OWNERS_SQL.format(sha256=sha256)})
+        WHERE rowid = (SELECT rowid FROM cv_blobs WHERE sha256 = {sha256});
+    '''
+
+
+def create_user_partitioned_indexes(cursor):
+    """(Re)build applications_fts and cv_text_fts with owner tokens, plus their triggers.
+
+    applications_fts reads its content through a view that adds the owner
+    token, so nothing is stored twice. A CV can be shared by several users
+    (blobs are content-addressed), so cv_text_fts lists all of them and the
+    triggers below rewrite the list when an application gains or drops a CV.
+    """
+    for trigger in ('applications_fts_insert', 'applications_fts_delete', 'applications_fts_update'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    cursor.execute('DROP TABLE IF EXISTS applications_fts')
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS applications_fts_source AS
+        SELECT id, 'u' || user_id AS owner, company, cover_letter FROM applications
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE applications_fts USING fts5(
+            owner, company, cover_letter,
+            content='applications_fts_source', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER applications_fts_insert
+        AFTER INSERT ON applications
+        BEGIN
+            INSERT INTO applications_fts (rowid, owner, company, cover_letter)
+            VALUES (NEW.id, 'u' || NEW.user_id, NEW.company, NEW.cover_letter);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER applications_fts_delete
+        AFTER DELETE ON applications
+        BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, owner, company, cover_letter)
+            VALUES ('delete', OLD.id, 'u' || OLD.user_id, OLD.company, OLD.cover_letter);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER applications_fts_update
+        AFTER UPDATE OF user_id, company, cover_letter ON applications
+        BEGIN
+            INSERT INTO applications_fts (applications_fts, rowid, owner, company, cover_letter)
+            VALUES ('delete', OLD.id, 'u' || OLD.user_id, OLD.company, OLD.cover_letter);
+            INSERT INTO applications_fts (rowid, owner, company, cover_letter)
+            VALUES (NEW.id, 'u' || NEW.user_id, NEW.company, NEW.cover_letter);
+        END
+    ''')
+    cursor.execute("INSERT INTO applications_fts (applications_fts) VALUES ('rebuild')")
+
+    # Looks up a blob's owners (and the users whose ETags an extraction invalidates)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_cv_sha256 '
+                   'ON applications (cv_sha256) WHERE cv_sha256 IS NOT NULL')
+    cursor.execute('CREATE TEMP TABLE cv_text_old AS SELECT rowid AS id, body FROM cv_text_fts')
+    cursor.execute('DROP TABLE cv_text_fts')
+    cursor.execute('CREATE VIRTUAL TABLE cv_text_fts USING fts5(owners, body)')
+    cursor.execute(f'''
+        INSERT INTO cv_text_fts (rowid, owners, body)
+        SELECT old.id, ({CV_OWNERS_SQL.format(sha256='b.sha256')}), old.body
+        FROM cv_text_old old JOIN cv_blobs b ON b.rowid = old.id
+    ''')
+    cursor.execute('DROP TABLE cv_text_old')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_owners_insert
+        AFTER INSERT ON applications
+        WHEN NEW.cv_sha256 IS NOT NULL
+        BEGIN
+            {_refresh_cv_owners('NEW.cv_sha256')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_owners_delete
+        AFTER DELETE ON applications
+        WHEN OLD.cv_sha256 IS NOT NULL
+        BEGIN
+            {_refresh_cv_owners('OLD.cv_sha256')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS applications_cv_owners_update
+        AFTER UPDATE OF user_id, cv_sha256 ON applications
+        WHEN OLD.cv_sha256 IS NOT NEW.cv_sha256 OR OLD.user_id IS NOT NEW.user_id
+        BEGIN
+            {_refresh_cv_owners('OLD.cv_sha256')}
+            {_refresh_cv_owners('NEW.cv_sha256')}
+        END
+    ''')
@@ -0,0 +1,298 @@
+"""Where CV files live: the local upload folder or an S3-compatible bucket.
+
+cvstore.py addresses everything it keeps by key: blobs as
+'blobs/<aa>/<sha256>', their first-page previews next to them, and uploads
+from before content-addressed storage as a bare file name. A storage maps
+keys to bytes; the cv_blobs table stays the source of truth for what should
+exist.
+
+LocalStorage keeps the historical layout under UPLOAD_FOLDER, so existing
+volumes and the nginx X-Accel-Redirect location keep working. S3Storage puts
+the same keys in a bucket (AWS, MinIO, ...), which every backend container
+can reach, so replicas no longer need a shared volume. Downloads can then be
+answered with a presigned URL and never pass through a worker.
+
+Uploads are always first streamed to a scratch directory on local disk while
+they are hashed (see cvstore.HashingFile); put_file() then moves or uploads
+that file under its final key.
+"""
+import collections
+import contextlib
+import importlib.util
+import os
+import tempfile
+import threading
+
+BACKENDS = ('local', 's3')
+
+CHUNK_SIZE = 64 * 1024
+
+# Upload anything bigger in parts, several at a time (see S3Storage.put_file)
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+
+# An object read from storage: an iterator of byte chunks, the number of
+# bytes it will yield and, for a Range request, the Content-Range they cover
+StoredObject = collections.namedtuple('StoredObject', 'chunks length content_range')
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the object."""
+
+
+class LocalStorage:
+    """Keys as files under `root`.
+
+    `scratch_dir` (default `<root>/tmp`) is where uploads are spooled; it is
+    on the same file system as the blobs, so put_file() is a rename.
+    """
+
+    name = 'local'
+
+    def __init__(self, root, scratch_dir=None):
+        self.root = root
+        self.scratch_dir = scratch_dir or os.path.join(root, 'tmp')
+
+    def path(self, key):
+        """File system path of `key`, for send_file and X-Accel-Redirect."""
+        parts = key.split('/')
+        if not key or key.startswith('/') or any(part in ('', '.', '..') for part in parts[:-1]) \
+                or parts[-1] in ('.', '..'):
+            raise ValueError(f'Invalid storage key {key!r}')
+        return os.path.join(self.root, *parts)
+
+    def put_file(self, key, path, content_type=None):
+        """Move the file at `path` to `key`, replacing any existing file."""
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        """Remove `key`; returns True if it existed."""
+        try:
+            os.remove(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        """A file system path holding the object's bytes, for the duration of the block."""
+        yield self.path(key)
+
+    def presigned_url(self, key, content_type, content_disposition, expires):
+        """None: local files are served by the backend or nginx."""
+        return None
+
+    def list(self, prefix='', recursive=True):
+        """Yield (key, mtime) for the files under `prefix`.
+
+        With recursive=False only files directly in it, not in subdirectories.
+        """
+        top = self.path(prefix.rstrip('/')) if prefix else self.root
+        if recursive:
+            entries = ((directory, name) for directory, _, names in os.walk(top) for name in names)
+        else:
+            try:
+                entries = [(top, entry.name) for entry in os.scandir(top)
+                           if entry.is_file() and not entry.name.startswith('.')]
+            except FileNotFoundError:
+                entries = []
+        for directory, name in entries:
+            path = os.path.join(directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except FileNotFoundError:
+                continue
+            yield os.path.relpath(path, self.root).replace(os.sep, '/'), mtime
+
+
+class S3Storage:
+    """Keys as objects in an S3 bucket, optionally under `prefix`.
+
+    One boto3 client per process is shared by all threads; its connection
+    pool holds up to `max_pool_connections` keep-alive connections, so a
+    request does not pay for a new TCP/TLS handshake. `endpoint_url` points
+    at MinIO or another S3-compatible service. Presigned URLs are signed
+    for `public_endpoint_url` when the browser reaches the service under
+    another name than the backend does (e.g. http://minio:9000 inside
+    docker compose).
+    """
+
+    name = 's3'
+
+    def __init__(self, bucket, scratch_dir, prefix='', endpoint_url=None, public_endpoint_url=None,
+                 region=None, access_key=None, secret_key=None, addressing_style=None,
+                 max_pool_connections=32):
+        # boto3 is optional, and only imported when the first client is built:
+        # importing it probes the network stack (urllib3's IPv6 check)
+        if importlib.util.find_spec('boto3') is None:
+            raise RuntimeError('STORAGE_BACKEND=s3 needs boto3 (pip install boto3)')
+        if not bucket:
+            raise ValueError('STORAGE_BACKEND=s3 needs S3_BUCKET')
+        self.bucket = bucket
+        self.scratch_dir = scratch_dir
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self._options = {
+            'region_name': region or None,
+            'aws_access_key_id': access_key or None,
+            'aws_secret_access_key': secret_key or None,
+        }
+        self._config = {
+            'max_pool_connections': max_pool_connections,
+            'retries': {'max_attempts': 3, 'mode': 'standard'},
+            'signature_version': 's3v4',
+            # MinIO and most self-hosted services only do path-style addressing
+            's3': {'addressing_style': addressing_style or ('path' if endpoint_url else 'auto')},
+        }
+        self._endpoint_url = endpoint_url or None
+        self._public_endpoint_url = public_endpoint_url or None
+        self._client = self._signer = self._transfer_config = None
+        self._lock = threading.Lock()
+
+    def _make_client(self, endpoint_url):
+        import boto3
+        from botocore.config import Config
+        # A session per client: sessions are not thread-safe, clients are
+        return boto3.session.Session().client('s3', endpoint_url=endpoint_url, config=Config(**self._config),
+                                              **self._options)
+
+    @property
+    def transfer_config(self):
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+            self._transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, max_concurrency=4)
+        return self._transfer_config
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._make_client(self._endpoint_url)
+        return self._client
+
+    @property
+    def signer(self):
+        # Signing is local, but the URL's host is part of the signature
+        if not self._public_endpoint_url:
+            return self.client
+        if self._signer is None:
+            with self._lock:
+                if self._signer is None:
+                    self._signer = self._make_client(self._public_endpoint_url)
+        return self._signer
+
+    def _key(self, key):
+        return self.prefix + key
+
+    def put_file(self, key, path, content_type=None):
+        """Upload the file at `path` to `key` and remove it.
+
+        Streams from disk; large files go up as a multipart upload.
+        """
+        extra = {'ContentType': content_type} if content_type else None
+        self.client.upload_file(path, self.bucket, self._key(key), ExtraArgs=extra, Config=self.transfer_config)
+        os.remove(path)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, key):
+        """Remove `key`. S3 does not say whether it existed, so this returns True."""
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        return True
+
+    @contextlib.contextmanager
+    def local_copy(self, key):
+        """Download `key` to a scratch file that is removed after the block."""
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.scratch_dir, prefix='download-', delete=False) as tmp:
+            pass
+        try:
+            self.client.download_file(self.bucket, self._key(key), tmp.name, Config=self.transfer_config)
+            yield tmp.name
+        finally:
+            try:
+                os.remove(tmp.name)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key, byte_range=None):
+        """Stream `key`, or the part of it named by a Range header value.
+
+        Raises FileNotFoundError if there is no such object and
+        RangeNotSatisfiable for a range past its end.
+        """
+        from botocore.exceptions import ClientError
+        args = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if byte_range:
+            args['Range'] = byte_range
+        try:
+            obj = self.client.get_object(**args)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('404', 'NoSuchKey'):
+                raise FileNotFoundError(key) from None
+            if code == 'InvalidRange':
+                raise RangeNotSatisfiable(byte_range) from None
+            raise
+        return StoredObject(_chunks(obj['Body']), obj['ContentLength'], obj.get('ContentRange'))
+
+    def presigned_url(self, key, content_type, content_disposition, expires):
+        """A GET URL for `key` valid for `expires` seconds, with the given response headers."""
+        return self.signer.generate_presigned_url('get_object', ExpiresIn=expires, Params={
+            'Bucket': self.bucket,
+            'Key': self._key(key),
+            'ResponseContentType': content_type,
+            'ResponseContentDisposition': content_disposition,
+        })
+
+    def list(self, prefix='', recursive=True):
+        """Yield (key, mtime) for the objects under `prefix` (see LocalStorage.list)."""
+        args = {'Bucket': self.bucket, 'Prefix': self._key(prefix)}
+        if not recursive:
+            args['Delimiter'] = '/'
+        for page in self.client.get_paginator('list_objects_v2').paginate(**args):
+            for obj in page.get('Contents', ()):
+                yield obj['Key'][len(self.prefix):], obj['LastModified'].timestamp()
+
+
+def _chunks(body):
+    # Close the body even if the client goes away mid-download, so the
+    # connection goes back to the pool instead of leaking
+    try:
+        yield from body.iter_chunks(CHUNK_SIZE)
+    finally:
+        body.close()
+
+
+def from_config(config):
+    """The storage selected by STORAGE_BACKEND and the S3_* settings."""
+    scratch_dir = os.path.join(config['UPLOAD_FOLDER'], 'tmp')
+    backend = config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'], scratch_dir)
+    if backend == 's3':
+        return S3Storage(
+            config['S3_BUCKET'],
+            scratch_dir,
+            prefix=config['S3_PREFIX'],
+            endpoint_url=config['S3_ENDPOINT_URL'],
+            public_endpoint_url=config['S3_PUBLIC_ENDPOINT_URL'],
+            region=config['S3_REGION'],
+            access_key=config['S3_ACCESS_KEY_ID'],
+            secret_key=config['S3_SECRET_ACCESS_KEY'],
+            addressing_style=config['S3_ADDRESSING_STYLE'],
+            max_pool_connections=config['S3_MAX_POOL_CONNECTIONS'],
+        )
+    raise ValueError(f'Invalid STORAGE_BACKEND {backend!r}, expected one of {", ".join(BACKENDS)}')
@@ -0,0 +1,169 @@
+"""Per-user change feed behind /api/applications/changes.
+
+Every application write already bumps the user's `user_data_versions.version`
+(the ETag validator). The triggers created here also stamp the written row
+with that new version as `change_seq`, plus `updated_at`. A delete leaves a
+tombstone carrying the version of the delete. A client that has seen
+everything up to sequence N asks for rows and tombstones with change_seq > N
+and gets back just what changed.
+
+Tombstones are pruned after a retention period. The highest pruned sequence
+is remembered per user as a horizon: a client whose cursor is older than the
+horizon may have missed deletes, so it is told to reset and start again from
+zero.
+"""
+import time
+
+import serialization
+
+BUMP_VERSION = '''
+    INSERT INTO user_data_versions (user_id, version) VALUES ({row}.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+'''
+
+STAMP_ROW = '''
+    UPDATE applications
+    SET change_seq = (SELECT version FROM user_data_versions WHERE user_id = NEW.user_id),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+'''
+
+
+def create_change_feed(cursor, columns):
+    """Schema and triggers for the feed; `columns` are the current applications columns."""
+    if 'change_seq' not in columns:
+        cursor.execute('ALTER TABLE applications ADD COLUMN change_seq INTEGER')
+    if 'updated_at' not in columns:
+        cursor.execute('ALTER TABLE applications ADD COLUMN updated_at TIMESTAMP')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_applications_user_change ON applications(user_id, change_seq)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS application_tombstones (
+            user_id INTEGER NOT NULL,
+            application_id INTEGER NOT NULL,
+            change_seq INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, change_seq)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_horizons (
+            user_id INTEGER PRIMARY KEY,
+            change_seq INTEGER NOT NULL
+        )
+    ''')
+
+    # The version triggers gain the stamping and tombstone statements, so the
+    # order of the two steps is fixed. The stamping UPDATE changes change_seq,
+    # which the update trigger's WHEN skips, so it does not bump again.
+    for name in ('applications_version_insert', 'applications_version_update', 'applications_version_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(f'''
+        CREATE TRIGGER applications_version_insert
+        AFTER INSERT ON applications
+        BEGIN
+            {BUMP_VERSION.format(row='NEW')}
+            {STAMP_ROW}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER applications_version_update
+        AFTER UPDATE ON applications
+        WHEN OLD.change_seq IS NEW.change_seq
+        BEGIN
+            {BUMP_VERSION.format(row='NEW')}
+            {STAMP_ROW}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER applications_version_delete
+        AFTER DELETE ON applications
+        BEGIN
+            {BUMP_VERSION.format(row='OLD')}
+            INSERT INTO application_tombstones (user_id, application_id, change_seq)
+            VALUES (OLD.user_id, OLD.id,
+                    (SELECT version FROM user_data_versions WHERE user_id = OLD.user_id));
+        END
+    ''')
+
+    # Existing rows: number each user's rows after their current version, in
+    # id order, and move the version past them so the sequence stays unique
+    cursor.execute('''
+        UPDATE applications
+        SET change_seq = numbered.seq, updated_at = COALESCE(applications.created_at, CURRENT_TIMESTAMP)
+        FROM (
+            SELECT a.id, IFNULL(v.version, 0) + ROW_NUMBER() OVER (PARTITION BY a.user_id ORDER BY a.id) AS seq
+            FROM applications a LEFT JOIN user_data_versions v ON v.user_id = a.user_id
+        ) AS numbered
+        WHERE applications.id = numbered.id AND applications.change_seq IS NULL
+    ''')
+    cursor.execute('''
+        INSERT INTO user_data_versions (user_id, version)
+        SELECT user_id, MAX(change_seq) FROM applications GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET version = MAX(version, excluded.version)
+    ''')
+
+
+def changes(conn, user_id, since, limit, fields, fmt='objects'):
+    """Rows changed and ids deleted after sequence `since`, oldest change first.
+
+    Returns {'changes', 'deleted', 'cursor', 'has_more', 'reset'}. Pass
+    `cursor` back as `since` for the next call. With `has_more`, call again
+    straight away. With `reset`, the client's copy is too old to patch and
+    must be dropped: the changes returned start from zero. Call inside a read
+    transaction (Repository.snapshot()), so the three queries see the same
+    snapshot. `fmt` is passed to serialization.rows_payload for `changes`.
+    """
+    row = conn.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,)).fetchone()
+    version = row[0] if row else 0
+    row = conn.execute('SELECT change_seq FROM sync_horizons WHERE user_id = ?', (user_id,)).fetchone()
+    horizon = row[0] if row else 0
+
+    # Behind the pruned tombstones, or ahead of the server (e.g. a restored database)
+    reset = since > 0 and (since < horizon or since > version)
+    if reset:
+        since = 0
+
+    columns = list(dict.fromkeys(list(fields) + ['change_seq', 'updated_at']))
+    rows = conn.execute(f'''/* changes */
+        SELECT {', '.join(columns)} FROM applications
+        WHERE user_id = ? AND change_seq > ?
+        ORDER BY change_seq
+        LIMIT ?
+    ''', (user_id, since, limit + 1)).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1]['change_seq'] if has_more else version
+
+    deleted = []
+    if since > 0:
+        # A fresh client has nothing to delete
+        deleted = [row[0] for row in conn.execute('''
+            SELECT application_id FROM application_tombstones
+            WHERE user_id = ? AND change_seq > ? AND change_seq <= ?
+            ORDER BY change_seq
+        ''', (user_id, since, cursor))]
+
+    return {
+        'changes': serialization.rows_payload(rows, columns, fmt),
+        'deleted': deleted,
+        'cursor': cursor,
+        'has_more': has_more,
+        'reset': reset,
+    }
+
+
+def prune_tombstones(conn, retention):
+    """Delete tombstones older than `retention` seconds, raising each user's horizon. Returns how many.
+
+    Call inside a write transaction. The SQL runs on SQLite and PostgreSQL alike.
+    """
+    cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - retention))
+    conn.execute('''
+        INSERT INTO sync_horizons (user_id, change_seq)
+        SELECT user_id, MAX(change_seq) FROM application_tombstones
+        WHERE deleted_at < ? GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET change_seq = CASE
+            WHEN excluded.change_seq > sync_horizons.change_seq THEN excluded.change_seq
+            ELSE sync_horizons.change_seq END
+    ''', (cutoff,))
+    return conn.execute('DELETE FROM application_tombstones WHERE deleted_at < ?', (cutoff,)).rowcount
@@ -3,6 +3,7 @@ import './App.css';
 import Login from './components/Login';
 import Register from './components/Register';
 import Dashboard from './components/Dashboard';
+import { clearResponseCache, clearSyncStore } from './services/api';
 
 function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
@@ -20,7 +21,9 @@ function App() {
   };
 
   const handleLogout = () => {
+    clearSyncStore();
     localStorage.removeItem('token');
+    clearResponseCache();
     setIsAuthenticated(false);
   };
 
@@ -0,0 +1,155 @@
+import React, { useState, useEffect } from 'react';
+import { getAnalytics, getErrorMessage } from '../services/api';
+
+const WIDTH = 720;
+const HEIGHT = 240;
+const PADDING = { top: 20, right: 40, bottom: 40, left: 40 };
+
+const formatPeriod = (period, interval) => {
+  const date = new Date(`${period}T00:00:00`);
+  return interval === 'week'
+    ? date.toLocaleDateString('en-US', { month: 'short', day: 'numeric' })
+    : date.toLocaleDateString('en-US', { month: 'short', year: '2-digit' });
+};
+
+const formatDays = (value) => (value === null ? '–' : `${value} d`);
+
+// Median of the non-empty periods' medians, as a rough headline figure
+const overall = (series, key) => {
+  const values = series.map((entry) => entry[key]).filter((value) => value !== null).sort((a, b) => a - b);
+  if (!values.length) return null;
+  const middle = Math.floor(values.length / 2);
+  const median = values.length % 2 ? values[middle] : (values[middle - 1] + values[middle]) / 2;
+  return Math.round(median * 10) / 10;
+};
+
+// Applications sent per week or month (bars) and response rate (line),
+// drawn as plain SVG. Loaded lazily from the Dashboard, so neither this nor
+// its data is fetched until the user opens it.
+function AnalyticsChart() {
+  const [interval, selectInterval] = useState('month');
+  const [data, setData] = useState(null);
+  const [error, setError] = useState('');
+
+  useEffect(() => {
+    let cancelled = false;
+    getAnalytics(interval)
+      .then((response) => {
+        if (cancelled) return;
+        setData(response.data);
+        setError('');
+      })
+      .catch((err) => !cancelled && setError(getErrorMessage(err)));
+    return () => {
+      cancelled = true;
+    };
+  }, [interval]);
+
+  const series = data?.interval === interval ? data.series : [];
+  const plotWidth = WIDTH - PADDING.left - PADDING.right;
+  const plotHeight = HEIGHT - PADDING.top - PADDING.bottom;
+  const maxSent = Math.max(1, ...series.map((entry) => entry.sent));
+  const step = series.length ? plotWidth / series.length : 0;
+  const barWidth = Math.max(2, step * 0.6);
+  const labelEvery = Math.ceil(series.length / 12) || 1;
+
+  const x = (index) => PADDING.left + step * index + step / 2;
+  const ySent = (sent) => PADDING.top + plotHeight - (sent / maxSent) * plotHeight;
+  const yRate = (rate) => PADDING.top + plotHeight - rate * plotHeight;
+
+  const ratePoints = series
+    .map((entry, index) => (entry.response_rate === null ? null : `${x(index)},${yRate(entry.response_rate)}`))
+    .filter(Boolean)
+    .join(' ');
+
+  return (
+    <div className="analytics">
+      <div className="analytics-header">
+        <h3>📈 Applications over time</h3>
+        <div className="analytics-intervals">
+          {['week', 'month'].map((value) => (
+            <button
+              key={value}
+              className={interval === value ? 'active' : ''}
+              onClick={() => selectInterval(value)}
+            >
+              {value === 'week' ? 'Weekly' : 'Monthly'}
+            </button>
+          ))}
+        </div>
+      </div>
+
+      {error && <div className="error-message">{error}</div>}
+      {!series.length && !error && <p>Loading analytics...</p>}
+
+      {series.length > 0 && (
+        <>
+          <svg className="analytics-chart" viewBox={`0 0 ${WIDTH} ${HEIGHT}`} role="img">
+            <line
+              x1={PADDING.left}
+              y1={PADDING.top + plotHeight}
+              x2={WIDTH - PADDING.right}
+              y2={PADDING.top + plotHeight}
+              stroke="#ccc"
+            />
+            <text x={PADDING.left - 6} y={PADDING.top + 4} textAnchor="end">{maxSent}</text>
+            <text x={PADDING.left - 6} y={PADDING.top + plotHeight} textAnchor="end">0</text>
+            <text x={WIDTH - PADDING.right + 6} y={PADDING.top + 4}>100%</text>
+
+            {series.map((entry, index) => (
+              <g key={entry.period}>
+                <rect
+                  className="analytics-bar"
+                  x={x(index) - barWidth / 2}
+                  y={ySent(entry.sent)}
+                  width={barWidth}
+                  height={PADDING.top + plotHeight - ySent(entry.sent)}
+                >
+                  <title>
+                    {`${formatPeriod(entry.period, interval)}: ${entry.sent} sent, ` +
+                      `${entry.response_rate === null ? 'no' : Math.round(entry.response_rate * 100) + '%'} responses, ` +
+                      `interview ${formatDays(entry.median_days_to_interview)}, ` +
+                      `rejection ${formatDays(entry.median_days_to_rejection)}`}
+                  </title>
+                </rect>
+                {index % labelEvery === 0 && (
+                  <text x={x(index)} y={HEIGHT - PADDING.bottom + 16} textAnchor="middle">
+                    {formatPeriod(entry.period, interval)}
+                  </text>
+                )}
+              </g>
+            ))}
+
+            <polyline className="analytics-rate" points={ratePoints} />
+          </svg>
+
+          <div className="analytics-legend">
+            <span className="legend-sent">Applications sent</span>
+            <span className="legend-rate">Response rate</span>
+          </div>
+
+          <div className="calendar-stats">
+            <div className="stat-card">
+              <h3>{series.reduce((sum, entry) => sum + entry.sent, 0)}</h3>
+              <p>Sent</p>
+            </div>
+            <div className="stat-card">
+              <h3>{formatDays(overall(series, 'median_days_to_interview'))}</h3>
+              <p>Days to interview</p>
+            </div>
+            <div className="stat-card">
+              <h3>{formatDays(overall(series, 'median_days_to_rejection'))}</h3>
+              <p>Days to rejection</p>
+            </div>
+            <div className="stat-card">
+              <h3>{formatDays(overall(series, 'median_days_to_acceptance'))}</h3>
+              <p>Days to offer</p>
+            </div>
+          </div>
+        </>
+      )}
+    </div>
+  );
+}
+
+export default AnalyticsChart;
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import { createApplication, updateApplication } from '../services/api';
+import { createApplication, updateApplication, downloadCV } from '../services/api';
 
 function ApplicationForm({ onApplicationCreated, editingApplication, onCancelEdit }) {
   const [company, setCompany] = useState('');
@@ -12,6 +12,7 @@ function ApplicationForm({ onApplicationCreated, editingApplication, onCancelEdi
   const [interviewDate, setInterviewDate] = useState('');
   const [error, setError] = useState('');
   const [loading, setLoading] = useState(false);
+  const [previewUrl, setPreviewUrl] = useState(null);
 
   // Populate form when editing
   useEffect(() => {
@@ -26,8 +27,30 @@ function ApplicationForm({ onApplicationCreated, editingApplication, onCancelEdi
     } else {
       resetForm();
     }
+    setPreviewUrl(null);
   }, [editingApplication]);
 
+  // Object URLs hold the PDF in memory until revoked
+  useEffect(() => {
+    return () => {
+      if (previewUrl) URL.revokeObjectURL(previewUrl);
+    };
+  }, [previewUrl]);
+
+  // First page only: the backend serves a one-page PDF built by a background job
+  const togglePreview = async () => {
+    if (previewUrl) {
+      setPreviewUrl(null);
+      return;
+    }
+    try {
+      const response = await downloadCV(editingApplication.cv_filename, { preview: true });
+      setPreviewUrl(URL.createObjectURL(response.data));
+    } catch (err) {
+      setError('Failed to load CV preview');
+    }
+  };
+
   const resetForm = () => {
     setCompany('');
     setApplicationDate('');
@@ -185,7 +208,15 @@ function ApplicationForm({ onApplicationCreated, editingApplication, onCancelEdi
           />
           {cvFile && <small>Selected: {cvFile.name}</small>}
           {editingApplication && editingApplication.cv_filename && !cvFile && (
-            <small>Current CV: {editingApplication.cv_filename}</small>
+            <>
+              <small>Current CV: {editingApplication.cv_filename}</small>
+              <button type="button" className="cover-letter-toggle" onClick={togglePreview}>
+                {previewUrl ? 'Hide preview' : 'Preview CV'}
+              </button>
+              {previewUrl && (
+                <iframe className="cv-preview" src={previewUrl} title="CV preview" />
+              )}
+            </>
           )}
         </div>
 
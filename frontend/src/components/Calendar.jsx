@@ -1,90 +1,82 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { Calendar, momentLocalizer } from 'react-big-calendar';
 import moment from 'moment';
 import 'react-big-calendar/lib/css/react-big-calendar.css';
-import { getApplications } from '../services/api';
+import { getCalendar, getApplication, getStats } from '../services/api';
 
 const localizer = momentLocalizer(moment);
 
+const EVENT_LABELS = {
+  application: 'Applied',
+  interview: 'Interview',
+  accepted: 'Accepted',
+  rejected: 'Rejected',
+};
+
+const monthKey = (date) => moment(date).format('YYYY-MM');
+
+// Turn one month of {day: {type: [{id, company, status}]}} into calendar events
+const toEvents = (days) =>
+  Object.entries(days).flatMap(([day, types]) =>
+    Object.entries(types).flatMap(([eventType, items]) =>
+      items.map((item) => {
+        const date = moment(day, 'YYYY-MM-DD').toDate();
+        return {
+          id: `${eventType}-${item.id}`,
+          title: `${item.company} (${EVENT_LABELS[eventType]})`,
+          start: date,
+          end: date,
+          allDay: true,
+          resource: { ...item, day, eventType },
+        };
+      })
+    )
+  );
+
 function CalendarView({ onBack }) {
-  const [applications, setApplications] = useState([]);
+  const [months, setMonths] = useState({});
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [date, setDate] = useState(new Date());
   const [view, setView] = useState('month');
+  // Months already fetched or in flight, so navigation never refetches them
+  const requested = useRef(new Set());
 
-  useEffect(() => {
-    fetchApplications();
-  }, []);
+  const fetchMonth = useCallback(async (monthDate) => {
+    const key = monthKey(monthDate);
+    if (requested.current.has(key)) return;
+    requested.current.add(key);
 
-  const fetchApplications = async () => {
+    const start = moment(monthDate).startOf('month').format('YYYY-MM-DD');
+    const end = moment(monthDate).endOf('month').format('YYYY-MM-DD');
     try {
-      const response = await getApplications();
-      setApplications(response.data);
-      setError('');
+      const response = await getCalendar(start, end);
+      setMonths((prev) => ({ ...prev, [key]: toEvents(response.data.days) }));
     } catch (err) {
-      setError('Failed to load applications');
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  // Transform applications into calendar events
-  const events = applications.flatMap((app) => {
-    const eventsList = [];
-    
-    // Application date event
-    const appDate = new Date(app.application_date);
-    eventsList.push({
-      id: `app-${app.id}`,
-      title: `${app.company} (Applied)`,
-      start: appDate,
-      end: appDate,
-      allDay: true,
-      resource: { ...app, eventType: 'application' },
-    });
-
-    // Interview date event
-    if (app.interview_date && app.status === 'interview') {
-      const intDate = new Date(app.interview_date);
-      eventsList.push({
-        id: `int-${app.id}`,
-        title: `${app.company} (Interview)`,
-        start: intDate,
-        end: intDate,
-        allDay: true,
-        resource: { ...app, eventType: 'interview' },
-      });
+      requested.current.delete(key);
+      throw err;
     }
+  }, []);
 
-    // Accepted date event
-    if (app.accepted_date && app.status === 'accepted') {
-      const accDate = new Date(app.accepted_date);
-      eventsList.push({
-        id: `acc-${app.id}`,
-        title: `${app.company} (Accepted)`,
-        start: accDate,
-        end: accDate,
-        allDay: true,
-        resource: { ...app, eventType: 'accepted' },
-      });
-    }
+  // Load the visible month first, then prefetch its neighbours in the background
+  useEffect(() => {
+    const current = moment(date);
+    fetchMonth(current)
+      .then(() => setError(''))
+      .catch(() => setError('Failed to load calendar'))
+      .finally(() => setLoading(false));
+    fetchMonth(current.clone().subtract(1, 'month')).catch(() => {});
+    fetchMonth(current.clone().add(1, 'month')).catch(() => {});
+  }, [date, fetchMonth]);
 
-    // Rejected date event
-    if (app.rejected_date && app.status === 'rejected') {
-      const rejDate = new Date(app.rejected_date);
-      eventsList.push({
-        id: `rej-${app.id}`,
-        title: `${app.company} (Rejected)`,
-        start: rejDate,
-        end: rejDate,
-        allDay: true,
-        resource: { ...app, eventType: 'rejected' },
-      });
-    }
+  useEffect(() => {
+    getStats()
+      .then((response) => setStats(response.data))
+      .catch(() => setStats(null));
+  }, []);
 
-    return eventsList;
-  });
+  const events = Object.values(months).flat();
 
   // Custom event styling based on status
   const eventStyleGetter = (event) => {
@@ -178,26 +170,24 @@ function CalendarView({ onBack }) {
             defaultView="month"
             popup
             selectable
-            onSelectEvent={(event) => {
-              const app = event.resource;
-              const eventType = app.eventType;
-              let dateInfo = '';
-              
-              if (eventType === 'application') {
-                dateInfo = `Applied: ${moment(app.application_date).format('MMMM D, YYYY')}`;
-              } else if (eventType === 'interview') {
-                dateInfo = `Interview: ${moment(app.interview_date).format('MMMM D, YYYY')}`;
-              } else if (eventType === 'accepted') {
-                dateInfo = `Accepted: ${moment(app.accepted_date).format('MMMM D, YYYY')}`;
-              } else if (eventType === 'rejected') {
-                dateInfo = `Rejected: ${moment(app.rejected_date).format('MMMM D, YYYY')}`;
+            onSelectEvent={async (event) => {
+              const { id, day, eventType, company, status } = event.resource;
+              const dateInfo = `${EVENT_LABELS[eventType]}: ${moment(day, 'YYYY-MM-DD').format('MMMM D, YYYY')}`;
+
+              // Cover letters are not part of the calendar payload
+              let coverLetter = '';
+              try {
+                const response = await getApplication(id);
+                coverLetter = response.data.cover_letter || '';
+              } catch (err) {
+                coverLetter = '';
               }
 
               alert(
-                `Company: ${app.company}\n` +
+                `Company: ${company}\n` +
                 `${dateInfo}\n` +
-                `Status: ${app.status}\n` +
-                `${app.cover_letter ? '\n' + app.cover_letter.substring(0, 100) + '...' : ''}`
+                `Status: ${status}\n` +
+                `${coverLetter ? '\n' + coverLetter.substring(0, 100) + '...' : ''}`
               );
             }}
             messages={{
@@ -219,23 +209,23 @@ function CalendarView({ onBack }) {
 
       <div className="calendar-stats">
         <div className="stat-card">
-          <h3>{applications.length}</h3>
+          <h3>{stats ? stats.total : '-'}</h3>
           <p>Total Applications</p>
         </div>
         <div className="stat-card">
-          <h3>{applications.filter(a => a.status === 'pending').length}</h3>
+          <h3>{stats ? stats.pending : '-'}</h3>
           <p>Pending</p>
         </div>
         <div className="stat-card">
-          <h3>{applications.filter(a => a.status === 'interview').length}</h3>
+          <h3>{stats ? stats.interview : '-'}</h3>
           <p>Interviews</p>
         </div>
         <div className="stat-card">
-          <h3>{applications.filter(a => a.status === 'accepted').length}</h3>
+          <h3>{stats ? stats.accepted : '-'}</h3>
           <p>Accepted</p>
         </div>
         <div className="stat-card">
-          <h3>{applications.filter(a => a.status === 'rejected').length}</h3>
+          <h3>{stats ? stats.rejected : '-'}</h3>
           <p>Rejected</p>
         </div>
       </div>
@@ -1,27 +1,91 @@
-import React, { useState, useEffect } from 'react';
-import { getApplications, deleteApplication } from '../services/api';
+import React, { useState, useEffect, lazy, Suspense } from 'react';
+import {
+  syncApplications,
+  getApplication,
+  deleteApplication,
+  batchApplications,
+  APPLICATION_LIST_FIELDS,
+} from '../services/api';
 import ApplicationForm from './ApplicationForm';
 import CalendarView from './Calendar';
+import Search from './Search';
+import Notes from './Notes';
+
+// Split into its own chunk; only downloaded when the chart is opened
+const AnalyticsChart = lazy(() => import('./AnalyticsChart'));
+
+const PAGE_SIZE = 30;
 
 function Dashboard({ onLogout }) {
   const [applications, setApplications] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [showCalendar, setShowCalendar] = useState(false);
+  const [showAnalytics, setShowAnalytics] = useState(false);
   const [editingApplication, setEditingApplication] = useState(null);
+  const [visibleCount, setVisibleCount] = useState(PAGE_SIZE);
+  const [coverLetters, setCoverLetters] = useState({});
+  const [openNotes, setOpenNotes] = useState(new Set());
+  const [selected, setSelected] = useState(new Set());
+  const [batchStatus, setBatchStatus] = useState('rejected');
+  const [batchRunning, setBatchRunning] = useState(false);
 
-  const fetchApplications = async () => {
+  // The list is kept in a local store and brought up to date through the
+  // change feed, so a refresh only transfers what changed
+  const syncRows = async () => {
     try {
-      const response = await getApplications();
-      setApplications(response.data);
+      const rows = await syncApplications(APPLICATION_LIST_FIELDS);
+      setApplications(rows);
       setError('');
+      return true;
     } catch (err) {
       setError('Failed to load applications');
+      return false;
     } finally {
       setLoading(false);
     }
   };
 
+  // A full reload (delete, batch, form submit) also closes cover letters and
+  // clears the selection; note edits only re-sync the rows
+  const fetchApplications = async () => {
+    if (await syncRows()) {
+      setCoverLetters({});
+      setSelected(new Set());
+    }
+  };
+
+  // Cover letters are left out of the list payload and loaded per card
+  const toggleCoverLetter = async (id) => {
+    if (coverLetters[id] !== undefined) {
+      setCoverLetters((prev) => {
+        const next = { ...prev };
+        delete next[id];
+        return next;
+      });
+      return;
+    }
+    try {
+      const response = await getApplication(id);
+      setCoverLetters((prev) => ({ ...prev, [id]: response.data.cover_letter || '' }));
+    } catch (err) {
+      setError('Failed to load cover letter');
+    }
+  };
+
+  // Notes are loaded by the Notes component when opened; the list only has counts
+  const toggleNotes = (id) => {
+    setOpenNotes((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) {
+        next.delete(id);
+      } else {
+        next.add(id);
+      }
+      return next;
+    });
+  };
+
   useEffect(() => {
     fetchApplications();
   }, []);
@@ -37,9 +101,53 @@ function Dashboard({ onLogout }) {
     }
   };
 
-  const handleEdit = (app) => {
-    setEditingApplication(app);
-    window.scrollTo({ top: 0, behavior: 'smooth' });
+  const toggleSelected = (id) => {
+    setSelected((prev) => {
+      const next = new Set(prev);
+      if (next.has(id)) {
+        next.delete(id);
+      } else {
+        next.add(id);
+      }
+      return next;
+    });
+  };
+
+  // One request and one transaction for the whole selection
+  const runBatch = async (operations, mode = 'best_effort') => {
+    setBatchRunning(true);
+    try {
+      const response = await batchApplications(operations, mode);
+      if (response.data.failed) {
+        setError(`${response.data.failed} of ${operations.length} changes failed`);
+      }
+    } catch (err) {
+      setError('Failed to update selected applications');
+    } finally {
+      setBatchRunning(false);
+      fetchApplications();
+    }
+  };
+
+  const handleBatchStatus = () => {
+    runBatch([...selected].map((id) => ({ op: 'status', id, status: batchStatus })));
+  };
+
+  const handleBatchDelete = () => {
+    if (window.confirm(`Delete ${selected.size} selected applications?`)) {
+      runBatch([...selected].map((id) => ({ op: 'delete', id })));
+    }
+  };
+
+  const handleEdit = async (app) => {
+    try {
+      // The list view has no cover letter, so load the full record for the form
+      const response = await getApplication(app.id);
+      setEditingApplication(response.data);
+      window.scrollTo({ top: 0, behavior: 'smooth' });
+    } catch (err) {
+      setError('Failed to load application');
+    }
   };
 
   const handleCancelEdit = () => {
@@ -77,18 +185,32 @@ function Dashboard({ onLogout }) {
           >
             📅 Calendar View
           </button>
+          <button
+            className="calendar-btn"
+            onClick={() => setShowAnalytics((show) => !show)}
+          >
+            📈 {showAnalytics ? 'Hide Analytics' : 'Analytics'}
+          </button>
           <button className="logout-btn" onClick={onLogout}>
             Logout
           </button>
         </div>
       </div>
 
+      {showAnalytics && (
+        <Suspense fallback={<p>Loading analytics...</p>}>
+          <AnalyticsChart />
+        </Suspense>
+      )}
+
       <ApplicationForm 
         onApplicationCreated={handleApplicationCreated} 
         editingApplication={editingApplication}
         onCancelEdit={handleCancelEdit}
       />
 
+      <Search onSelect={handleEdit} />
+
       <div className="applications-section">
         <h2>My Applications ({applications.length})</h2>
         {loading && <p>Loading applications...</p>}
@@ -100,10 +222,42 @@ function Dashboard({ onLogout }) {
           </p>
         )}
 
+        {selected.size > 0 && (
+          <div className="batch-toolbar">
+            <span>{selected.size} selected</span>
+            <select
+              value={batchStatus}
+              onChange={(e) => setBatchStatus(e.target.value)}
+              disabled={batchRunning}
+            >
+              <option value="pending">⏳ Pending</option>
+              <option value="interview">📞 Interview</option>
+              <option value="accepted">✅ Accepted</option>
+              <option value="rejected">❌ Rejected</option>
+            </select>
+            <button onClick={handleBatchStatus} disabled={batchRunning}>
+              Set status
+            </button>
+            <button className="delete-btn" onClick={handleBatchDelete} disabled={batchRunning}>
+              Delete
+            </button>
+            <button onClick={() => setSelected(new Set())} disabled={batchRunning}>
+              Clear
+            </button>
+          </div>
+        )}
+
         <div className="applications-grid">
-          {applications.map((app) => (
+          {applications.slice(0, visibleCount).map((app) => (
             <div key={app.id} className="application-card">
               <div className="card-header">
+                <input
+                  type="checkbox"
+                  className="select-checkbox"
+                  checked={selected.has(app.id)}
+                  onChange={() => toggleSelected(app.id)}
+                  title="Select for bulk changes"
+                />
                 <h3>{app.company}</h3>
                 <div className="card-actions">
                   <button
@@ -150,11 +304,26 @@ function Dashboard({ onLogout }) {
                   <strong>Rejected:</strong> {formatDate(app.rejected_date)}
                 </p>
               )}
-              {app.cover_letter && (
+              {coverLetters[app.id] !== undefined ? (
                 <div className="cover-letter">
                   <strong>Cover Letter:</strong>
-                  <p>{app.cover_letter}</p>
+                  <p>{coverLetters[app.id] || 'No cover letter'}</p>
                 </div>
+              ) : null}
+              <button
+                className="cover-letter-toggle"
+                onClick={() => toggleCoverLetter(app.id)}
+              >
+                {coverLetters[app.id] !== undefined ? 'Hide cover letter' : 'Show cover letter'}
+              </button>
+              <button
+                className="cover-letter-toggle"
+                onClick={() => toggleNotes(app.id)}
+              >
+                {openNotes.has(app.id) ? 'Hide notes' : `Notes (${app.note_count || 0})`}
+              </button>
+              {openNotes.has(app.id) && (
+                <Notes applicationId={app.id} onChange={syncRows} />
               )}
               {app.cv_filename && (
                 <p className="cv-file">
@@ -167,6 +336,15 @@ function Dashboard({ onLogout }) {
             </div>
           ))}
         </div>
+
+        {applications.length > visibleCount && (
+          <button
+            className="load-more-btn"
+            onClick={() => setVisibleCount((count) => count + PAGE_SIZE)}
+          >
+            Load more
+          </button>
+        )}
       </div>
     </div>
   );
@@ -0,0 +1,156 @@
+import React, { useState, useEffect } from 'react';
+import {
+  getNotes,
+  createNote,
+  updateNote,
+  deleteNote,
+  getErrorMessage,
+} from '../services/api';
+
+// Interview notes for one application. Only mounted when the user opens the
+// notes of a card, so note bodies are never part of the list payload.
+function Notes({ applicationId, onChange }) {
+  const [notes, setNotes] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [draft, setDraft] = useState('');
+  const [editing, setEditing] = useState(null);
+  const [saving, setSaving] = useState(false);
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState('');
+
+  useEffect(() => {
+    const load = async () => {
+      try {
+        const response = await getNotes(applicationId);
+        setNotes(response.data.notes);
+        setNextCursor(response.data.next_cursor);
+        setError('');
+      } catch (err) {
+        setError(getErrorMessage(err));
+      } finally {
+        setLoading(false);
+      }
+    };
+    load();
+  }, [applicationId]);
+
+  const loadMore = async () => {
+    try {
+      const response = await getNotes(applicationId, { cursor: nextCursor });
+      setNotes((prev) => [...prev, ...response.data.notes]);
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      setError(getErrorMessage(err));
+    }
+  };
+
+  const handleAdd = async (e) => {
+    e.preventDefault();
+    if (!draft.trim()) return;
+    setSaving(true);
+    try {
+      const response = await createNote(applicationId, draft);
+      setNotes((prev) => [response.data.note, ...prev]);
+      setDraft('');
+      setError('');
+      onChange?.();
+    } catch (err) {
+      setError(getErrorMessage(err));
+    } finally {
+      setSaving(false);
+    }
+  };
+
+  const handleSave = async () => {
+    setSaving(true);
+    try {
+      const response = await updateNote(applicationId, editing.id, editing.body);
+      setNotes((prev) => prev.map((note) => (note.id === editing.id ? response.data.note : note)));
+      setEditing(null);
+      setError('');
+      onChange?.();
+    } catch (err) {
+      setError(getErrorMessage(err));
+    } finally {
+      setSaving(false);
+    }
+  };
+
+  const handleDelete = async (noteId) => {
+    if (!window.confirm('Delete this note?')) return;
+    try {
+      await deleteNote(applicationId, noteId);
+      setNotes((prev) => prev.filter((note) => note.id !== noteId));
+      onChange?.();
+    } catch (err) {
+      setError(getErrorMessage(err));
+    }
+  };
+
+  return (
+    <div className="notes">
+      <form className="note-form" onSubmit={handleAdd}>
+        <textarea
+          value={draft}
+          onChange={(e) => setDraft(e.target.value)}
+          placeholder="Interview notes..."
+          rows={3}
+          disabled={saving}
+        />
+        <button type="submit" disabled={saving || !draft.trim()}>
+          Add note
+        </button>
+      </form>
+
+      {loading && <p>Loading notes...</p>}
+      {error && <div className="error-message">{error}</div>}
+
+      {notes.map((note) => (
+        <div key={note.id} className="note">
+          <small>
+            {new Date(`${note.created_at.replace(' ', 'T')}Z`).toLocaleString()}
+            {note.updated_at !== note.created_at && ' (edited)'}
+          </small>
+          {editing?.id === note.id ? (
+            <>
+              <textarea
+                value={editing.body}
+                onChange={(e) => setEditing({ ...editing, body: e.target.value })}
+                rows={3}
+                disabled={saving}
+              />
+              <div className="note-actions">
+                <button onClick={handleSave} disabled={saving || !editing.body.trim()}>
+                  Save
+                </button>
+                <button onClick={() => setEditing(null)} disabled={saving}>
+                  Cancel
+                </button>
+              </div>
+            </>
+          ) : (
+            <>
+              <p>{note.body}</p>
+              <div className="note-actions">
+                <button onClick={() => setEditing({ id: note.id, body: note.body })}>
+                  Edit
+                </button>
+                <button className="delete-btn" onClick={() => handleDelete(note.id)}>
+                  Delete
+                </button>
+              </div>
+            </>
+          )}
+        </div>
+      ))}
+
+      {nextCursor && (
+        <button className="load-more-btn" onClick={loadMore}>
+          Load older notes
+        </button>
+      )}
+    </div>
+  );
+}
+
+export default Notes;
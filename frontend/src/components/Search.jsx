@@ -0,0 +1,110 @@
+import React, { useState, useEffect, useRef } from 'react';
+import {
+  searchApplications,
+  getErrorMessage,
+  SEARCH_MATCH_START,
+  SEARCH_MATCH_END,
+} from '../services/api';
+
+// Render text with server-side match markers as <mark> elements (no HTML injection)
+function Highlighted({ text }) {
+  if (!text) return null;
+  const parts = text.split(SEARCH_MATCH_START);
+  return (
+    <>
+      {parts[0]}
+      {parts.slice(1).map((part, i) => {
+        const [match, rest = ''] = part.split(SEARCH_MATCH_END);
+        return (
+          <React.Fragment key={i}>
+            <mark>{match}</mark>
+            {rest}
+          </React.Fragment>
+        );
+      })}
+    </>
+  );
+}
+
+function Search({ onSelect }) {
+  const [query, setQuery] = useState('');
+  const [results, setResults] = useState([]);
+  const [nextOffset, setNextOffset] = useState(null);
+  const [error, setError] = useState('');
+  // Id of the latest request; responses to older ones (a previous query) are dropped
+  const latestRequest = useRef(0);
+
+  // Debounce typing so each keystroke doesn't hit the server
+  useEffect(() => {
+    const request = ++latestRequest.current;
+    // No "Load more" for the old query's offset while the new one is pending
+    setNextOffset(null);
+    if (!query.trim()) {
+      setResults([]);
+      return undefined;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await searchApplications(query);
+        if (request !== latestRequest.current) return;
+        setResults(response.data.results);
+        setNextOffset(response.data.next_offset);
+        setError('');
+      } catch (err) {
+        if (request === latestRequest.current) setError(getErrorMessage(err));
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [query]);
+
+  const loadMore = async () => {
+    const request = ++latestRequest.current;
+    try {
+      const response = await searchApplications(query, { offset: nextOffset });
+      if (request !== latestRequest.current) return;
+      setResults((prev) => [...prev, ...response.data.results]);
+      setNextOffset(response.data.next_offset);
+    } catch (err) {
+      if (request === latestRequest.current) setError(getErrorMessage(err));
+    }
+  };
+
+  return (
+    <div className="search-section">
+      <input
+        type="search"
+        className="search-input"
+        placeholder="🔍 Search companies, cover letters and CVs..."
+        value={query}
+        onChange={(e) => setQuery(e.target.value)}
+      />
+      {error && <div className="error-message">{error}</div>}
+      {query.trim() && results.length === 0 && !error && (
+        <p className="no-applications">No matches</p>
+      )}
+      {results.length > 0 && (
+        <ul className="search-results">
+          {results.map((result) => (
+            <li key={result.id} onClick={() => onSelect && onSelect(result)}>
+              <strong><Highlighted text={result.company} /></strong>
+              <span className={`status-badge status-${result.status}`}>{result.status}</span>
+              {result.snippet && (
+                <p>
+                  {result.source === 'cv' && <em>CV: </em>}
+                  <Highlighted text={result.snippet} />
+                </p>
+              )}
+            </li>
+          ))}
+        </ul>
+      )}
+      {nextOffset !== null && (
+        <button className="load-more-btn" onClick={loadMore}>
+          More results
+        </button>
+      )}
+    </div>
+  );
+}
+
+export default Search;
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { openSyncStore, destroySyncStore } from './syncStore';
 
 // Use relative URL - nginx will proxy /api to backend
 const API_URL = '/api';
@@ -14,6 +15,39 @@ const api = axios.create({
   },
 });
 
+// Conditional GET cache: the backend tags reads with an ETag that changes
+// whenever the user's data changes. We keep the last body per URL, send the
+// validator back, and reuse the body when the server answers 304.
+const MAX_CACHED_RESPONSES = 50;
+const responseCache = new Map();
+
+const cacheKey = (config) => api.getUri(config);
+
+export const clearResponseCache = () => {
+  responseCache.clear();
+};
+
+// The synced copy of the applications is kept per user, keyed by the user id
+// in the token payload; call before removing the token
+const currentUserKey = () => {
+  const token = localStorage.getItem('token');
+  if (!token) return null;
+  try {
+    const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+    return payload.user_id ?? null;
+  } catch (err) {
+    return null;
+  }
+};
+
+export const clearSyncStore = () => {
+  const userKey = currentUserKey();
+  if (userKey === null) return Promise.resolve();
+  return destroySyncStore(userKey).catch((err) => {
+    console.error('Failed to clear the local application store', err);
+  });
+};
+
 // Request interceptor - Automatically attach JWT token to every request
 api.interceptors.request.use(
   (config) => {
@@ -21,6 +55,14 @@ api.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+
+    if ((config.method || 'get') === 'get' && config.responseType !== 'blob') {
+      const cached = responseCache.get(cacheKey(config));
+      if (cached) {
+        config.headers['If-None-Match'] = cached.etag;
+        config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+      }
+    }
     return config;
   },
   (error) => {
@@ -31,6 +73,30 @@ api.interceptors.request.use(
 // Response interceptor - Handle errors globally
 api.interceptors.response.use(
   (response) => {
+    if (response.config.method !== 'get') {
+      return response;
+    }
+
+    const key = cacheKey(response.config);
+    if (response.status === 304) {
+      const cached = responseCache.get(key);
+      if (cached) {
+        // Refresh LRU position and hand back the cached body as a normal 200
+        responseCache.delete(key);
+        responseCache.set(key, cached);
+        return { ...response, status: 200, data: cached.data };
+      }
+      return response;
+    }
+
+    const etag = response.headers?.etag;
+    if (etag) {
+      responseCache.delete(key);
+      responseCache.set(key, { etag, data: response.data });
+      if (responseCache.size > MAX_CACHED_RESPONSES) {
+        responseCache.delete(responseCache.keys().next().value);
+      }
+    }
     return response;
   },
   (error) => {
@@ -40,7 +106,9 @@ api.interceptors.response.use(
       
       // Only redirect to login if not already there
       if (currentPath !== '/login' && currentPath !== '/') {
+        clearSyncStore();
         localStorage.removeItem('token');
+        clearResponseCache();
         window.location.href = '/';
       }
     }
@@ -75,7 +143,9 @@ export const login = (username, password) => {
 };
 
 export const logout = () => {
+  clearSyncStore();
   localStorage.removeItem('token');
+  clearResponseCache();
   window.location.href = '/';
 };
 
@@ -87,8 +157,90 @@ export const isAuthenticated = () => {
 // APPLICATION ENDPOINTS
 // ============================================
 
-export const getApplications = () => {
-  return api.get('/applications');
+// Fields shown on list cards - cover letters are loaded per application on demand
+export const APPLICATION_LIST_FIELDS = [
+  'company',
+  'status',
+  'cv_filename',
+  'accepted_date',
+  'rejected_date',
+  'interview_date',
+  'created_at',
+  'note_count',
+  'notes_updated_at',
+];
+
+// Lists requested with format: 'compact' come back as { columns, rows } with
+// each row an array; this turns them back into one object per row
+export const expandRows = ({ columns, rows }) =>
+  rows.map((row) => Object.fromEntries(columns.map((column, i) => [column, row[i]])));
+
+// Without `limit`/`cursor` the backend returns the full list as a plain array.
+// With them it returns { applications, next_cursor }; pass next_cursor back as
+// `cursor` to fetch the following page. Supported filters: status (comma
+// separated), from, to (YYYY-MM-DD), company (prefix) and fields (array);
+// format: 'compact' sends the rows columnar (see expandRows).
+export const getApplications = (params = {}) => {
+  const query = { ...params };
+  if (Array.isArray(query.fields)) {
+    query.fields = query.fields.join(',');
+  }
+  return api.get('/applications', { params: query });
+};
+
+// One page of the change feed: { changes, deleted, cursor, has_more, reset }.
+// Start with since=0 and pass `cursor` back as `since` next time.
+export const getApplicationChanges = (since = 0, { fields, limit, format } = {}) => {
+  const params = { since };
+  if (fields) params.fields = fields.join(',');
+  if (limit) params.limit = limit;
+  if (format) params.format = format;
+  return api.get('/applications/changes', { params });
+};
+
+// Bring the local copy up to date through the change feed and return every
+// application, newest first. Only rows changed since the last sync cross the
+// network; when nothing changed the feed answers 304. Calls are serialized so
+// two refreshes never apply pages out of order.
+let syncQueue = Promise.resolve();
+
+export const syncApplications = (fields = APPLICATION_LIST_FIELDS) => {
+  const run = async () => {
+    const userKey = currentUserKey();
+    if (userKey === null) {
+      throw new Error('Not logged in');
+    }
+    const store = openSyncStore(userKey);
+    const fieldsKey = fields.join(',');
+    let { cursor, fields: storedFields } = await store.meta();
+    if (storedFields !== fieldsKey) {
+      // Rows stored with other columns cannot be patched, start over
+      cursor = 0;
+    }
+
+    let hasMore = true;
+    while (hasMore) {
+      const since = cursor;
+      const { data } = await getApplicationChanges(since, { fields, format: 'compact' });
+      await store.apply({
+        clear: since === 0 || data.reset,
+        changes: expandRows(data.changes),
+        deleted: data.deleted,
+        cursor: data.cursor,
+        fields: fieldsKey,
+      });
+      cursor = data.cursor;
+      hasMore = data.has_more;
+    }
+
+    const rows = await store.all();
+    return rows.sort((a, b) =>
+      (b.application_date || '').localeCompare(a.application_date || '') || b.id - a.id
+    );
+  };
+  const result = syncQueue.then(run, run);
+  syncQueue = result.catch(() => {});
+  return result;
 };
 
 export const getApplication = (id) => {
@@ -119,12 +271,89 @@ export const deleteApplication = (id) => {
   return api.delete(`/applications/${id}`);
 };
 
-export const downloadCV = (filename) => {
+// Interview notes, newest first; pass next_cursor back as `cursor` for older ones
+export const getNotes = (applicationId, { cursor, limit } = {}) => {
+  const params = {};
+  if (cursor) params.cursor = cursor;
+  if (limit) params.limit = limit;
+  return api.get(`/applications/${applicationId}/notes`, { params });
+};
+
+export const createNote = (applicationId, body) => {
+  return api.post(`/applications/${applicationId}/notes`, { body });
+};
+
+export const updateNote = (applicationId, noteId, body) => {
+  return api.put(`/applications/${applicationId}/notes/${noteId}`, { body });
+};
+
+export const deleteNote = (applicationId, noteId) => {
+  return api.delete(`/applications/${applicationId}/notes/${noteId}`);
+};
+
+// Many status changes / patches / deletes in one request and one transaction.
+// operations: [{ op: 'status', id, status }, { op: 'patch', id, fields }, { op: 'delete', id }]
+// mode 'atomic' applies all or nothing; 'best_effort' applies what it can.
+// Per-operation outcomes are in data.results (207 when some failed; an
+// atomic batch that failed is rejected with a 400 carrying the same results).
+export const batchApplications = (operations, mode = 'atomic') => {
+  return api.post('/applications/batch', { mode, operations });
+};
+
+// Bulk import from a CSV or NDJSON File/Blob; the response lists per-row errors
+export const importApplications = (file, format = 'csv') => {
+  return api.post('/applications/import', file, {
+    params: { format },
+    headers: {
+      'Content-Type': format === 'csv' ? 'text/csv' : 'application/x-ndjson',
+    },
+    timeout: 120000,
+  });
+};
+
+export const exportApplications = (format = 'csv') => {
+  return api.get('/applications/export', {
+    params: { format },
+    responseType: 'blob',
+    timeout: 120000,
+  });
+};
+
+// `inline` asks for an inline Content-Disposition (for previews) and `preview`
+// for just the first page (the whole CV until the backend has extracted it);
+// the backend supports Range requests, so `range` (e.g. 'bytes=0-65535') fetches a slice
+export const downloadCV = (filename, { inline = false, preview = false, range } = {}) => {
+  const params = {};
+  if (inline) params.inline = 1;
+  if (preview) params.preview = 1;
   return api.get(`/uploads/${filename}`, {
     responseType: 'blob',
+    params,
+    headers: range ? { Range: range } : undefined,
   });
 };
 
+// ============================================
+// SEARCH ENDPOINTS
+// ============================================
+
+// Matched terms come back wrapped in SEARCH_MATCH_START / SEARCH_MATCH_END
+export const SEARCH_MATCH_START = '\u0002';
+export const SEARCH_MATCH_END = '\u0003';
+
+export const searchApplications = (q, { limit = 20, offset = 0 } = {}) => {
+  return api.get('/search', { params: { q, limit, offset } });
+};
+
+// ============================================
+// CALENDAR ENDPOINTS
+// ============================================
+
+// Events between start and end (inclusive, YYYY-MM-DD), grouped by day and type
+export const getCalendar = (start, end) => {
+  return api.get('/calendar', { params: { start, end } });
+};
+
 // ============================================
 // STATISTICS ENDPOINTS
 // ============================================
@@ -133,6 +362,12 @@ export const getStats = () => {
   return api.get('/stats');
 };
 
+// Weekly or monthly funnel series; from/to (YYYY-MM-DD) default to the last
+// 26 weeks or 12 months on the server
+export const getAnalytics = (interval = 'month', { from, to } = {}) => {
+  return api.get('/analytics', { params: { interval, from, to } });
+};
+
 // ============================================
 // HELPER FUNCTIONS
 // ============================================
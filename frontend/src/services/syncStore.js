@@ -0,0 +1,120 @@
+// Local copy of the user's applications for delta sync (see syncApplications
+// in api.js). Kept in IndexedDB so a reload only fetches what changed since
+// the last visit; falls back to memory where IndexedDB is unavailable.
+// Each user gets their own database, deleted again on logout.
+
+const DB_VERSION = 1;
+const APPLICATIONS = 'applications';
+const META = 'meta';
+
+const requestToPromise = (request) =>
+  new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+
+const transactionDone = (tx) =>
+  new Promise((resolve, reject) => {
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+    tx.onabort = () => reject(tx.error);
+  });
+
+class IndexedDBStore {
+  constructor(name) {
+    this.name = name;
+    this.db = null;
+  }
+
+  async open() {
+    if (!this.db) {
+      const request = indexedDB.open(this.name, DB_VERSION);
+      request.onupgradeneeded = () => {
+        request.result.createObjectStore(APPLICATIONS, { keyPath: 'id' });
+        request.result.createObjectStore(META);
+      };
+      this.db = await requestToPromise(request);
+    }
+    return this.db;
+  }
+
+  // { cursor, fields } of the last applied page (cursor 0 when empty)
+  async meta() {
+    const db = await this.open();
+    const stored = await requestToPromise(db.transaction(META).objectStore(META).get('sync'));
+    return stored || { cursor: 0, fields: null };
+  }
+
+  async all() {
+    const db = await this.open();
+    return requestToPromise(db.transaction(APPLICATIONS).objectStore(APPLICATIONS).getAll());
+  }
+
+  // Apply one page of the change feed atomically, cursor included
+  async apply({ clear, changes, deleted, cursor, fields }) {
+    const db = await this.open();
+    const tx = db.transaction([APPLICATIONS, META], 'readwrite');
+    const applications = tx.objectStore(APPLICATIONS);
+    if (clear) {
+      applications.clear();
+    }
+    changes.forEach((row) => applications.put(row));
+    deleted.forEach((id) => applications.delete(id));
+    tx.objectStore(META).put({ cursor, fields }, 'sync');
+    await transactionDone(tx);
+  }
+
+  async destroy() {
+    if (this.db) {
+      this.db.close();
+      this.db = null;
+    }
+    await requestToPromise(indexedDB.deleteDatabase(this.name));
+  }
+}
+
+class MemoryStore {
+  constructor() {
+    this.rows = new Map();
+    this.state = { cursor: 0, fields: null };
+  }
+
+  async meta() {
+    return this.state;
+  }
+
+  async all() {
+    return [...this.rows.values()];
+  }
+
+  async apply({ clear, changes, deleted, cursor, fields }) {
+    if (clear) {
+      this.rows.clear();
+    }
+    changes.forEach((row) => this.rows.set(row.id, row));
+    deleted.forEach((id) => this.rows.delete(id));
+    this.state = { cursor, fields };
+  }
+
+  async destroy() {
+    this.rows.clear();
+    this.state = { cursor: 0, fields: null };
+  }
+}
+
+const stores = new Map();
+
+export const openSyncStore = (userKey) => {
+  const name = `jobtracker-sync-${userKey}`;
+  if (!stores.has(name)) {
+    stores.set(name, typeof indexedDB === 'undefined' ? new MemoryStore() : new IndexedDBStore(name));
+  }
+  return stores.get(name);
+};
+
+export const destroySyncStore = async (userKey) => {
+  const name = `jobtracker-sync-${userKey}`;
+  const store = stores.get(name) || openSyncStore(userKey);
+  stores.delete(name);
+  await store.destroy();
+};